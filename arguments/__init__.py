@@ -42,12 +42,11 @@ class ParamGroup:
         for arg in vars(args).items():
             if arg[0] in vars(self) or ("_" + arg[0]) in vars(self):
                 setattr(group, arg[0], arg[1])
-        # 添加深度部分
-        if 'using_depth' not in vars(args):
-            try:
-                setattr(group, 'using_depth', vars(self)['using_depth'])
-            except:
-                pass
+        # 旧的cfg_args中没有(sentinel时命令行也没有给出)的参数使用这里的默认值, 使用处直接读取
+        for key, value in vars(self).items():
+            key = key[1:] if key.startswith("_") else key
+            if getattr(group, key, None) is None:
+                setattr(group, key, value)
         return group
 
 class ModelParams(ParamGroup): 
@@ -63,6 +62,33 @@ class ModelParams(ParamGroup):
         self.using_depth = False
         # 是否使用外观嵌入，默认使用
         self.able_appearance_embedding = False
+        # 点云保存格式: ply / compressed / chunked, 多个格式用逗号分隔, 读取时使用第一个; both等同于ply,compressed
+        self.checkpoint_format = "ply"
+        # 不使用数据集目录下.gs_cache中缓存的解析结果
+        self.no_scene_cache = False
+        # 读取数据集时解码图像的线程数
+        self.data_workers = 8
+        # 相机图像在使用时才解码, 解码结果放在大小为image_cache_mb的LRU缓存中
+        self.lazy_images = False
+        self.image_cache_mb = 4096.0
+        # 缩放后的训练图像缓存为数据集.gs_cache下的uint8 memmap, 之后的运行不再解码和缩放
+        self.mmap_images = False
+        # 相机图像以uint8保存(深度uint16/float16), 训练时再转换为float, 内存为float32的1/4
+        self.uint8_images = False
+        # 所有相机的外参内参批量计算并保存在一组(N,4,4)/(N,3,3)张量中, 代替每个相机一个nn.Module
+        self.camera_bank = False
+        # 稠密初始点云的下采样: voxel(每个体素保留一个平均点) / random / none, 点数上限, 固定体素大小(>0时代替点数上限)
+        self.init_sampling = "voxel"
+        self.init_max_points = 300000
+        self.init_voxel_size = 0.0
+        # 初始尺度的最近邻距离: auto(有simple_knn和CUDA时用cuda) / cuda / cpu
+        self.knn_backend = "auto"
+        # 初始点云去除离群点: none / statistical(近邻平均距离超过均值+outlier_std_ratio倍标准差)
+        # / radius(outlier_radius内的近邻少于outlier_neighbors个)
+        self.outlier_removal = "none"
+        self.outlier_neighbors = 20
+        self.outlier_std_ratio = 2.0
+        self.outlier_radius = 0.0
         super().__init__(parser, "Loading Parameters", sentinel)
 
     def extract(self, args):
@@ -99,6 +125,13 @@ class OptimizationParams(ParamGroup):
         # 不进行致密化呢？
         self.densify_until_iter = 15_000
         self.densify_grad_threshold = 0.0002
+        # 每一步渲染的视点数, 损失相加; iterations和各种间隔仍按视点数计算
+        self.batch_views = 1
+        # 参数和Adam状态预留容量, 致密化时原地追加, 裁剪一次压缩
+        self.growable_storage = False
+        # 只更新当前视点可见的高斯(VisibleAdam); lazy_bias_correction: 按每个高斯自己的更新次数做偏差修正
+        self.sparse_adam = False
+        self.lazy_bias_correction = False
         super().__init__(parser, "Optimization Parameters")
 
 def get_combined_args(parser : ArgumentParser):
@@ -127,4 +160,6 @@ def get_combined_args(parser : ArgumentParser):
             merged_dict[k] = v
         if k == "render_file" and v == None:
             merged_dict[k] = v
+        if k == "region" and v == None:
+            merged_dict[k] = v
     return Namespace(**merged_dict)
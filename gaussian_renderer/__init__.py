@@ -12,6 +12,7 @@ from scene.cameras import Camera
 import torch
 import os
 from utils.system_utils import mkdir_p
+from utils.async_saver import save_torch_atomic
 import torch.nn as nn
 # import tinycudann as tcnn
 import math
@@ -160,14 +161,17 @@ class AppearanceOptimizer(nn.Module):
         appearance_factors = self.appearance_embedding(emb).reshape((-1, 1, 1))
         return appearance_factors
 
-    def save_appearance_embedding(self, path):
+    def save_appearance_embedding(self, path, saver=None):
         if self.appearance_embedding is not None:
-            mkdir_p(os.path.dirname(path))
-            torch.save({
+            state = {
                 "model_config": self.appearance_embedding_config,
                 "model_state_dict": self.appearance_embedding.state_dict(),
                 "appearance_emb_state_dict": self.appearance_emb,
-            }, path)
+            }
+            if saver is None:
+                save_torch_atomic(state, path)
+            else:
+                saver.submit(save_torch_atomic, state, path)
 
     def load_appearance_embedding(self, model_path, load_iteration=None):
 
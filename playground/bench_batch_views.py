@@ -0,0 +1,41 @@
+"""
+多视点批训练(--batch_views)与单视点训练的对比: 对每个B运行一次train.py, 统计训练耗时, 每秒处理的视点数和测试集PSNR
+迭代次数按视点数计算, 所以不同B看到的视点数相同, 优化器步数为1/B
+python playground/bench_batch_views.py -s data/garden --images images_4 --iterations 7000 --batch_views 1 2 4 8
+"""
+import os
+import re
+import sys
+import time
+import tempfile
+import subprocess
+from argparse import ArgumentParser
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Batched views benchmark")
+    parser.add_argument("--source_path", "-s", required=True, type=str)
+    parser.add_argument("--images", default="images_4", type=str)
+    parser.add_argument("--iterations", type=int, default=7000)
+    parser.add_argument("--batch_views", nargs="+", type=int, default=[1, 2, 4, 8])
+    args, extra = parser.parse_known_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for batch_views in args.batch_views:
+            model_path = os.path.join(tmp, "b{}".format(batch_views))
+            command = [sys.executable, os.path.join(ROOT, "train.py"), "-s", args.source_path, "-m", model_path,
+                       "--images", args.images, "--eval", "--iterations", str(args.iterations),
+                       "--test_iterations", str(args.iterations), "--save_iterations", str(args.iterations),
+                       "--batch_views", str(batch_views)] + extra
+            start = time.perf_counter()
+            output = subprocess.run(command, cwd=ROOT, capture_output=True, text=True, check=True).stdout
+            elapsed = time.perf_counter() - start
+            psnr = re.findall(r"Evaluating test: L1 \S+ PSNR (\S+)", output)
+            results.append((batch_views, elapsed, float(psnr[-1]) if psnr else float("nan")))
+
+    for batch_views, elapsed, psnr in results:
+        print("batch_views {:2d}: {:7.1f}s, {:6.1f} views/s, test PSNR {:.2f}".format(
+            batch_views, elapsed, args.iterations / elapsed, psnr))
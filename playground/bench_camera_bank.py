@@ -0,0 +1,58 @@
+"""
+相机构建时间对比: 每个相机一个nn.Module(Camera)与一次批量计算的CameraBank(--camera_bank), 不含图像解码
+python playground/bench_camera_bank.py --num_cameras 10000
+"""
+import os
+import sys
+import time
+import tracemalloc
+from argparse import ArgumentParser
+
+import numpy as np
+import torch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scene.cameras import Camera, CameraBank
+
+
+def timed(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    python_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return elapsed, python_bytes, result
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Camera bank benchmark")
+    parser.add_argument("--num_cameras", type=int, default=10000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    R = np.linalg.qr(rng.normal(size=(args.num_cameras, 3, 3)))[0]
+    T = rng.normal(size=(args.num_cameras, 3))
+    FoVx = rng.uniform(0.8, 1.2, args.num_cameras)
+    FoVy = FoVx * 9 / 16
+    image = torch.zeros(3, 1, 1)
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+
+    def build_bank():
+        bank = CameraBank(R, T, FoVx, FoVy, [1600] * args.num_cameras, [900] * args.num_cameras, device=device)
+        return [bank.view(i, uid=i, colmap_id=i, image_name=str(i), image=image, data_device=device)
+                for i in range(args.num_cameras)]
+
+    t_bank, m_bank, bank_views = timed(build_bank)
+    print("{} cameras: bank {:.2f}s, {:.1f} MB python objects".format(args.num_cameras, t_bank, m_bank / 2 ** 20))
+
+    # Camera的setup_projection直接调用.cuda()
+    if device == "cuda":
+        def build_cameras():
+            return [Camera(i, R[i], T[i], FoVx[i], FoVy[i], image, None, str(i), i) for i in range(args.num_cameras)]
+
+        t_list, m_list, cameras = timed(build_cameras)
+        error = max((camera.full_proj_transform - view.full_proj_transform).abs().max().item()
+                    for camera, view in zip(cameras, bank_views))
+        print("{} cameras: Camera {:.2f}s, {:.1f} MB python objects, max full_proj_transform diff {:.3g}".format(
+            args.num_cameras, t_list, m_list / 2 ** 20, error))
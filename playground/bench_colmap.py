@@ -0,0 +1,176 @@
+"""
+COLMAP模型解析的性能测试，生成不同规模的随机模型，对比逐条解析与批量解析并检查输出一致
+python playground/bench_colmap.py --points 100000 1000000 --images 300 3000
+文本格式: 与逐行np.append的旧实现对比(只在--legacy_max以内运行), 并检查耗时随点数线性增长
+python playground/bench_colmap.py --text_points 100000 1000000 4000000
+"""
+import os
+import sys
+import time
+import struct
+import tempfile
+from argparse import ArgumentParser
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scene.colmap_loader import read_points3D_binary, read_points3D_binary_bulk, \
+    read_extrinsics_binary, read_extrinsics_binary_bulk, read_points3D_text, read_extrinsics_text, Image
+
+
+def legacy_read_points3D_text(path):
+    """The previous parser, growing the arrays with np.append on every line"""
+    xyzs = rgbs = errors = None
+    with open(path, "r") as fid:
+        for line in fid:
+            line = line.strip()
+            if len(line) > 0 and line[0] != "#":
+                elems = line.split()
+                xyz = np.array(tuple(map(float, elems[1:4])))
+                rgb = np.array(tuple(map(int, elems[4:7])))
+                error = np.array(float(elems[7]))
+                if xyzs is None:
+                    xyzs, rgbs, errors = xyz[None, ...], rgb[None, ...], error[None, ...]
+                else:
+                    xyzs = np.append(xyzs, xyz[None, ...], axis=0)
+                    rgbs = np.append(rgbs, rgb[None, ...], axis=0)
+                    errors = np.append(errors, error[None, ...], axis=0)
+    return xyzs, rgbs, errors
+
+
+def legacy_read_extrinsics_text(path):
+    images = {}
+    with open(path, "r") as fid:
+        while True:
+            line = fid.readline()
+            if not line:
+                break
+            line = line.strip()
+            if len(line) > 0 and line[0] != "#":
+                elems = line.split()
+                image_id, camera_id, image_name = int(elems[0]), int(elems[8]), elems[9]
+                qvec = np.array(tuple(map(float, elems[1:5])))
+                tvec = np.array(tuple(map(float, elems[5:8])))
+                elems = fid.readline().split()
+                xys = np.column_stack([tuple(map(float, elems[0::3])), tuple(map(float, elems[1::3]))])
+                point3D_ids = np.array(tuple(map(int, elems[2::3])))
+                images[image_id] = Image(id=image_id, qvec=qvec, tvec=tvec, camera_id=camera_id,
+                                         name=image_name, xys=xys, point3D_ids=point3D_ids)
+    return images
+
+
+def write_points3D_binary(path, num_points, rng):
+    track_lengths = rng.integers(2, 8, num_points)
+    with open(path, "wb") as fid:
+        fid.write(struct.pack("<Q", num_points))
+        xyz = rng.normal(size=(num_points, 3))
+        rgb = rng.integers(0, 256, (num_points, 3))
+        error = rng.random(num_points)
+        for p_id in range(num_points):
+            fid.write(struct.pack("<QdddBBBd", p_id + 1, *xyz[p_id], *rgb[p_id], error[p_id]))
+            fid.write(struct.pack("<Q", track_lengths[p_id]))
+            fid.write(rng.integers(0, 1000, 2 * track_lengths[p_id]).astype("<i4").tobytes())
+
+
+def write_images_binary(path, num_images, points_per_image, rng):
+    with open(path, "wb") as fid:
+        fid.write(struct.pack("<Q", num_images))
+        for image_id in range(1, num_images + 1):
+            fid.write(struct.pack("<idddddddi", image_id, *rng.normal(size=7), 1))
+            fid.write("frame_{:06d}.jpg".format(image_id).encode("utf-8") + b"\x00")
+            num_points2D = 0 if image_id == 1 else points_per_image
+            fid.write(struct.pack("<Q", num_points2D))
+            records = np.empty(num_points2D, dtype=[("xy", "<f8", 2), ("id", "<i8")])
+            records["xy"] = rng.random((num_points2D, 2)) * 1000
+            records["id"] = rng.integers(-1, 100000, num_points2D)
+            fid.write(records.tobytes())
+
+
+def write_points3D_text(path, num_points, rng):
+    xyz = rng.normal(size=(num_points, 3))
+    rgb = rng.integers(0, 256, (num_points, 3))
+    error = rng.random(num_points)
+    with open(path, "w") as fid:
+        fid.write("# 3D point list with one line of data per point:\n")
+        fid.write("#   POINT3D_ID, X, Y, Z, R, G, B, ERROR, TRACK[] as (IMAGE_ID, POINT2D_IDX)\n")
+        for p_id in range(num_points):
+            fid.write("{} {!r} {!r} {!r} {} {} {} {!r} 1 {} 2 {}\n".format(
+                p_id + 1, *xyz[p_id].tolist(), *rgb[p_id].tolist(), error[p_id].item(), p_id, p_id))
+
+
+def write_images_text(path, num_images, points_per_image, rng):
+    with open(path, "w") as fid:
+        fid.write("# Image list with two lines of data per image:\n")
+        for image_id in range(1, num_images + 1):
+            fid.write("{} {} 1 frame_{:06d}.jpg\n".format(
+                image_id, " ".join(repr(v) for v in rng.normal(size=7).tolist()), image_id))
+            num_points2D = 0 if image_id == 1 else points_per_image
+            xy = (rng.random((num_points2D, 2)) * 1000).tolist()
+            ids = rng.integers(-1, 100000, num_points2D).tolist()
+            fid.write(" ".join("{!r} {!r} {}".format(x, y, i) for (x, y), i in zip(xy, ids)) + "\n")
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def same_images(a, b):
+    assert a.keys() == b.keys()
+    for key in a:
+        x, y = a[key], b[key]
+        assert x.id == y.id and x.camera_id == y.camera_id and x.name == y.name
+        for field in ["qvec", "tvec", "xys", "point3D_ids"]:
+            u, v = getattr(x, field), getattr(y, field)
+            assert u.dtype == v.dtype and u.shape == v.shape and np.array_equal(u, v), field
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="COLMAP binary parser benchmark")
+    parser.add_argument("--points", nargs="+", type=int, default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--images", nargs="+", type=int, default=[100, 1000, 3000])
+    parser.add_argument("--points_per_image", type=int, default=2000)
+    parser.add_argument("--text_points", nargs="+", type=int, default=[])
+    parser.add_argument("--text_images", nargs="+", type=int, default=[])
+    parser.add_argument("--legacy_max", type=int, default=100_000)
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "points3D.bin")
+        for num in args.points:
+            write_points3D_binary(path, num, rng)
+            t_old, old = timed(read_points3D_binary, path)
+            t_new, new = timed(read_points3D_binary_bulk, path)
+            for u, v in zip(old, new):
+                assert u.dtype == v.dtype and np.array_equal(u, v)
+            print("points3D.bin {:>9} points: per point {:7.2f} s, bulk {:7.2f} s".format(num, t_old, t_new))
+
+        path = os.path.join(tmp, "images.bin")
+        for num in args.images:
+            write_images_binary(path, num, args.points_per_image, rng)
+            t_old, old = timed(read_extrinsics_binary, path)
+            t_new, new = timed(read_extrinsics_binary_bulk, path)
+            same_images(old, new)
+            print("images.bin   {:>9} images: per image {:7.2f} s, bulk {:7.2f} s".format(num, t_old, t_new))
+
+        path = os.path.join(tmp, "points3D.txt")
+        for num in args.text_points:
+            write_points3D_text(path, num, rng)
+            t_new, new = timed(read_points3D_text, path)
+            line = "points3D.txt {:>9} points: linear {:7.2f} s ({:.2f} us/point)".format(num, t_new, 1e6 * t_new / num)
+            if num <= args.legacy_max:
+                t_old, old = timed(legacy_read_points3D_text, path)
+                for u, v in zip(old, new):
+                    assert u.dtype == v.dtype and u.shape == v.shape and np.array_equal(u, v)
+                line += ", np.append {:7.2f} s".format(t_old)
+            print(line)
+
+        path = os.path.join(tmp, "images.txt")
+        for num in args.text_images:
+            write_images_text(path, num, args.points_per_image, rng)
+            t_old, old = timed(legacy_read_extrinsics_text, path)
+            t_new, new = timed(read_extrinsics_text, path)
+            same_images(old, new)
+            print("images.txt   {:>9} images: per token {:7.2f} s, bulk {:7.2f} s".format(num, t_old, t_new))
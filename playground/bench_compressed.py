@@ -0,0 +1,112 @@
+"""
+压缩格式(point_cloud.npz)与ply的往返测试：文件大小，读取时间，以及测试集上渲染的PSNR下降
+训练好的模型(需要CUDA):
+    python playground/bench_compressed.py -m <model path> --iteration -1
+随机高斯(只需要CPU, 不渲染, 报告属性误差):
+    python playground/bench_compressed.py --synthetic 1000000
+"""
+import os
+import sys
+import time
+import tempfile
+from argparse import ArgumentParser
+
+import numpy as np
+import torch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.ply_utils import load_gaussian_ply, write_ply_chunked
+from utils.compress_utils import save_compressed_gaussians, load_compressed_gaussians
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def report_files(ply_path, npz_path, max_sh_degree):
+    t_ply, reference = timed(load_gaussian_ply, ply_path, max_sh_degree)
+    t_npz, decoded = timed(load_compressed_gaussians, npz_path)
+    size_ply = os.path.getsize(ply_path) / 2 ** 20
+    size_npz = os.path.getsize(npz_path) / 2 ** 20
+    print("ply        : {:9.1f} MB, load {:6.2f} s".format(size_ply, t_ply))
+    print("compressed : {:9.1f} MB, load {:6.2f} s, ratio {:.1f}x".format(size_npz, t_npz, size_ply / size_npz))
+    names = ["xyz", "features_dc", "features_extra", "opacities", "scales", "rots"]
+    for name, new, old in zip(names, decoded, reference):
+        print("  {:<15} max abs error {:.5f}".format(name, np.abs(new - old).max() if old.size else 0.0))
+    return reference, decoded
+
+
+def run_synthetic(num, codebook_size):
+    xyz = np.random.randn(num, 3).astype(np.float32) * 10
+    features_dc = np.random.randn(num, 3, 1).astype(np.float32)
+    features_extra = (np.random.randn(num, 3, 15) * 0.1).astype(np.float32)
+    opacities = np.random.randn(num, 1).astype(np.float32)
+    scales = np.random.randn(num, 3).astype(np.float32) - 4
+    rots = np.random.randn(num, 4).astype(np.float32)
+    rots /= np.linalg.norm(rots, axis=1, keepdims=True)
+
+    names = ['x', 'y', 'z', 'nx', 'ny', 'nz'] + ['f_dc_{}'.format(i) for i in range(3)] + \
+            ['f_rest_{}'.format(i) for i in range(45)] + ['opacity'] + \
+            ['scale_{}'.format(i) for i in range(3)] + ['rot_{}'.format(i) for i in range(4)]
+    with tempfile.TemporaryDirectory() as tmp:
+        ply_path = os.path.join(tmp, "point_cloud.ply")
+        npz_path = os.path.join(tmp, "point_cloud.npz")
+        write_ply_chunked(ply_path, names, [xyz, 3, features_dc.transpose(0, 2, 1),
+                                            features_extra.transpose(0, 2, 1), opacities, scales, rots])
+        t_save, _ = timed(save_compressed_gaussians, npz_path, xyz, features_dc, features_extra,
+                          opacities, scales, rots, codebook_size)
+        print("encode     : {:6.2f} s".format(t_save))
+        report_files(ply_path, npz_path, 3)
+
+
+def run_model(codebook_size):
+    from arguments import ModelParams, PipelineParams, get_combined_args
+    from scene import Scene, GaussianModel
+    from gaussian_renderer import render
+    from utils.image_utils import psnr
+
+    parser = ArgumentParser(description="Compressed round-trip")
+    model = ModelParams(parser, sentinel=True)
+    pipeline = PipelineParams(parser)
+    parser.add_argument("--iteration", default=-1, type=int)
+    parser.add_argument("--codebook_size", default=4096, type=int)
+    args = get_combined_args(parser)
+    dataset, pipe = model.extract(args), pipeline.extract(args)
+    dataset.checkpoint_format = "ply"
+
+    with torch.no_grad():
+        gaussians = GaussianModel(dataset.sh_degree)
+        scene = Scene(dataset, gaussians, load_iteration=args.iteration, shuffle=False)
+        background = torch.tensor([1, 1, 1] if dataset.white_background else [0, 0, 0],
+                                  dtype=torch.float32, device="cuda")
+        cameras = scene.getTestCameras() or scene.getTrainCameras()
+
+        def mean_psnr():
+            values = [psnr(torch.clamp(render(view, gaussians, pipe, background)["render"], 0.0, 1.0),
+                           view.original_image.cuda()).mean().item() for view in cameras]
+            return float(np.mean(values))
+
+        psnr_ply = mean_psnr()
+        ply_path = scene.point_cloud_file(scene.loaded_iter)
+        with tempfile.TemporaryDirectory() as tmp:
+            npz_path = os.path.join(tmp, "point_cloud.npz")
+            t_save, _ = timed(gaussians.save_compressed, npz_path, codebook_size)
+            print("encode     : {:6.2f} s".format(t_save))
+            report_files(ply_path, npz_path, dataset.sh_degree)
+            gaussians.load_ply(npz_path)
+        psnr_npz = mean_psnr()
+        print("PSNR on {} views: ply {:.3f}, compressed {:.3f}, drop {:.3f}".format(
+            len(cameras), psnr_ply, psnr_npz, psnr_ply - psnr_npz))
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(add_help=False)
+    parser.add_argument("--synthetic", type=int, default=0)
+    parser.add_argument("--codebook_size", default=4096, type=int)
+    known, _ = parser.parse_known_args()
+    if known.synthetic:
+        run_synthetic(known.synthetic, known.codebook_size)
+    else:
+        run_model(known.codebook_size)
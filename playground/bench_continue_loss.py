@@ -0,0 +1,107 @@
+"""
+compute_continue_loss的耗时: 原来逐个patch构建索引的循环与一次gather所有patch的实现, 按patch数(sample_nums)
+相同随机种子下两者采样相同的patch, loss和梯度应一致
+python playground/bench_continue_loss.py --sample_nums 100 1000 10000 --height 1080 --width 1920
+"""
+import os
+import sys
+import time
+from argparse import ArgumentParser
+
+import torch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.loss_utils import compute_continue_loss
+
+
+def loop_continue_loss(dyn_depth, gt_depth, lambda_depth, sample_nums=100, patch_size=3):
+    # 原实现, 只把空掩码时的dyn_depth.devices改为dyn_depth.device
+    gt_depth = gt_depth / gt_depth.max()
+    dyn_depth = dyn_depth / dyn_depth.max()
+    sample_w = torch.randint(0, gt_depth.shape[1] - patch_size, (sample_nums,))
+    sample_h = torch.randint(0, gt_depth.shape[2] - patch_size, (sample_nums,))
+    patchs_gt = []
+    patchs_pred = []
+    for i in range(sample_nums):
+        w, h = sample_w[i], sample_h[i]
+        patch_w_indices = torch.arange(w, w + patch_size)
+        patch_h_indices = torch.arange(h, h + patch_size)
+        patch_w, patch_h = torch.meshgrid(patch_w_indices, patch_h_indices, indexing="ij")
+        patchs_gt.append(gt_depth[:, patch_w, patch_h])
+        patchs_pred.append(dyn_depth[:, patch_w, patch_h])
+    gt_depth = torch.cat(patchs_gt).reshape(1, sample_nums, -1).transpose(2, 1)
+    pred_depth = torch.cat(patchs_pred).reshape(1, sample_nums, -1).transpose(2, 1)
+    condition = (gt_depth[:, (patch_size ** 2 // 2 + 1), :].unsqueeze(0).permute(1, 0, 2) - gt_depth).abs()
+    mask = torch.logical_and(condition <= 1e-2, condition > 0)
+    if torch.all(~mask):
+        return torch.tensor(0.0).to(dyn_depth.device)
+    return ((pred_depth[:, 0, :].unsqueeze(0).permute(1, 0, 2) - pred_depth).abs() - 1e-2)[mask].clamp(0).mean() * lambda_depth
+
+
+def depth_maps(height, width, device, seed=0, channels=1):
+    # 分段平滑的gt视差, 使大部分patch有连续位置; 渲染视差为gt加噪声
+    generator = torch.Generator(device=device).manual_seed(seed)
+    w = torch.linspace(0, 1, width, device=device)
+    h = torch.linspace(0, 1, height, device=device)
+    gt_depth = (1 + 0.2 * h[:, None] + 0.1 * w[None, :]).repeat(channels, 1, 1)
+    gt_depth[:, height // 2:, width // 3:] += 0.5
+    dyn_depth = gt_depth + 0.02 * torch.rand(gt_depth.shape, generator=generator, device=device)
+    return dyn_depth.requires_grad_(), gt_depth
+
+
+def check(device, height=120, width=160):
+    for channels in (1, 3):
+        for sample_nums, patch_size in ((1, 3), (100, 3), (1000, 3), (500, 5)):
+            for seed in range(3):
+                results = []
+                for loss_fn in (loop_continue_loss, compute_continue_loss):
+                    dyn_depth, gt_depth = depth_maps(height, width, device, seed, channels)
+                    torch.manual_seed(seed)
+                    loss = loss_fn(dyn_depth, gt_depth, 0.1, sample_nums, patch_size)
+                    if loss.requires_grad:
+                        loss.backward()
+                    results.append((loss.detach(), dyn_depth.grad))
+                (reference, reference_grad), (result, result_grad) = results
+                assert torch.allclose(reference, result, rtol=1e-5, atol=1e-8), (reference, result)
+                assert (reference_grad is None and (result_grad is None or not result_grad.any())) or \
+                       torch.allclose(reference_grad, result_grad, rtol=1e-4, atol=1e-10)
+
+    # 没有连续位置: 常数gt, loss为0
+    dyn_depth, gt_depth = depth_maps(height, width, device)
+    loss = compute_continue_loss(dyn_depth, torch.ones_like(gt_depth), 0.1)
+    assert loss.item() == 0 and loss.device == dyn_depth.device
+    print("same loss and gradient as the loop, 0 without continuous positions")
+
+
+def timed_loss(loss_fn, sample_nums, height, width, device, repeats):
+    dyn_depth, gt_depth = depth_maps(height, width, device)
+    times = []
+    for _ in range(repeats + 1):
+        if device == "cuda":
+            torch.cuda.synchronize()
+        start = time.perf_counter()
+        loss = loss_fn(dyn_depth, gt_depth, 0.1, sample_nums)
+        loss.backward()
+        if device == "cuda":
+            torch.cuda.synchronize()
+        times.append(time.perf_counter() - start)
+        dyn_depth.grad = None
+    return sorted(times[1:])[repeats // 2]
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Continue loss benchmark")
+    parser.add_argument("--sample_nums", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+
+    check(device)
+    for sample_nums in args.sample_nums:
+        seconds = {name: timed_loss(loss_fn, sample_nums, args.height, args.width, device, args.repeats)
+                   for name, loss_fn in (("loop", loop_continue_loss), ("batched", compute_continue_loss))}
+        print("{} patches: ".format(sample_nums) +
+              ", ".join("{} {:.2f}ms".format(name, 1000 * value) for name, value in seconds.items()) +
+              ", {:.0f}x".format(seconds["loop"] / seconds["batched"]))
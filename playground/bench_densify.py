@@ -0,0 +1,113 @@
+"""
+致密化一步的耗时: 依次执行densify_and_clone, densify_and_split, prune_points与一次gather的densify_and_prune
+相同随机种子下两者的参数, Adam状态应完全一致
+python playground/bench_densify.py --num_points 1000000 3000000 6000000
+"""
+import os
+import sys
+import time
+from argparse import ArgumentParser, Namespace
+
+import torch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scene.gaussian_model import GaussianModel
+
+
+def build_model(num_points, sh_degree, args, growable_storage=False):
+    """Gaussians with one optimizer step done and random densification statistics, the same for a given seed"""
+    generator = torch.Generator(device="cuda").manual_seed(0)
+    def randn(*shape):
+        return torch.randn(shape, generator=generator, device="cuda")
+    gaussians = GaussianModel(sh_degree)
+    gaussians.instance_parm(randn(num_points, 3), randn(num_points, 3, 1), randn(num_points, 3, (sh_degree + 1) ** 2 - 1),
+                            randn(num_points, 1) - 2, randn(num_points, 3) - 5, randn(num_points, 4))
+    gaussians.max_radii2D = torch.zeros(num_points, device="cuda")
+    gaussians.training_setup(Namespace(percent_dense=0.01, position_lr_init=0.00016, position_lr_final=0.0000016,
+                                       position_lr_delay_mult=0.01, position_lr_max_steps=30_000, feature_lr=0.0025,
+                                       opacity_lr=0.05, scaling_lr=0.005, rotation_lr=0.001,
+                                       growable_storage=growable_storage))
+    for group in gaussians.optimizer.param_groups:
+        group["params"][0].grad = randn(*group["params"][0].shape) * 1e-3
+    gaussians.optimizer.step()
+    gaussians.optimizer.zero_grad(set_to_none=True)
+    visible = torch.rand(num_points, generator=generator, device="cuda") < args.visible_fraction
+    gaussians.xyz_gradient_accum[visible] = torch.rand((int(visible.sum()), 1), generator=generator, device="cuda") * \
+                                            args.grad_threshold / (1 - args.densify_fraction)
+    gaussians.denom[visible] = 1
+    gaussians.max_radii2D[visible] = torch.rand(int(visible.sum()), generator=generator, device="cuda") * 25
+    return gaussians
+
+
+def densify_and_prune_sequential(gaussians, max_grad, min_opacity, extent, max_screen_size):
+    """The clone, split, prune sequence densify_and_prune replaces"""
+    grads = gaussians.xyz_gradient_accum / gaussians.denom
+    grads[grads.isnan()] = 0.0
+
+    gaussians.densify_and_clone(grads, max_grad, extent)
+    gaussians.densify_and_split(grads, max_grad, extent)
+
+    prune_mask = (gaussians.get_opacity < min_opacity).squeeze()
+    if max_screen_size:
+        big_points_vs = gaussians.max_radii2D > max_screen_size
+        big_points_ws = gaussians.get_scaling.max(dim=1).values > 0.1 * extent
+        prune_mask = torch.logical_or(torch.logical_or(prune_mask, big_points_vs), big_points_ws)
+    gaussians.prune_points(prune_mask)
+
+    torch.cuda.empty_cache()
+
+
+def snapshot(gaussians):
+    tensors = {name: getattr(gaussians, name).detach().clone() for name in
+               ("_xyz", "_features_dc", "_features_rest", "_opacity", "_scaling", "_rotation",
+                "xyz_gradient_accum", "denom", "max_radii2D")}
+    for group in gaussians.optimizer.param_groups:
+        state = gaussians.optimizer.state[group["params"][0]]
+        tensors[group["name"] + ".exp_avg"] = state["exp_avg"].clone()
+        tensors[group["name"] + ".exp_avg_sq"] = state["exp_avg_sq"].clone()
+    return tensors
+
+
+def timed_densify(args, num_points, mode):
+    """:return: seconds of the densification step (median of the repeats), state after the last one"""
+    times = []
+    for _ in range(args.repeats):
+        gaussians = build_model(num_points, args.sh_degree, args, mode == "growable storage")
+        torch.manual_seed(1)
+        torch.cuda.synchronize()
+        start = time.perf_counter()
+        if mode == "sequential":
+            densify_and_prune_sequential(gaussians, args.grad_threshold, 0.005, 1.0, 20)
+        else:
+            gaussians.densify_and_prune(args.grad_threshold, 0.005, 1.0, 20)
+        torch.cuda.synchronize()
+        times.append(time.perf_counter() - start)
+    result = snapshot(gaussians)
+    del gaussians
+    torch.cuda.empty_cache()
+    return sorted(times)[len(times) // 2], result
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Densification step benchmark")
+    parser.add_argument("--num_points", type=int, nargs="+", default=[1_000_000, 3_000_000, 6_000_000])
+    parser.add_argument("--sh_degree", type=int, default=3)
+    parser.add_argument("--grad_threshold", type=float, default=0.0002)
+    parser.add_argument("--visible_fraction", type=float, default=0.2)
+    parser.add_argument("--densify_fraction", type=float, default=0.2, help="of the visible points")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+    assert torch.cuda.is_available(), "the densification code runs on cuda"
+
+    for num_points in args.num_points:
+        reference_seconds, reference = timed_densify(args, num_points, "sequential")
+        print("{} points -> {}: sequential {:.3f}s".format(num_points, reference["_xyz"].shape[0], reference_seconds),
+              end="")
+        for mode in ("single pass", "growable storage"):
+            seconds, result = timed_densify(args, num_points, mode)
+            for name, tensor in reference.items():
+                assert torch.equal(tensor, result[name]), (mode, name)
+            print(", {} {:.3f}s".format(mode, seconds), end="")
+            del result
+        print()
+        del reference
@@ -0,0 +1,105 @@
+"""
+致密化过程中的显存分配次数和峰值: 每次致密化重新分配所有张量与预留容量的ParameterStorage(--growable_storage)
+模拟完整的致密化流程(densify_from_iter到densify_until_iter), 梯度统计随机生成, 两种方式使用相同的随机数, 结果应一致
+python playground/bench_growable_storage.py --num_points 1000000
+"""
+import os
+import sys
+import time
+from argparse import ArgumentParser, Namespace
+
+import torch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scene.gaussian_model import GaussianModel
+
+
+def training_args(growable_storage):
+    return Namespace(percent_dense=0.01, position_lr_init=0.00016, position_lr_final=0.0000016,
+                     position_lr_delay_mult=0.01, position_lr_max_steps=30_000, feature_lr=0.0025,
+                     opacity_lr=0.05, scaling_lr=0.005, rotation_lr=0.001, growable_storage=growable_storage)
+
+
+def build_model(num_points, sh_degree, seed):
+    generator = torch.Generator(device="cuda").manual_seed(seed)
+    def randn(*shape):
+        return torch.randn(shape, generator=generator, device="cuda")
+    gaussians = GaussianModel(sh_degree)
+    gaussians.instance_parm(randn(num_points, 3), randn(num_points, 3, 1), randn(num_points, 3, (sh_degree + 1) ** 2 - 1),
+                            randn(num_points, 1), randn(num_points, 3) - 5, randn(num_points, 4))
+    gaussians.active_sh_degree = 0
+    gaussians.max_radii2D = torch.zeros(num_points, device="cuda")
+    return gaussians
+
+
+def snapshot(gaussians):
+    tensors = {name: getattr(gaussians, name).detach().cpu() for name in
+               ("_xyz", "_features_dc", "_features_rest", "_opacity", "_scaling", "_rotation")}
+    for group in gaussians.optimizer.param_groups:
+        state = gaussians.optimizer.state[group["params"][0]]
+        tensors[group["name"] + ".exp_avg"] = state["exp_avg"].cpu()
+        tensors[group["name"] + ".exp_avg_sq"] = state["exp_avg_sq"].cpu()
+    return tensors
+
+
+def run_schedule(args, growable_storage):
+    """:return: final model, seconds in densification, allocations in densification, peak allocated bytes"""
+    torch.manual_seed(0)
+    gaussians = build_model(args.num_points, args.sh_degree, 0)
+    gaussians.training_setup(training_args(growable_storage))
+    torch.cuda.synchronize()
+    torch.cuda.reset_peak_memory_stats()
+    seconds, allocations = 0.0, 0
+    for iteration in range(args.densify_from_iter, args.densify_until_iter + 1, args.densification_interval):
+        # 一次优化器步代替两次致密化之间的训练
+        for param in gaussians.optimizer.param_groups:
+            param["params"][0].grad = torch.randn_like(param["params"][0]) * 1e-3
+        gaussians.optimizer.step()
+        gaussians.optimizer.zero_grad(set_to_none=True)
+        num_points = gaussians.get_xyz.shape[0]
+        visible = torch.rand(num_points, device="cuda") < args.visible_fraction
+        # densify_fraction的可见点梯度超过阈值, 约五分之一的可见点超过屏幕尺寸阈值(20)
+        gaussians.xyz_gradient_accum[visible] += torch.rand((int(visible.sum()), 1), device="cuda") * \
+                                                 args.grad_threshold / (1 - args.densify_fraction)
+        gaussians.denom[visible] += 1
+        gaussians.max_radii2D[visible] = torch.rand(int(visible.sum()), device="cuda") * 25
+
+        torch.cuda.synchronize()
+        before = torch.cuda.memory_stats()["allocation.all.allocated"]
+        start = time.perf_counter()
+        gaussians.densify_and_prune(args.grad_threshold, 0.005, 1.0, 20 if iteration > args.opacity_reset_interval else None)
+        if iteration % args.opacity_reset_interval == 0:
+            gaussians.reset_opacity()
+        torch.cuda.synchronize()
+        seconds += time.perf_counter() - start
+        allocations += torch.cuda.memory_stats()["allocation.all.allocated"] - before
+    return gaussians, seconds, allocations, torch.cuda.max_memory_allocated()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Growable parameter storage benchmark")
+    parser.add_argument("--num_points", type=int, default=1_000_000)
+    parser.add_argument("--sh_degree", type=int, default=3)
+    parser.add_argument("--densify_from_iter", type=int, default=500)
+    parser.add_argument("--densify_until_iter", type=int, default=15_000)
+    parser.add_argument("--densification_interval", type=int, default=100)
+    parser.add_argument("--opacity_reset_interval", type=int, default=3000)
+    parser.add_argument("--grad_threshold", type=float, default=0.0002)
+    parser.add_argument("--visible_fraction", type=float, default=0.05)
+    parser.add_argument("--densify_fraction", type=float, default=0.2, help="of the visible points")
+    args = parser.parse_args()
+    assert torch.cuda.is_available(), "the densification code runs on cuda"
+
+    results = {}
+    for growable_storage in (False, True):
+        gaussians, seconds, allocations, peak = run_schedule(args, growable_storage)
+        results[growable_storage] = snapshot(gaussians)
+        print("{:<16}: {} -> {} points, densification {:.2f}s, {} allocations, peak {:.1f} MB".format(
+            "growable storage" if growable_storage else "reallocating", args.num_points, gaussians.get_xyz.shape[0],
+            seconds, allocations, peak / 2 ** 20))
+        del gaussians
+        torch.cuda.empty_cache()
+
+    for name, tensor in results[False].items():
+        assert torch.equal(tensor, results[True][name]), name
+    print("parameters and optimizer state identical")
@@ -0,0 +1,64 @@
+"""
+训练图像memmap缓存(utils/image_store.py)的启动时间测试: 生成随机jpg, 对比逐张解码缩放, 第一次写缓存, 以及再次打开缓存
+python playground/bench_image_store.py --num_images 200 --width 3840 --height 2160
+"""
+import os
+import sys
+import time
+import tempfile
+from types import SimpleNamespace
+from argparse import ArgumentParser
+
+import numpy as np
+import torch
+from PIL import Image
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scene.dataset_readers import CameraInfo, openImage
+from utils.camera_utils import getResolution, loadImageTensors, imageTensorsFromArrays, imageStore_from_camInfos
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Image store benchmark")
+    parser.add_argument("--num_images", type=int, default=100)
+    parser.add_argument("--width", type=int, default=3840)
+    parser.add_argument("--height", type=int, default=2160)
+    parser.add_argument("--resolution", type=int, default=-1)
+    parser.add_argument("--data_workers", type=int, default=8)
+    args = parser.parse_args()
+    model_args = SimpleNamespace(resolution=args.resolution, data_workers=args.data_workers)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        rng = np.random.default_rng(0)
+        cam_infos = []
+        for idx in range(args.num_images):
+            path = os.path.join(tmp, "{:05d}.jpg".format(idx))
+            # 低频噪声, 压缩率接近真实照片
+            small = rng.integers(0, 256, (args.height // 16, args.width // 16, 3), dtype=np.uint8)
+            Image.fromarray(small).resize((args.width, args.height)).save(path, quality=90)
+            cam_infos.append(CameraInfo(uid=idx, R=np.eye(3), T=np.zeros(3), FovY=1.0, FovX=1.0, image=None, depth=None,
+                                        image_path=path, image_name=str(idx), width=args.width, height=args.height))
+
+        def decode_all():
+            tensors = []
+            for c in cam_infos:
+                image, depth = openImage(c.image_path)
+                tensors.append(loadImageTensors(image, depth, getResolution(model_args, c.width, c.height, 1.0))[0])
+            return tensors
+
+        def store_all():
+            store = imageStore_from_camInfos(cam_infos, 1.0, model_args, os.path.join(tmp, "cache"))
+            return [imageTensorsFromArrays(*store.get(c.image_path))[0] for c in cam_infos]
+
+        t_decode, reference = timed(decode_all)
+        t_cold, _ = timed(store_all)
+        t_warm, cached = timed(store_all)
+        assert all(torch.equal(a, b) for a, b in zip(reference, cached))
+        print("{} images {}x{}: decode + resize {:.2f}s, store cold {:.2f}s, store warm {:.2f}s".format(
+            args.num_images, args.width, args.height, t_decode, t_cold, t_warm))
@@ -0,0 +1,66 @@
+"""
+CPU最近邻(utils/knn_utils.py)与暴力计算的对比, 以及大点云上的耗时; 有simple_knn和CUDA时同时对比distCUDA2
+python playground/bench_knn.py --num_check 20000 --num_points 10000000
+"""
+import os
+import sys
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+import torch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.knn_utils import knn_mean_dist2_cpu, knn_backend_available, mean_knn_dist2
+
+
+def brute_force_mean_dist2(points, k=3, chunk=2048):
+    points = torch.from_numpy(points).double()
+    result = []
+    for start in range(0, points.shape[0], chunk):
+        dist2 = torch.cdist(points[start:start + chunk], points) ** 2
+        rows = torch.arange(dist2.shape[0])
+        dist2[rows, rows + start] = float("inf")
+        result.append(dist2.topk(min(k, points.shape[0] - 1), largest=False).values.mean(dim=1))
+    return torch.cat(result).float().numpy()
+
+
+def test_clouds(num_points, rng):
+    surface = np.c_[rng.random((num_points, 2)), np.zeros(num_points)]
+    return {
+        "uniform": rng.random((num_points, 3)),
+        "surface + floaters": np.r_[surface, rng.random((num_points // 100, 3)) * 50],
+        "clusters": np.r_[rng.normal(size=(num_points // 2, 3)) * 1e-3, rng.normal(size=(num_points // 2, 3)) * 10 + 100],
+        "duplicates": np.repeat(rng.random((num_points // 3, 3)), 3, axis=0),
+        "line": np.c_[np.linspace(0, 1, num_points), np.zeros(num_points), np.zeros(num_points)],
+        "3 points": rng.random((3, 3)),
+    }
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="CPU knn benchmark")
+    parser.add_argument("--num_check", type=int, default=20000, help="points of the brute force comparisons")
+    parser.add_argument("--num_points", type=int, default=1000000, help="points of the timing run")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for name, points in test_clouds(args.num_check, rng).items():
+        points = points.astype(np.float32)
+        reference = brute_force_mean_dist2(points)
+        result = knn_mean_dist2_cpu(points)
+        error = np.max(np.abs(result - reference) / np.maximum(reference, 1e-12))
+        assert error < 1e-5, (name, error)
+        print("{:<20}: {} points, max relative difference {:.3g}".format(name, points.shape[0], error))
+
+    # 厚度为1%的曲面
+    points = np.c_[rng.random((args.num_points, 2)), rng.random(args.num_points) * 0.01].astype(np.float32)
+    start = time.perf_counter()
+    result = knn_mean_dist2_cpu(points)
+    print("cpu : {} points in {:.2f}s".format(args.num_points, time.perf_counter() - start))
+    if knn_backend_available("cuda"):
+        start = time.perf_counter()
+        cuda_result = mean_knn_dist2(torch.from_numpy(points), "cuda").cpu().numpy()
+        torch.cuda.synchronize()
+        print("cuda: {} points in {:.2f}s, max relative difference {:.3g}".format(
+            args.num_points, time.perf_counter() - start,
+            np.max(np.abs(cuda_result - result) / np.maximum(result, 1e-12))))
@@ -0,0 +1,128 @@
+"""
+高斯点云ply读写的性能测试，使用随机生成的高斯参数，只需要CPU
+python playground/bench_ply_io.py --counts 100000 1000000 5000000
+"""
+import os
+import sys
+import time
+import tracemalloc
+import tempfile
+from argparse import ArgumentParser
+
+import numpy as np
+import torch
+from plyfile import PlyData, PlyElement
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.ply_utils import write_ply_chunked, load_gaussian_ply
+
+
+def random_gaussians(num, sh_degree=3):
+    rest = (sh_degree + 1) ** 2 - 1
+    return {
+        "xyz": torch.randn(num, 3),
+        "f_dc": torch.randn(num, 1, 3),
+        "f_rest": torch.randn(num, rest, 3),
+        "opacity": torch.randn(num, 1),
+        "scaling": torch.randn(num, 3),
+        "rotation": torch.randn(num, 4),
+    }
+
+
+def attribute_names(g):
+    l = ['x', 'y', 'z', 'nx', 'ny', 'nz']
+    l += ['f_dc_{}'.format(i) for i in range(g["f_dc"].shape[1] * g["f_dc"].shape[2])]
+    l += ['f_rest_{}'.format(i) for i in range(g["f_rest"].shape[1] * g["f_rest"].shape[2])]
+    l.append('opacity')
+    l += ['scale_{}'.format(i) for i in range(g["scaling"].shape[1])]
+    l += ['rot_{}'.format(i) for i in range(g["rotation"].shape[1])]
+    return l
+
+
+def save_legacy(path, g):
+    # 原来GaussianModel.save_ply的实现
+    xyz = g["xyz"].numpy()
+    normals = np.zeros_like(xyz)
+    f_dc = g["f_dc"].transpose(1, 2).flatten(start_dim=1).contiguous().numpy()
+    f_rest = g["f_rest"].transpose(1, 2).flatten(start_dim=1).contiguous().numpy()
+    dtype_full = [(attribute, 'f4') for attribute in attribute_names(g)]
+    elements = np.empty(xyz.shape[0], dtype=dtype_full)
+    attributes = np.concatenate((xyz, normals, f_dc, f_rest, g["opacity"].numpy(),
+                                 g["scaling"].numpy(), g["rotation"].numpy()), axis=1)
+    elements[:] = list(map(tuple, attributes))
+    PlyData([PlyElement.describe(elements, 'vertex')]).write(path)
+
+
+def save_chunked(path, g):
+    columns = [g["xyz"], 3, g["f_dc"].transpose(1, 2), g["f_rest"].transpose(1, 2),
+               g["opacity"], g["scaling"], g["rotation"]]
+    write_ply_chunked(path, attribute_names(g), columns)
+
+
+def load_legacy(path, max_sh_degree=3):
+    # 原来GaussianModel.load_ply_no_instance的实现
+    plydata = PlyData.read(path)
+    xyz = np.stack((np.asarray(plydata.elements[0]["x"]),
+                    np.asarray(plydata.elements[0]["y"]),
+                    np.asarray(plydata.elements[0]["z"])), axis=1)
+    opacities = np.asarray(plydata.elements[0]["opacity"])[..., np.newaxis]
+
+    features_dc = np.zeros((xyz.shape[0], 3, 1))
+    for i in range(3):
+        features_dc[:, i, 0] = np.asarray(plydata.elements[0]["f_dc_{}".format(i)])
+
+    def read_group(prefix):
+        names = [p.name for p in plydata.elements[0].properties if p.name.startswith(prefix)]
+        names = sorted(names, key=lambda x: int(x.split('_')[-1]))
+        values = np.zeros((xyz.shape[0], len(names)))
+        for idx, attr_name in enumerate(names):
+            values[:, idx] = np.asarray(plydata.elements[0][attr_name])
+        return values
+
+    features_extra = read_group("f_rest_").reshape((xyz.shape[0], 3, (max_sh_degree + 1) ** 2 - 1))
+    return xyz, features_dc, features_extra, opacities, read_group("scale_"), read_group("rot")
+
+
+def measure(fn, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, result
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="PLY read/write benchmark")
+    parser.add_argument("--counts", nargs="+", type=int, default=[100_000, 1_000_000])
+    parser.add_argument("--skip_legacy", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = os.path.join(tmp, "legacy.ply")
+        chunked_path = os.path.join(tmp, "chunked.ply")
+        row = "{:>6} {:>10} | {:>22} | {:>22}"
+        print(row.format("", "gaussians", "legacy s / peak MB", "new s / peak MB"))
+        for num in args.counts:
+            g = random_gaussians(num)
+            t_new, m_new, _ = measure(save_chunked, chunked_path, g)
+            if args.skip_legacy:
+                legacy = "skipped"
+            else:
+                t_old, m_old, _ = measure(save_legacy, legacy_path, g)
+                with open(legacy_path, 'rb') as f_old, open(chunked_path, 'rb') as f_new:
+                    assert f_old.read() == f_new.read(), "chunked writer is not byte-identical"
+                legacy = "{:8.2f} / {:9.1f}".format(t_old, m_old / 2 ** 20)
+            print(row.format("save", num, legacy, "{:8.2f} / {:9.1f}".format(t_new, m_new / 2 ** 20)))
+
+            del g
+            t_new, m_new, loaded = measure(load_gaussian_ply, chunked_path, 3)
+            if args.skip_legacy:
+                legacy = "skipped"
+            else:
+                t_old, m_old, reference = measure(load_legacy, chunked_path)
+                for new, old in zip(loaded, reference):
+                    assert new.dtype == np.float32 and np.array_equal(new, old.astype(np.float32))
+                legacy = "{:8.2f} / {:9.1f}".format(t_old, m_old / 2 ** 20)
+            print(row.format("load", num, legacy, "{:8.2f} / {:9.1f}".format(t_new, m_new / 2 ** 20)))
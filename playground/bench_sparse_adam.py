@@ -0,0 +1,104 @@
+"""
+优化器一步的耗时: torch.optim.Adam与只更新可见高斯的VisibleAdam(--sparse_adam), 按高斯数和可见比例
+全部可见时VisibleAdam应与Adam一致, 不可见的行保持不变
+python playground/bench_sparse_adam.py --num_points 1000000 3000000 6000000 --visible_fractions 0.05 0.2 0.5 1.0
+"""
+import os
+import sys
+import time
+from argparse import ArgumentParser
+
+import torch
+from torch import nn
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.optimizer_utils import VisibleAdam
+
+# GaussianModel.training_setup中的参数组: 名称, 每行的形状, 学习率
+GROUPS = [("xyz", (3,), 0.00016), ("f_dc", (1, 3), 0.0025), ("f_rest", (15, 3), 0.0025 / 20.0),
+          ("opacity", (1,), 0.05), ("scaling", (3,), 0.005), ("rotation", (4,), 0.001)]
+
+
+def build_optimizer(kind, num_points, device, seed=0):
+    generator = torch.Generator(device=device).manual_seed(seed)
+    groups = [{"params": [nn.Parameter(torch.randn((num_points,) + shape, generator=generator, device=device))],
+               "lr": lr, "name": name} for name, shape, lr in GROUPS]
+    if kind == "adam":
+        return torch.optim.Adam(groups, lr=0.0, eps=1e-15)
+    return VisibleAdam(groups, lr=0.0, eps=1e-15, lazy_bias_correction=kind == "visible adam (lazy)")
+
+
+def set_gradients(optimizer, visible, generator):
+    # 不可见的高斯梯度为0, 与渲染时相同
+    for group in optimizer.param_groups:
+        param = group["params"][0]
+        param.grad = torch.randn(param.shape, generator=generator, device=param.device) * \
+                     visible.view((-1,) + (1,) * (param.dim() - 1))
+
+
+def params(optimizer):
+    return [group["params"][0].detach().clone() for group in optimizer.param_groups]
+
+
+def check(device, num_points=10000, steps=5):
+    generator = torch.Generator(device=device)
+    adam, visible_adam = build_optimizer("adam", num_points, device), build_optimizer("visible adam", num_points, device)
+    everything = torch.ones(num_points, dtype=torch.bool, device=device)
+    for step in range(steps):
+        for optimizer in (adam, visible_adam):
+            generator.manual_seed(step)
+            set_gradients(optimizer, everything, generator)
+        adam.step()
+        visible_adam.step(everything)
+    for reference, result in zip(params(adam), params(visible_adam)):
+        assert torch.allclose(reference, result, rtol=0, atol=1e-6), (reference - result).abs().max()
+
+    for kind in ("visible adam", "visible adam (lazy)"):
+        optimizer = build_optimizer(kind, num_points, device)
+        visible = torch.rand(num_points, generator=generator, device=device) < 0.2
+        before = params(optimizer)
+        set_gradients(optimizer, visible, generator)
+        optimizer.step(visible)
+        for reference, result in zip(before, params(optimizer)):
+            assert torch.equal(reference[~visible], result[~visible]), kind
+    print("all visible: same as Adam, hidden rows unchanged")
+
+
+def timed_step(kind, num_points, visible_fraction, device, repeats):
+    optimizer = build_optimizer(kind, num_points, device)
+    generator = torch.Generator(device=device).manual_seed(1)
+    times = []
+    for _ in range(repeats + 1):
+        visible = torch.rand(num_points, generator=generator, device=device) < visible_fraction
+        set_gradients(optimizer, visible, generator)
+        if device == "cuda":
+            torch.cuda.synchronize()
+        start = time.perf_counter()
+        if kind == "adam":
+            optimizer.step()
+        else:
+            optimizer.step(visible)
+        if device == "cuda":
+            torch.cuda.synchronize()
+        times.append(time.perf_counter() - start)
+    # 第一步包含状态初始化
+    return sorted(times[1:])[repeats // 2]
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Sparse Adam benchmark")
+    parser.add_argument("--num_points", type=int, nargs="+", default=[1_000_000, 3_000_000, 6_000_000])
+    parser.add_argument("--visible_fractions", type=float, nargs="+", default=[0.05, 0.2, 0.5, 1.0])
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+
+    check(device)
+    for num_points in args.num_points:
+        for visible_fraction in args.visible_fractions:
+            seconds = {kind: timed_step(kind, num_points, visible_fraction, device, args.repeats)
+                       for kind in ("adam", "visible adam", "visible adam (lazy)")}
+            print("{} points, {:.0%} visible: ".format(num_points, visible_fraction) +
+                  ", ".join("{} {:.1f}ms".format(kind, 1000 * value) for kind, value in seconds.items()))
+        if device == "cuda":
+            torch.cuda.empty_cache()
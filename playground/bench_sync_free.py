@@ -0,0 +1,37 @@
+"""
+训练循环每秒迭代次数: 每次迭代取回损失(默认)与标量留在设备上每N次迭代取回一次(--sync_interval N)
+python playground/bench_sync_free.py -s data/garden --images images_4 --iterations 3000 --sync_intervals 0 100
+"""
+import os
+import re
+import sys
+import tempfile
+import subprocess
+from argparse import ArgumentParser
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Sync free training loop benchmark")
+    parser.add_argument("--source_path", "-s", required=True, type=str)
+    parser.add_argument("--images", default="images_4", type=str)
+    parser.add_argument("--iterations", type=int, default=3000)
+    parser.add_argument("--sync_intervals", nargs="+", type=int, default=[0, 100])
+    args, extra = parser.parse_known_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for sync_interval in args.sync_intervals:
+            model_path = os.path.join(tmp, "s{}".format(sync_interval))
+            command = [sys.executable, os.path.join(ROOT, "train.py"), "-s", args.source_path, "-m", model_path,
+                       "--images", args.images, "--iterations", str(args.iterations),
+                       "--test_iterations", str(args.iterations + 1), "--save_iterations", str(args.iterations),
+                       "--sync_interval", str(sync_interval)] + extra
+            output = subprocess.run(command, cwd=ROOT, capture_output=True, text=True, check=True).stdout
+            speed = re.findall(r"Training: \d+ iterations in \S+s, (\S+) it/s", output)
+            results.append((sync_interval, float(speed[-1]) if speed else float("nan")))
+
+    for sync_interval, speed in results:
+        print("{:<24}: {:7.2f} it/s".format("sync every iteration" if sync_interval == 0 else
+                                            "sync every {} iterations".format(sync_interval), speed))
@@ -0,0 +1,54 @@
+"""
+相机图像float32存储与uint8存储(--uint8_images)的内存对比, 按相机数统计训练图像和深度图占用的内存以及每次迭代上传的字节数
+python playground/bench_uint8_images.py --num_cameras 1000 --width 1600 --height 900
+"""
+import os
+import sys
+from argparse import ArgumentParser
+
+import numpy as np
+import torch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import scene  # noqa: F401, scene imports utils.camera_utils first
+from utils.general_utils import stored_to_float
+from utils.camera_utils import imageTensorsFromArrays
+
+
+def tensor_bytes(*tensors):
+    return sum(t.element_size() * t.nelement() for t in tensors if t is not None)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="uint8 image storage memory report")
+    parser.add_argument("--num_cameras", type=int, default=1000)
+    parser.add_argument("--width", type=int, default=1600)
+    parser.add_argument("--height", type=int, default=900)
+    parser.add_argument("--depth_bits", type=int, default=16, choices=[0, 8, 16])
+    parser.add_argument("--samples", type=int, default=8, help="cameras actually converted and compared")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    per_camera = {}
+    for compact in [False, True]:
+        for _ in range(args.samples):
+            image = rng.integers(0, 256, (args.height, args.width, 3), dtype=np.uint8)
+            depth = None
+            if args.depth_bits:
+                depth = rng.integers(0, 2 ** args.depth_bits, (args.height, args.width)).astype(
+                    np.uint8 if args.depth_bits == 8 else np.uint16)
+            gt_image, _, gt_depth = imageTensorsFromArrays(image, depth, compact=compact)
+            if compact:
+                reference_image, _, reference_depth = imageTensorsFromArrays(image, depth)
+                assert torch.equal(stored_to_float(gt_image), reference_image)
+                assert gt_depth is None or torch.equal(stored_to_float(gt_depth), reference_depth)
+            per_camera[compact] = (tensor_bytes(gt_image), tensor_bytes(gt_depth))
+
+        image_bytes, depth_bytes = per_camera[compact]
+        total = args.num_cameras * (image_bytes + depth_bytes)
+        print("{:<8}: image {} + depth {} per camera, {} cameras {:8.1f} MB, upload {:5.1f} MB/iter".format(
+            "uint8" if compact else "float32", gt_image.dtype, None if gt_depth is None else gt_depth.dtype,
+            args.num_cameras, total / 2 ** 20, (image_bytes + depth_bytes) / 2 ** 20))
+
+    saved = 1 - sum(per_camera[True]) / sum(per_camera[False])
+    print("uint8 storage uses {:.1f}% less memory".format(100 * saved))
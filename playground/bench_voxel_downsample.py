@@ -0,0 +1,44 @@
+"""
+稠密初始点云下采样对比: 随机采样(原fetchPly)与体素下采样(utils/point_utils.py), 统计耗时以及稀疏区域保留的点数比例
+python playground/bench_voxel_downsample.py --num_points 50000000 --max_points 300000
+"""
+import os
+import sys
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.point_utils import downsample_points, point_columns, occupied_voxels
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Voxel downsampling benchmark")
+    parser.add_argument("--num_points", type=int, default=10_000_000)
+    parser.add_argument("--max_points", type=int, default=300_000)
+    parser.add_argument("--dense_fraction", type=float, default=0.9, help="points in the dense patch (1%% of the area)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    # 单位平面, dense_fraction的点集中在0.1x0.1的区域, 模拟MVS/SLAM中纹理丰富的区域
+    uv = rng.random((args.num_points, 2), dtype=np.float32)
+    uv[rng.random(args.num_points) < args.dense_fraction] *= 0.1
+    points = np.c_[uv, np.zeros(args.num_points, dtype=np.float32)]
+    colors = rng.random((args.num_points, 3))
+    normals = np.zeros((args.num_points, 3))
+
+    def report(name, sampled, elapsed):
+        sparse = np.mean((sampled[:, 0] > 0.1) | (sampled[:, 1] > 0.1))
+        # 以1/64为边长统计被覆盖的网格数
+        covered = occupied_voxels(point_columns(sampled), 1 / 64)[0].shape[0]
+        print("{:<7}: {:.2f}s, {} points, {:.1%} outside the dense patch, {} of 4096 cells covered".format(
+            name, elapsed, sampled.shape[0], sparse, covered))
+
+    start = time.perf_counter()
+    random_points = points[rng.choice(args.num_points, args.max_points, replace=False)]
+    report("random", random_points, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    voxel_points, _, _ = downsample_points(points, colors, normals, args.max_points)
+    report("voxel", voxel_points, time.perf_counter() - start)
@@ -0,0 +1,32 @@
+#
+# Copyright (C) 2023, Inria
+# GRAPHDECO research group, https://team.inria.fr/graphdeco
+# All rights reserved.
+#
+# This software is free for non-commercial, research and evaluation use
+# under the terms of the LICENSE.md file.
+#
+# For inquiries contact  george.drettakis@inria.fr
+#
+
+from argparse import ArgumentParser
+import numpy as np
+from scene.dataset_readers import fetchPly, storePly
+from utils.outlier_utils import remove_outliers, OUTLIER_MODES
+
+if __name__ == "__main__":
+    # 去除初始点云(points3d.ply等)中的离群点, 与训练时的--outlier_removal相同
+    parser = ArgumentParser(description="Initial point cloud outlier removal")
+    parser.add_argument("--input", "-i", required=True, type=str)
+    parser.add_argument("--output", "-o", required=True, type=str)
+    parser.add_argument("--mode", default="statistical", choices=OUTLIER_MODES[1:])
+    parser.add_argument("--neighbors", default=20, type=int,
+                        help="statistical: neighbors of the mean distance, radius: minimum neighbor count")
+    parser.add_argument("--std_ratio", default=2.0, type=float)
+    parser.add_argument("--radius", default=0.0, type=float)
+    args = parser.parse_args()
+
+    pcd = fetchPly(args.input, init_sampling="none")
+    pcd, _ = remove_outliers(pcd, args.mode, args.neighbors, args.std_ratio, args.radius)
+    storePly(args.output, np.asarray(pcd.points), np.round(np.asarray(pcd.colors) * 255))
+    print("Saved {} points to {}".format(pcd.points.shape[0], args.output))
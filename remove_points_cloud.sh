@@ -1 +1,10 @@
-mkdir
\ No newline at end of file
+#!/bin/bash
+# 去除初始点云中的离群点
+# 用法: bash remove_points_cloud.sh <input.ply> <output.ply> [statistical|radius] [其他remove_outliers.py参数]
+# 例如: bash remove_points_cloud.sh data/points3d.ply data/points3d_clean.ply radius --radius 0.05 --neighbors 16
+set -e
+INPUT=$1
+OUTPUT=$2
+MODE=${3:-statistical}
+shift $(( $# < 3 ? $# : 3 ))
+python remove_outliers.py --input "$INPUT" --output "$OUTPUT" --mode "$MODE" "$@"
@@ -15,11 +15,14 @@ import json
 
 import numpy as np
 
-from utils.system_utils import searchForMaxIteration
+from utils.system_utils import searchForMaxIteration, mkdir_p, atomic_output
 from scene.dataset_readers import sceneLoadTypeCallbacks
+from scene.scene_cache import load_scene_info, CACHE_DIR
 from scene.gaussian_model import GaussianModel
 from arguments import ModelParams
-from utils.camera_utils import cameraList_from_camInfos, camera_to_JSON
+from utils.camera_utils import cameraList_from_camInfos, camera_to_JSON, imageStore_from_camInfos
+from utils.outlier_utils import remove_outliers
+from utils.image_cache import ImageCache
 from dataclasses import dataclass
 
 class Scene:
@@ -35,11 +38,13 @@ class Scene:
         scales: np.ndarray
         rots: np.ndarray
 
-    def __init__(self, args : ModelParams, gaussians : GaussianModel, load_iteration=None, shuffle=True, resolution_scales=[1.0], sub_scene=[None], low_memory=False):
+    def __init__(self, args : ModelParams, gaussians : GaussianModel, load_iteration=None, shuffle=True, resolution_scales=[1.0], sub_scene=[None], low_memory=False, region=None):
         """b
         :param path: Path to colmap scene main folder.
+        :param region: (2, 3) aabb, load only the cells of a chunked point cloud that intersect it
         """
         self.model_path = args.model_path
+        self.checkpoint_format = self.checkpoint_format_aliases.get(args.checkpoint_format, args.checkpoint_format)
         self.loaded_iter = None
         self.gaussians = gaussians
 
@@ -54,21 +59,36 @@ class Scene:
         self.test_cameras = {}
 
         if os.path.exists(os.path.join(args.source_path, "sparse")):
-            scene_info = sceneLoadTypeCallbacks["Colmap"](args.source_path, args.images, args.eval, using_depth=args.using_depth)
+            scene_type, reader_args = "Colmap", (args.images, args.eval)
         elif os.path.exists(os.path.join(args.source_path, "transforms_train.json")):
             print("Found transforms_train.json file, assuming Blender data set!")
-            scene_info = sceneLoadTypeCallbacks["Blender"](args.source_path, args.white_background, args.eval, using_depth=args.using_depth)
+            scene_type, reader_args = "Blender", (args.white_background, args.eval)
         # 尝试下其他数据，比如slam转nerfstudio
         elif os.path.exists(os.path.join(args.source_path, "transforms.json")):
             print("Found transforms.json file, assuming NeRFstudio data set!")
-            scene_info = sceneLoadTypeCallbacks["NeRFstudio"](args.source_path, args.eval, using_depth=args.using_depth)
+            scene_type, reader_args = "NeRFstudio", (args.eval,)
 
         elif os.path.exists(os.path.join(args.source_path, "transforms_polycam.json")):
             print("Found transforms_polycam.json file, assuming Polycam data set!")
-            scene_info = sceneLoadTypeCallbacks["Polycam"](args.source_path, args.eval, using_depth=args.using_depth)            
+            scene_type, reader_args = "Polycam", (args.eval,)
         else:
             assert False, "Could not recognize scene type!"
 
+        # lazy_images: 相机只保存路径, 图像在使用时解码并放入按字节数限制大小的LRU缓存
+        lazy_images = args.lazy_images and not low_memory
+        self.image_cache = ImageCache(int(args.image_cache_mb * 2 ** 20)) if lazy_images else None
+        reader_kwargs = {"using_depth": args.using_depth, "data_workers": args.data_workers,
+                         "init_sampling": args.init_sampling, "init_max_points": args.init_max_points,
+                         "init_voxel_size": args.init_voxel_size}
+        # mmap_images: 缩放后的uint8图像保存在数据集的.gs_cache中, 每个分辨率一个memmap文件
+        mmap_images = args.mmap_images and not low_memory
+        if low_memory or lazy_images or mmap_images:
+            reader_kwargs["low_memory"] = True
+        if args.no_scene_cache:
+            scene_info = sceneLoadTypeCallbacks[scene_type](args.source_path, *reader_args, **reader_kwargs)
+        else:
+            scene_info = load_scene_info(scene_type, args.source_path, *reader_args, **reader_kwargs)
+
         if not self.loaded_iter:
             with open(scene_info.ply_path, 'rb') as src_file, open(os.path.join(self.model_path, "input.ply") , 'wb') as dest_file:
                 dest_file.write(src_file.read())
@@ -98,37 +118,91 @@ class Scene:
                 # self.test_cameras[resolution_scale] = cameraList_from_camInfos([scene_info.test_cameras[0]],
                 #                                                                resolution_scale, args)
             else:
+                # blender的RGBA图像在解码时与背景合成
+                white_background = args.white_background if scene_type == "Blender" else None
+                image_store = None
+                if mmap_images:
+                    image_store = imageStore_from_camInfos(scene_info.train_cameras + scene_info.test_cameras,
+                                                           resolution_scale, args,
+                                                           os.path.join(args.source_path, CACHE_DIR), white_background)
                 print("Loading Training Cameras")
-                self.train_cameras[resolution_scale] = cameraList_from_camInfos(scene_info.train_cameras, resolution_scale, args)
+                self.train_cameras[resolution_scale] = cameraList_from_camInfos(scene_info.train_cameras, resolution_scale, args,
+                                                                                image_cache=self.image_cache,
+                                                                                white_background=white_background,
+                                                                                image_store=image_store)
                 print("Loading Test Cameras")
-                self.test_cameras[resolution_scale] = cameraList_from_camInfos(scene_info.test_cameras, resolution_scale, args)
+                self.test_cameras[resolution_scale] = cameraList_from_camInfos(scene_info.test_cameras, resolution_scale, args,
+                                                                               image_cache=self.image_cache,
+                                                                               white_background=white_background,
+                                                                               image_store=image_store)
 
         if self.loaded_iter:
             if sub_scene[0] is None:
-                self.gaussians.load_ply(os.path.join(self.model_path,
-                                                               "point_cloud",
-                                                               "iteration_" + str(self.loaded_iter),
-                                                               "point_cloud.ply"))
+                self.gaussians.load_ply(self.point_cloud_file(self.loaded_iter), region=region)
             else:
-                sub_scene.insert(0, os.path.join(self.model_path,
-                                                               "point_cloud",
-                                                               "iteration_" + str(self.loaded_iter),
-                                                               "point_cloud.ply"))  # 构造场景点云列表
+                sub_scene.insert(0, self.point_cloud_file(self.loaded_iter))  # 构造场景点云列表
                 self.scene_list = []
                 for pcd_path in sub_scene:
                     # print(sub_scene)
                     assert os.path.exists(pcd_path), "pcd path must be exist!"
                     xyz, features_dc, features_extra, opacities, scales, rots =\
-                        self.gaussians.load_ply_no_instance(pcd_path)
+                        self.gaussians.load_ply_no_instance(pcd_path, region=region)
                     point_attribute = \
                         self.Point_attribute(xyz, features_dc, features_extra, opacities, scales, rots)
                     self.scene_list.append(point_attribute)
         else:
-            self.gaussians.create_from_pcd(scene_info.point_cloud, self.cameras_extent)
+            point_cloud = scene_info.point_cloud
+            if args.outlier_removal != "none":
+                point_cloud, _ = remove_outliers(point_cloud, args.outlier_removal, args.outlier_neighbors,
+                                                 args.outlier_std_ratio, args.outlier_radius)
+            self.gaussians.create_from_pcd(point_cloud, self.cameras_extent, args.knn_backend)
+
+    # 每种保存格式对应的文件名
+    point_cloud_names = {
+        "ply": "point_cloud.ply",
+        "compressed": "point_cloud.npz",
+        "chunked": "point_cloud_chunks",
+    }
+
+    # 旧的cfg_args中的格式名
+    checkpoint_format_aliases = {
+        "both": "ply,compressed",
+    }
+
+    def point_cloud_file(self, iteration):
+        # 多个格式时读取第一个
+        point_cloud_format = self.checkpoint_format.split(",")[0]
+        return os.path.join(self.model_path, "point_cloud", "iteration_{}".format(iteration),
+                            self.point_cloud_names[point_cloud_format])
+
+    def save(self, iteration, saver=None):
+        """saver: utils.async_saver.BackgroundSaver, write the point clouds on its worker thread"""
+        if saver is None:
+            self.save_gaussians(self.gaussians, iteration)
+        else:
+            g = self.gaussians
+            saver.submit(self._save_snapshot, iteration,
+                         (g._xyz, g._features_dc, g._features_rest, g._opacity, g._scaling, g._rotation))
+
+    def _save_snapshot(self, iteration, params):
+        gaussians = GaussianModel(self.gaussians.max_sh_degree)
+        (gaussians._xyz, gaussians._features_dc, gaussians._features_rest,
+         gaussians._opacity, gaussians._scaling, gaussians._rotation) = params
+        self.save_gaussians(gaussians, iteration)
 
-    def save(self, iteration):
+    def save_gaussians(self, gaussians, iteration):
         point_cloud_path = os.path.join(self.model_path, "point_cloud/iteration_{}".format(iteration))
-        self.gaussians.save_ply(os.path.join(point_cloud_path, "point_cloud.ply"))
+        mkdir_p(point_cloud_path)
+        for point_cloud_format in self.checkpoint_format.split(","):
+            assert point_cloud_format in self.point_cloud_names, "checkpoint format error!"
+            # 先写临时文件再重命名，避免留下写了一半的点云
+            with atomic_output(os.path.join(point_cloud_path, self.point_cloud_names[point_cloud_format])) as path:
+                if point_cloud_format == "ply":
+                    gaussians.save_ply(path)
+                elif point_cloud_format == "compressed":
+                    gaussians.save_compressed(path)
+                elif point_cloud_format == "chunked":
+                    gaussians.save_chunked(path)
 
     def save_clip(self, sub_scene, mask):
         point_cloud_path = os.path.join("sub_scene_lib/{}".format(sub_scene))
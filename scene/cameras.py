@@ -12,7 +12,9 @@
 import torch
 from torch import nn
 import numpy as np
-from utils.graphics_utils import getWorld2View2, getProjectionMatrix, fov2focal
+from utils.graphics_utils import getWorld2View2, getProjectionMatrix, fov2focal, \
+    getWorld2View2Batch, getProjectionMatrixBatch
+from utils.general_utils import stored_to_float
 
 class Camera(nn.Module):
     def __init__(self, colmap_id, R, T, FoVx, FoVy, image, gt_alpha_mask,
@@ -37,22 +39,33 @@ class Camera(nn.Module):
             print(f"[Warning] Custom device {data_device} failed, fallback to default cuda device" )
             self.data_device = torch.device("cuda")
 
-        self.original_image = image.clamp(0.0, 1.0).to(self.data_device)
+        self.original_image = self.prepare_image(image, gt_alpha_mask, self.data_device)
         self.depth = gt_depth.to(self.data_device) if gt_depth is not None else None
         self.image_width = self.original_image.shape[2]
         self.image_height = self.original_image.shape[1]
 
+        self.trans = trans
+        self.scale = scale
+        self.setup_projection()
+
+    @staticmethod
+    def prepare_image(image, gt_alpha_mask, data_device):
+        if image.dtype == torch.uint8:
+            # uint8存储, 只有存在alpha时才相乘
+            image = image.to(data_device)
+            if gt_alpha_mask is not None:
+                image = (image * stored_to_float(gt_alpha_mask.to(data_device))).round().to(torch.uint8)
+            return image
+        image = image.clamp(0.0, 1.0).to(data_device)
         if gt_alpha_mask is not None:
-            self.original_image *= gt_alpha_mask.to(self.data_device)
-        else:
-            self.original_image *= torch.ones((1, self.image_height, self.image_width), device=self.data_device)
+            image *= gt_alpha_mask.to(data_device)
+        return image
 
+    def setup_projection(self):
+        R, T, trans, scale = self.R, self.T, self.trans, self.scale
         self.zfar = 100.0
         self.znear = 0.01
 
-        self.trans = trans
-        self.scale = scale
-
         self.world_view_transform = torch.tensor(getWorld2View2(R, T, trans, scale)).transpose(0, 1).cuda()
         self.projection_matrix = getProjectionMatrix(znear=self.znear, zfar=self.zfar, fovX=self.FoVx, fovY=self.FoVy).transpose(0,1).cuda()
         self.full_proj_transform = (self.world_view_transform.unsqueeze(0).bmm(self.projection_matrix.unsqueeze(0))).squeeze(0)
@@ -68,6 +81,166 @@ class Camera(nn.Module):
         ]).cuda()
 
 
+class LazyCamera(Camera):
+    """
+    Camera holding only metadata, original_image / depth are decoded on access through an LRU image cache
+    (utils.image_cache.ImageCache) so the memory used by the images stays bounded.
+    :param loader: callable returning (image, gt_alpha_mask, gt_depth) tensors
+    """
+
+    def __init__(self, colmap_id, R, T, FoVx, FoVy, width, height, loader, image_cache,
+                 image_name, image_path, uid,
+                 trans=np.array([0.0, 0.0, 0.0]), scale=1.0, data_device = "cuda"
+                 ):
+        nn.Module.__init__(self)
+
+        self.uid = uid
+        self.colmap_id = colmap_id
+        self.R = R
+        self.T = T
+        self.FoVx = FoVx
+        self.FoVy = FoVy
+        self.image_name = image_name
+
+        try:
+            self.data_device = torch.device(data_device)
+        except Exception as e:
+            print(e)
+            print(f"[Warning] Custom device {data_device} failed, fallback to default cuda device" )
+            self.data_device = torch.device("cuda")
+
+        self.image_width = width
+        self.image_height = height
+        self.image_path = image_path
+        self.loader = loader
+        self.image_cache = image_cache
+
+        self.trans = trans
+        self.scale = scale
+        self.setup_projection()
+
+    def load(self):
+        image, gt_alpha_mask, gt_depth = self.loader()
+        image = self.prepare_image(image, gt_alpha_mask, self.data_device)
+        depth = gt_depth.to(self.data_device) if gt_depth is not None else None
+        return image, depth
+
+    @property
+    def cache_key(self):
+        return self.image_path, self.image_width, self.image_height
+
+    @property
+    def original_image(self):
+        return self.image_cache.get(self.cache_key, self.load)[0]
+
+    @property
+    def depth(self):
+        return self.image_cache.get(self.cache_key, self.load)[1]
+
+
+class CameraBank:
+    """
+    Extrinsics and intrinsics of N cameras stacked in (N, 4, 4) / (N, 3, 3) tensors, computed in one batched
+    operation and uploaded with a single copy each. view(i) gives lightweight CameraView objects whose
+    matrices are views into these tensors.
+    """
+
+    def __init__(self, R, T, FoVx, FoVy, widths, heights,
+                 trans=np.array([0.0, 0.0, 0.0]), scale=1.0, device="cuda"):
+        self.R = np.asarray(R, dtype=np.float64).reshape(-1, 3, 3)
+        self.T = np.asarray(T, dtype=np.float64).reshape(-1, 3)
+        self.FoVx = np.asarray(FoVx, dtype=np.float64)
+        self.FoVy = np.asarray(FoVy, dtype=np.float64)
+        self.widths = np.asarray(widths, dtype=np.int64)
+        self.heights = np.asarray(heights, dtype=np.int64)
+        self.trans = trans
+        self.scale = scale
+        self.zfar = 100.0
+        self.znear = 0.01
+
+        self.world_view_transform = torch.from_numpy(
+            getWorld2View2Batch(self.R, self.T, trans, scale)).transpose(1, 2).contiguous().to(device)
+        self.projection_matrix = getProjectionMatrixBatch(self.znear, self.zfar, self.FoVx, self.FoVy).transpose(1, 2).contiguous().to(device)
+        self.full_proj_transform = self.world_view_transform.bmm(self.projection_matrix)
+        self.camera_center = torch.linalg.inv(self.world_view_transform)[:, 3, :3]
+
+        focal_length_x = self.widths / (2 * np.tan(self.FoVx / 2))
+        focal_length_y = self.heights / (2 * np.tan(self.FoVy / 2))
+        K = np.zeros((len(self.widths), 3, 3))
+        K[:, 0, 0] = focal_length_x
+        K[:, 0, 2] = self.widths / 2
+        K[:, 1, 1] = focal_length_y
+        K[:, 1, 2] = self.heights / 2
+        K[:, 2, 2] = 1
+        self.K = torch.from_numpy(np.float32(K)).to(device)
+
+    def __len__(self):
+        return len(self.widths)
+
+    def view(self, index, **kwargs):
+        return CameraView(self, index, **kwargs)
+
+
+class CameraView:
+    """
+    One camera of a CameraBank, exposes the same attributes as Camera for render() and the training loop.
+    The image is either held directly or, with image_cache and loader, produced on access like LazyCamera.
+    """
+    __slots__ = ("uid", "colmap_id", "R", "T", "FoVx", "FoVy", "image_name", "image_path", "image_width",
+                 "image_height", "data_device", "trans", "scale", "zfar", "znear", "world_view_transform",
+                 "projection_matrix", "full_proj_transform", "camera_center", "K",
+                 "_image", "_depth", "loader", "image_cache")
+
+    def __init__(self, bank, index, uid, colmap_id, image_name, image_path=None, image=None, depth=None,
+                 loader=None, image_cache=None, data_device="cuda"):
+        self.uid = uid
+        self.colmap_id = colmap_id
+        self.R = bank.R[index]
+        self.T = bank.T[index]
+        self.FoVx = float(bank.FoVx[index])
+        self.FoVy = float(bank.FoVy[index])
+        self.image_name = image_name
+        self.image_path = image_path
+        self.image_width = int(bank.widths[index])
+        self.image_height = int(bank.heights[index])
+        self.data_device = torch.device(data_device)
+        self.trans = bank.trans
+        self.scale = bank.scale
+        self.zfar = bank.zfar
+        self.znear = bank.znear
+        self.world_view_transform = bank.world_view_transform[index]
+        self.projection_matrix = bank.projection_matrix[index]
+        self.full_proj_transform = bank.full_proj_transform[index]
+        self.camera_center = bank.camera_center[index]
+        self.K = bank.K[index]
+        self._image = image
+        self._depth = depth
+        self.loader = loader
+        self.image_cache = image_cache
+
+    def load(self):
+        image, gt_alpha_mask, gt_depth = self.loader()
+        image = Camera.prepare_image(image, gt_alpha_mask, self.data_device)
+        depth = gt_depth.to(self.data_device) if gt_depth is not None else None
+        return image, depth
+
+    @property
+    def cache_key(self):
+        return self.image_path, self.image_width, self.image_height
+
+    @property
+    def original_image(self):
+        if self.image_cache is not None:
+            return self.image_cache.get(self.cache_key, self.load)[0]
+        return self._image
+
+    @property
+    def depth(self):
+        if self.image_cache is not None:
+            return self.image_cache.get(self.cache_key, self.load)[1]
+        return self._depth
+
+
 class MiniCam:
     def __init__(self, width, height, fovy, fovx, znear, zfar, world_view_transform, full_proj_transform):
         self.image_width = width
@@ -86,28 +86,25 @@ def read_points3D_text(path):
         void Reconstruction::ReadPoints3DText(const std::string& path)
         void Reconstruction::WritePoints3DText(const std::string& path)
     """
-    xyzs = None
-    rgbs = None
-    errors = None
+    # 按块收集文本行再整体转换, 避免逐行np.append带来的O(N^2)拷贝
+    tables = []
+    rows = []
     with open(path, "r") as fid:
-        while True:
-            line = fid.readline()
-            if not line:
-                break
+        for line in fid:
             line = line.strip()
             if len(line) > 0 and line[0] != "#":
-                elems = line.split()
-                xyz = np.array(tuple(map(float, elems[1:4])))
-                rgb = np.array(tuple(map(int, elems[4:7])))
-                error = np.array(float(elems[7]))
-                if xyzs is None:
-                    xyzs = xyz[None, ...]
-                    rgbs = rgb[None, ...]
-                    errors = error[None, ...]
-                else:
-                    xyzs = np.append(xyzs, xyz[None, ...], axis=0)
-                    rgbs = np.append(rgbs, rgb[None, ...], axis=0)
-                    errors = np.append(errors, error[None, ...], axis=0)
+                rows.append(line.split(maxsplit=8)[1:8])
+                if len(rows) == BULK_CHUNK_POINTS:
+                    tables.append(np.array(rows, dtype=np.float64))
+                    rows = []
+    if rows:
+        tables.append(np.array(rows, dtype=np.float64))
+    if not tables:
+        return None, None, None
+    table = np.concatenate(tables, axis=0)
+    xyzs = table[:, 0:3]
+    rgbs = table[:, 3:6].astype(np.int64)
+    errors = table[:, 6]
     return xyzs, rgbs, errors
 
 def read_points3D_binary(path_to_model_file):
@@ -141,6 +138,77 @@ def read_points3D_binary(path_to_model_file):
             errors[p_id] = error
     return xyzs, rgbs, errors
 
+# 按块解析points3D.bin时每块的点数，限制gather索引的内存
+BULK_CHUNK_POINTS = 1 << 16
+
+POINT3D_RECORD_DTYPE = np.dtype([("id", "<u8"), ("xyz", "<f8", 3), ("rgb", "u1", 3), ("error", "<f8")])
+IMAGE_RECORD_DTYPE = np.dtype([("id", "<i4"), ("qvec", "<f8", 4), ("tvec", "<f8", 3), ("camera_id", "<i4")])
+POINT2D_RECORD_DTYPE = np.dtype([("xy", "<f8", 2), ("point3D_id", "<i8")])
+
+def read_points3D_binary_bulk(path_to_model_file):
+    """
+    Same outputs as read_points3D_binary, decoded from one buffer with numpy.
+    Only the track lengths are visited point by point to find where each record starts.
+    """
+    with open(path_to_model_file, "rb") as fid:
+        data = fid.read()
+    num_points = struct.unpack_from("<Q", data, 0)[0]
+
+    record_size = POINT3D_RECORD_DTYPE.itemsize
+    unpack_track_length = struct.Struct("<Q").unpack_from
+    offsets = [0] * num_points
+    offset = 8
+    for p_id in range(num_points):
+        offsets[p_id] = offset
+        offset += record_size + 8 + 8 * unpack_track_length(data, offset + record_size)[0]
+    offsets = np.asarray(offsets, dtype=np.int64)
+
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    record_bytes = np.arange(record_size, dtype=np.int64)
+    xyzs = np.empty((num_points, 3))
+    rgbs = np.empty((num_points, 3))
+    errors = np.empty((num_points, 1))
+    for start in range(0, num_points, BULK_CHUNK_POINTS):
+        chunk_offsets = offsets[start:start + BULK_CHUNK_POINTS]
+        records = buffer[chunk_offsets[:, None] + record_bytes].view(POINT3D_RECORD_DTYPE)[:, 0]
+        xyzs[start:start + len(records)] = records["xyz"]
+        rgbs[start:start + len(records)] = records["rgb"]
+        errors[start:start + len(records), 0] = records["error"]
+    return xyzs, rgbs, errors
+
+def read_extrinsics_binary_bulk(path_to_model_file):
+    """
+    Same outputs as read_extrinsics_binary. Each image is decoded with np.frombuffer on fixed-size
+    records, names and 2D observations are located with offset arithmetic.
+    """
+    images = {}
+    with open(path_to_model_file, "rb") as fid:
+        data = fid.read()
+    num_reg_images = struct.unpack_from("<Q", data, 0)[0]
+    offset = 8
+    for _ in range(num_reg_images):
+        properties = np.frombuffer(data, dtype=IMAGE_RECORD_DTYPE, count=1, offset=offset)[0]
+        name_start = offset + IMAGE_RECORD_DTYPE.itemsize
+        name_end = data.index(b"\x00", name_start)   # look for the ASCII 0 entry
+        image_name = data[name_start:name_end].decode("utf-8")
+        num_points2D = struct.unpack_from("<Q", data, name_end + 1)[0]
+        points2D = np.frombuffer(data, dtype=POINT2D_RECORD_DTYPE, count=num_points2D, offset=name_end + 9)
+        offset = name_end + 9 + POINT2D_RECORD_DTYPE.itemsize * num_points2D
+
+        image_id = int(properties["id"])
+        if num_points2D:
+            xys = points2D["xy"].copy()
+            point3D_ids = points2D["point3D_id"].copy()
+        else:
+            # 与逐个解析时空tuple得到的数组保持一致
+            xys = np.empty((0, 2))
+            point3D_ids = np.array(())
+        images[image_id] = Image(
+            id=image_id, qvec=properties["qvec"].copy(), tvec=properties["tvec"].copy(),
+            camera_id=int(properties["camera_id"]), name=image_name,
+            xys=xys, point3D_ids=point3D_ids)
+    return images
+
 def read_intrinsics_text(path):
     """
     Taken from https://github.com/colmap/colmap/blob/dev/scripts/python/read_write_model.py
@@ -235,10 +303,7 @@ def read_extrinsics_text(path):
     """
     images = {}
     with open(path, "r") as fid:
-        while True:
-            line = fid.readline()
-            if not line:
-                break
+        for line in fid:
             line = line.strip()
             if len(line) > 0 and line[0] != "#":
                 elems = line.split()
@@ -247,10 +312,11 @@ def read_extrinsics_text(path):
                 tvec = np.array(tuple(map(float, elems[5:8])))
                 camera_id = int(elems[8])
                 image_name = elems[9]
-                elems = fid.readline().split()
-                xys = np.column_stack([tuple(map(float, elems[0::3])),
-                                       tuple(map(float, elems[1::3]))])
-                point3D_ids = np.array(tuple(map(int, elems[2::3])))
+                # 每张图像的第二行是 X Y POINT3D_ID 三元组
+                elems = next(fid, "").split()
+                points2D = np.array(elems, dtype=np.float64).reshape(-1, 3)
+                xys = np.ascontiguousarray(points2D[:, :2])
+                point3D_ids = points2D[:, 2].astype(np.int64) if elems else np.array(())
                 images[image_id] = Image(
                     id=image_id, qvec=qvec, tvec=tvec,
                     camera_id=camera_id, name=image_name,
@@ -11,12 +11,16 @@
 
 import os
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from PIL import Image
 from typing import NamedTuple
 from scene.colmap_loader import read_extrinsics_text, read_intrinsics_text, qvec2rotmat, \
-    read_extrinsics_binary, read_intrinsics_binary, read_points3D_binary, read_points3D_text
+    read_extrinsics_binary_bulk, read_intrinsics_binary, read_points3D_binary_bulk, read_points3D_text
 from utils.graphics_utils import getWorld2View2, focal2fov, fov2focal
+from utils.image_utils import read_image_size
+from utils.point_utils import downsample_points
 import numpy as np
 import json
 from pathlib import Path
@@ -36,6 +40,7 @@ class CameraInfo(NamedTuple):
     image_name: str
     width: int
     height: int
+    depth_path: str = None
 
 class SceneInfo(NamedTuple):
     point_cloud: BasicPointCloud
@@ -67,8 +72,9 @@ def getNerfppNorm(cam_info):
 
     return {"translate": translate, "radius": radius}
 
-def readColmapCameras(cam_extrinsics, cam_intrinsics, images_folder, using_depth=False, low_memory=False):
+def readColmapCameras(cam_extrinsics, cam_intrinsics, images_folder, using_depth=False, low_memory=False, data_workers=8):
     cam_infos = []
+    jobs = []
     for idx, key in enumerate(sorted(cam_extrinsics)):
         sys.stdout.write('\r')
         # the exact output you're looking for:
@@ -99,35 +105,67 @@ def readColmapCameras(cam_extrinsics, cam_intrinsics, images_folder, using_depth
         image_path = os.path.join(images_folder, os.path.basename(extr.name))
         image_name = os.path.basename(image_path).split(".")[0]
 
-        if low_memory:
-            image = None
-            depth = None
-        else:
-            image = Image.open(image_path)
-            if using_depth:
-                if extr.name.endswith('JPG'):
-                    depth_path = os.path.join(images_folder.replace('images', 'depth'), os.path.basename(extr.name).replace('JPG', 'png'))
-                elif extr.name.endswith('jpg'):
-                    depth_path = os.path.join(images_folder.replace('images', 'depth'),
-                                              os.path.basename(extr.name).replace('jpg', 'png'))
-                elif extr.name.endswith('png'):
-                    depth_path = os.path.join(images_folder.replace('images', 'depth'),
-                                              os.path.basename(extr.name))
-                    # print(extr.name)
-                if os.path.exists(depth_path):
-                    depth = Image.open(depth_path)
-                else:
-                    depth = None
-            else:
-                depth = None
-
-        cam_info = CameraInfo(uid=uid, R=R, T=T, FovY=FovY, FovX=FovX, image=image,
-                              image_path=image_path, image_name=image_name, width=width, height=height, depth=depth)
+        depth_path = None
+        if using_depth:
+            if extr.name.endswith('JPG'):
+                depth_path = os.path.join(images_folder.replace('images', 'depth'), os.path.basename(extr.name).replace('JPG', 'png'))
+            elif extr.name.endswith('jpg'):
+                depth_path = os.path.join(images_folder.replace('images', 'depth'),
+                                          os.path.basename(extr.name).replace('jpg', 'png'))
+            elif extr.name.endswith('png'):
+                depth_path = os.path.join(images_folder.replace('images', 'depth'),
+                                          os.path.basename(extr.name))
+                # print(extr.name)
+        jobs.append((image_path, depth_path))
+
+        cam_info = CameraInfo(uid=uid, R=R, T=T, FovY=FovY, FovX=FovX, image=None,
+                              image_path=image_path, image_name=image_name, width=width, height=height, depth=None,
+                              depth_path=depth_path)
         cam_infos.append(cam_info)
     sys.stdout.write('\n')
-    return cam_infos
-
-def fetchPly(path, debug=False):
+    if low_memory:
+        return cam_infos
+    images = openImages(jobs, data_workers)
+    return [cam_info._replace(image=image, depth=depth) for cam_info, (image, depth) in zip(cam_infos, images)]
+
+def openImage(image_path, depth_path=None, white_background=None):
+    """
+    Decode an image and its depth map (None when depth_path is None or missing).
+    :param white_background: composite the RGBA image onto the background, None keeps the image as is
+    """
+    image = Image.open(image_path)
+    image.load()
+    if white_background is not None:
+        image = blendBackground(image, white_background)
+    depth = None
+    if depth_path is not None and os.path.exists(depth_path):
+        depth = Image.open(depth_path)
+        depth.load()
+    return image, depth
+
+def openImages(jobs, data_workers=8):
+    """
+    Run openImage for every job tuple on a thread pool (PIL releases the GIL while decoding).
+    :return: [(image, depth)] in the order of jobs
+    """
+    start = time.perf_counter()
+    if data_workers > 1 and len(jobs) > 1:
+        with ThreadPoolExecutor(max_workers=data_workers) as pool:
+            results = list(pool.map(lambda job: openImage(*job), jobs))
+    else:
+        results = [openImage(*job) for job in jobs]
+    elapsed = time.perf_counter() - start
+    print("Decoded {} images in {:.2f}s ({:.1f} images/s, {} workers)".format(
+        len(jobs), elapsed, len(jobs) / max(elapsed, 1e-9), max(data_workers, 1)))
+    return results
+
+def fetchPly(path, debug=False, init_sampling="voxel", init_max_points=300000, init_voxel_size=0.0):
+    """
+    :param init_sampling: voxel: one averaged point per voxel (utils.point_utils.downsample_points), random: random
+                          subset, none: keep every point
+    :param init_max_points: point budget of the sampling
+    :param init_voxel_size: fixed voxel size used instead of the budget when > 0
+    """
     plydata = PlyData.read(path)
     vertices = plydata['vertex']
     positions = np.vstack([vertices['x'], vertices['y'], vertices['z']]).T
@@ -143,9 +181,14 @@ def fetchPly(path, debug=False):
         normals = np.zeros((num_pts, 3))
 
     # 如果点数太多，需要采样,这里对应稠密重建的情况
-    if positions.shape[0] > 300000:
-        print(f"初始化点云密集！进行随机采样到 {300000} points")
-        sub_ind = np.random.choice(positions.shape[0], 300000, replace=False)
+    if init_sampling == "voxel":
+        num_pts = positions.shape[0]
+        positions, colors, normals = downsample_points(positions, colors, normals, init_max_points, init_voxel_size)
+        if positions.shape[0] != num_pts:
+            print(f"初始化点云密集！体素下采样 {num_pts} -> {positions.shape[0]} points")
+    elif init_sampling == "random" and positions.shape[0] > init_max_points:
+        print(f"初始化点云密集！进行随机采样到 {init_max_points} points")
+        sub_ind = np.random.choice(positions.shape[0], init_max_points, replace=False)
         positions = positions[sub_ind]  # numpy array
         colors = colors[sub_ind]  # numpy array
         normals = normals[sub_ind]
@@ -176,11 +219,12 @@ def storePly(path, xyz, rgb):
     ply_data = PlyData([vertex_element])
     ply_data.write(path)
 
-def readColmapSceneInfo(path, images, eval, llffhold=8, using_depth=False, low_memory=False):
+def readColmapSceneInfo(path, images, eval, llffhold=8, using_depth=False, low_memory=False, data_workers=8,
+                        init_sampling="voxel", init_max_points=300000, init_voxel_size=0.0):
     try:
         cameras_extrinsic_file = os.path.join(path, "sparse/0", "images.bin")
         cameras_intrinsic_file = os.path.join(path, "sparse/0", "cameras.bin")
-        cam_extrinsics = read_extrinsics_binary(cameras_extrinsic_file)
+        cam_extrinsics = read_extrinsics_binary_bulk(cameras_extrinsic_file)
         cam_intrinsics = read_intrinsics_binary(cameras_intrinsic_file)
     except:
         cameras_extrinsic_file = os.path.join(path, "sparse/0", "images.txt")
@@ -189,7 +233,7 @@ def readColmapSceneInfo(path, images, eval, llffhold=8, using_depth=False, low_m
         cam_intrinsics = read_intrinsics_text(cameras_intrinsic_file)
 
     reading_dir = "images" if images == None else images
-    cam_infos_unsorted = readColmapCameras(cam_extrinsics=cam_extrinsics, cam_intrinsics=cam_intrinsics, images_folder=os.path.join(path, reading_dir), using_depth=using_depth, low_memory=low_memory)
+    cam_infos_unsorted = readColmapCameras(cam_extrinsics=cam_extrinsics, cam_intrinsics=cam_intrinsics, images_folder=os.path.join(path, reading_dir), using_depth=using_depth, low_memory=low_memory, data_workers=data_workers)
     cam_infos = sorted(cam_infos_unsorted.copy(), key=lambda x: x.image_name)
 
     if eval:
@@ -207,12 +251,13 @@ def readColmapSceneInfo(path, images, eval, llffhold=8, using_depth=False, low_m
     if not os.path.exists(ply_path):
         print("Converting point3d.bin to .ply, will happen only the first time you open the scene.")
         try:
-            xyz, rgb, _ = read_points3D_binary(bin_path)
+            xyz, rgb, _ = read_points3D_binary_bulk(bin_path)
         except:
             xyz, rgb, _ = read_points3D_text(txt_path)
         storePly(ply_path, xyz, rgb)
     try:
-        pcd = fetchPly(ply_path)
+        pcd = fetchPly(ply_path, init_sampling=init_sampling, init_max_points=init_max_points,
+                       init_voxel_size=init_voxel_size)
     except:
         pcd = None
 
@@ -223,8 +268,20 @@ def readColmapSceneInfo(path, images, eval, llffhold=8, using_depth=False, low_m
                            ply_path=ply_path)
     return scene_info
 
-def readCamerasFromTransforms(path, transformsfile, white_background, extension=".png", using_depth=False, low_memory=False):
+def blendBackground(image, white_background):
+    """Composite an RGBA blender image onto the white / black background"""
+    im_data = np.asarray(image.convert("RGBA"))
+
+    bg = 255 if white_background else 0
+
+    # 整数合成: (rgb * a + bg * (255 - a)) / 255 向下取整, 最大值255 * 255不会超出uint16
+    alpha = im_data[:, :, 3:4].astype(np.uint16)
+    arr = (im_data[:, :, :3] * alpha + bg * (255 - alpha)) // 255
+    return Image.fromarray(arr.astype(np.uint8), "RGB")
+
+def readCamerasFromTransforms(path, transformsfile, white_background, extension=".png", using_depth=False, low_memory=False, data_workers=8):
     cam_infos = []
+    jobs = []
 
     with open(os.path.join(path, transformsfile)) as json_file:
         contents = json.load(json_file)
@@ -254,40 +311,32 @@ def readCamerasFromTransforms(path, transformsfile, white_background, extension=
             image_path = os.path.join(path, cam_name)
             image_name = Path(cam_name).stem
 
-            if low_memory:
-                image = None
-                depth = None
-            else:
-
-                image = Image.open(image_path)
-
-                im_data = np.array(image.convert("RGBA"))
-
-                bg = np.array([1,1,1]) if white_background else np.array([0, 0, 0])
-
-                norm_data = im_data / 255.0
-                arr = norm_data[:, :, :3] * norm_data[:, :, 3:4] + bg * (1 - norm_data[:, :, 3:4])
-                image = Image.fromarray(np.array(arr*255.0, dtype=np.byte), "RGB")
-
-                fovy = focal2fov(fov2focal(fovx, image.size[0]), image.size[1])
-                FovY = fovy
-                FovX = fovx
-
-                if using_depth:
-                    depth_path = os.path.join(path, cam_name.replace('images', 'depth').replace('jpg', 'png'))
-                    if os.path.exists(depth_path):
-                        depth = Image.open(depth_path)
-                    else:
-                        depth = None
-                else:
-                    depth = None
-
-            cam_infos.append(CameraInfo(uid=idx, R=R, T=T, FovY=FovY, FovX=FovX, image=image,
-                            image_path=image_path, image_name=image_name, width=image.size[0], height=image.size[1],depth=depth))
+            depth_path = None
+            if using_depth:
+                depth_path = os.path.join(path, cam_name.replace('images', 'depth').replace('jpg', 'png'))
+            jobs.append((image_path, depth_path, white_background))
+
+            # 有w/h字段时直接使用
+            width, height = frame.get("w", contents.get("w")), frame.get("h", contents.get("h"))
+            cam_infos.append(CameraInfo(uid=idx, R=R, T=T, FovY=None, FovX=fovx, image=None,
+                            image_path=image_path, image_name=image_name, width=width, height=height, depth=None,
+                            depth_path=depth_path))
+
+    if low_memory:
+        # 不解码, 尺寸来自w/h字段或者图像文件头
+        sizes = [(c.width, c.height) if c.width and c.height else read_image_size(c.image_path) for c in cam_infos]
+        images = [(None, None)] * len(cam_infos)
+    else:
+        images = openImages(jobs, data_workers)
+        sizes = [image.size for image, _ in images]
+    for idx, ((image, depth), (width, height)) in enumerate(zip(images, sizes)):
+        fovy = focal2fov(fov2focal(fovx, width), height)
+        cam_infos[idx] = cam_infos[idx]._replace(FovY=fovy, width=width, height=height, image=image, depth=depth)
     return cam_infos
 
-def readCamerasFromTransformsFile(path, transformsfile, extension="", using_depth=False, low_memory=False):
+def readCamerasFromTransformsFile(path, transformsfile, extension="", using_depth=False, low_memory=False, data_workers=8):
     cam_infos = []
+    jobs = []
 
     with open(os.path.join(path, transformsfile)) as json_file:
         contents = json.load(json_file)
@@ -313,27 +362,22 @@ def readCamerasFromTransformsFile(path, transformsfile, extension="", using_dept
 
             image_path = os.path.join(path, cam_name)
             image_name = Path(cam_name).stem
-            if low_memory:
-                image = None
-                depth = None
-            else:
-                image = Image.open(image_path)
-                if using_depth:
-                    depth_path = os.path.join(path, cam_name.replace('images', 'depth').replace('jpg', 'png'))
-                    if os.path.exists(depth_path):
-                        depth = Image.open(depth_path)
-                    else:
-                        depth = None
-                else:
-                    depth = None
-            cam_infos.append(CameraInfo(uid=idx, R=R, T=T, FovY=FovY, FovX=FovX, image=image,
+            depth_path = None
+            if using_depth:
+                depth_path = os.path.join(path, cam_name.replace('images', 'depth').replace('jpg', 'png'))
+            jobs.append((image_path, depth_path))
+            cam_infos.append(CameraInfo(uid=idx, R=R, T=T, FovY=FovY, FovX=FovX, image=None,
                                         image_path=image_path, image_name=image_name, width=contents["w"],
-                                        height=contents["h"], depth=depth))
+                                        height=contents["h"], depth=None, depth_path=depth_path))
 
-    return cam_infos
+    if low_memory:
+        return cam_infos
+    images = openImages(jobs, data_workers)
+    return [cam_info._replace(image=image, depth=depth) for cam_info, (image, depth) in zip(cam_infos, images)]
 
-def readCamerasFromPolycamTransformsFile(path, transformsfile, extension="", using_depth=False, low_memory=False):
+def readCamerasFromPolycamTransformsFile(path, transformsfile, extension="", using_depth=False, low_memory=False, data_workers=8):
     cam_infos = []
+    jobs = []
 
     with open(os.path.join(path, transformsfile)) as json_file:
         contents = json.load(json_file)
@@ -355,31 +399,28 @@ def readCamerasFromPolycamTransformsFile(path, transformsfile, extension="", usi
 
             image_path = os.path.join(path, cam_name)
             image_name = Path(cam_name).stem
-            if low_memory:
-                image = None
-                depth = None
-            else:
-                image = Image.open(image_path)
-                if using_depth:
-                    depth_path = os.path.join(path, cam_name.replace('images', 'depth').replace('jpg', 'png'))
-                    if os.path.exists(depth_path):
-                        depth = Image.open(depth_path)
-                    else:
-                        depth = None
-                else:
-                    depth = None
-
-            cam_infos.append(CameraInfo(uid=idx, R=R, T=T, FovY=FovY, FovX=FovX, image=image,
+            depth_path = None
+            if using_depth:
+                depth_path = os.path.join(path, cam_name.replace('images', 'depth').replace('jpg', 'png'))
+            jobs.append((image_path, depth_path))
+
+            cam_infos.append(CameraInfo(uid=idx, R=R, T=T, FovY=FovY, FovX=FovX, image=None,
                                         image_path=image_path, image_name=image_name, width=frame["w"],
-                                        height=frame["h"], depth=depth))
+                                        height=frame["h"], depth=None, depth_path=depth_path))
 
-    return cam_infos
+    if low_memory:
+        return cam_infos
+    images = openImages(jobs, data_workers)
+    return [cam_info._replace(image=image, depth=depth) for cam_info, (image, depth) in zip(cam_infos, images)]
     
-def readNerfSyntheticInfo(path, white_background, eval, extension="", using_depth=False):
+def readNerfSyntheticInfo(path, white_background, eval, extension="", using_depth=False, low_memory=False, data_workers=8,
+                          init_sampling="voxel", init_max_points=300000, init_voxel_size=0.0):
     print("Reading Training Transforms")
-    train_cam_infos = readCamerasFromTransforms(path, "transforms_train.json", white_background, extension, using_depth)
+    train_cam_infos = readCamerasFromTransforms(path, "transforms_train.json", white_background, extension, using_depth,
+                                                low_memory=low_memory, data_workers=data_workers)
     print("Reading Test Transforms")
-    test_cam_infos = readCamerasFromTransforms(path, "transforms_test.json", white_background, extension, using_depth)
+    test_cam_infos = readCamerasFromTransforms(path, "transforms_test.json", white_background, extension, using_depth,
+                                               low_memory=low_memory, data_workers=data_workers)
     
     if not eval:
         train_cam_infos.extend(test_cam_infos)
@@ -400,7 +441,8 @@ def readNerfSyntheticInfo(path, white_background, eval, extension="", using_dept
 
         storePly(ply_path, xyz, SH2RGB(shs) * 255)
     try:
-        pcd = fetchPly(ply_path)
+        pcd = fetchPly(ply_path, init_sampling=init_sampling, init_max_points=init_max_points,
+                       init_voxel_size=init_voxel_size)
     except:
         pcd = None
 
@@ -412,8 +454,10 @@ def readNerfSyntheticInfo(path, white_background, eval, extension="", using_dept
     return scene_info
 
 
-def readNerfStudioInfo(path, eval, extension="", llffhold=8, using_depth=False):
-    cam_infos = readCamerasFromTransformsFile(path, "transforms.json", extension, using_depth)
+def readNerfStudioInfo(path, eval, extension="", llffhold=8, using_depth=False, low_memory=False, data_workers=8,
+                       init_sampling="voxel", init_max_points=300000, init_voxel_size=0.0):
+    cam_infos = readCamerasFromTransformsFile(path, "transforms.json", extension, using_depth, low_memory=low_memory,
+                                              data_workers=data_workers)
 
     if eval:
         print("Reading Training Transforms from NeRFstudio format")
@@ -443,7 +487,8 @@ def readNerfStudioInfo(path, eval, extension="", llffhold=8, using_depth=False):
 
         storePly(ply_path, xyz, SH2RGB(shs) * 255)
     try:
-        pcd = fetchPly(ply_path)
+        pcd = fetchPly(ply_path, init_sampling=init_sampling, init_max_points=init_max_points,
+                       init_voxel_size=init_voxel_size)
     except:
         pcd = None
 
@@ -454,8 +499,10 @@ def readNerfStudioInfo(path, eval, extension="", llffhold=8, using_depth=False):
                            ply_path=ply_path)
     return scene_info
 
-def readPolycamInfo(path, eval, extension="", llffhold=8, using_depth=False):
-    cam_infos = readCamerasFromPolycamTransformsFile(path, "transforms_polycam.json", extension, using_depth)
+def readPolycamInfo(path, eval, extension="", llffhold=8, using_depth=False, low_memory=False, data_workers=8,
+                    init_sampling="voxel", init_max_points=300000, init_voxel_size=0.0):
+    cam_infos = readCamerasFromPolycamTransformsFile(path, "transforms_polycam.json", extension, using_depth,
+                                                     low_memory=low_memory, data_workers=data_workers)
 
     if eval:
         print("Reading Training Transforms from polycam format")
@@ -485,7 +532,8 @@ def readPolycamInfo(path, eval, extension="", llffhold=8, using_depth=False):
 
         storePly(ply_path, xyz, SH2RGB(shs) * 255)
     try:
-        pcd = fetchPly(ply_path)
+        pcd = fetchPly(ply_path, init_sampling=init_sampling, init_max_points=init_max_points,
+                       init_voxel_size=init_voxel_size)
     except:
         pcd = None
 
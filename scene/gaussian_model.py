@@ -15,9 +15,13 @@ from utils.general_utils import inverse_sigmoid, get_expon_lr_func, build_rotati
 from torch import nn
 import os
 from utils.system_utils import mkdir_p
-from plyfile import PlyData, PlyElement
+from utils.ply_utils import write_ply_chunked, load_gaussian_ply
+from utils.compress_utils import save_compressed_gaussians, load_compressed_gaussians
+from utils.chunk_utils import write_chunked_gaussians, load_gaussian_region
 from utils.sh_utils import RGB2SH
-from simple_knn._C import distCUDA2
+from utils.knn_utils import mean_knn_dist2
+from utils.storage_utils import ParameterStorage, row_state_keys
+from utils.optimizer_utils import VisibleAdam
 from utils.graphics_utils import BasicPointCloud
 from utils.general_utils import strip_symmetric, build_scaling_rotation
 
@@ -54,6 +58,8 @@ class GaussianModel:
         self.xyz_gradient_accum = torch.empty(0)
         self.denom = torch.empty(0)
         self.optimizer = None
+        # growable_storage: 参数, Adam状态和致密化统计保存在预留容量的ParameterStorage中
+        self.storage = None
         self.percent_dense = 0
         self.spatial_lr_scale = 0
         self.setup_functions()
@@ -91,6 +97,8 @@ class GaussianModel:
         self.xyz_gradient_accum = xyz_gradient_accum
         self.denom = denom
         self.optimizer.load_state_dict(opt_dict)
+        if self.storage is not None:
+            self.init_storage()
 
     @property
     def get_scaling(self):
@@ -121,7 +129,7 @@ class GaussianModel:
         if self.active_sh_degree < self.max_sh_degree:
             self.active_sh_degree += 1
 
-    def create_from_pcd(self, pcd: BasicPointCloud, spatial_lr_scale: float):
+    def create_from_pcd(self, pcd: BasicPointCloud, spatial_lr_scale: float, knn_backend="auto"):
         self.spatial_lr_scale = spatial_lr_scale
         fused_point_cloud = torch.tensor(np.asarray(pcd.points)).float().cuda()
         fused_color = RGB2SH(torch.tensor(np.asarray(pcd.colors)).float().cuda())
@@ -131,7 +139,7 @@ class GaussianModel:
 
         print("Number of points at initialisation : ", fused_point_cloud.shape[0])
 
-        dist2 = torch.clamp_min(distCUDA2(torch.from_numpy(np.asarray(pcd.points)).float().cuda()), 0.0000001)
+        dist2 = torch.clamp_min(mean_knn_dist2(torch.from_numpy(np.asarray(pcd.points)).float(), knn_backend).cuda(), 0.0000001)
         scales = torch.log(torch.sqrt(dist2))[..., None].repeat(1, 3)
         rots = torch.zeros((fused_point_cloud.shape[0], 4), device="cuda")
         rots[:, 0] = 1
@@ -160,11 +168,36 @@ class GaussianModel:
             {'params': [self._rotation], 'lr': training_args.rotation_lr, "name": "rotation"}
         ]
 
-        self.optimizer = torch.optim.Adam(l, lr=0.0, eps=1e-15)
+        if getattr(training_args, "sparse_adam", False):
+            self.optimizer = VisibleAdam(l, lr=0.0, eps=1e-15,
+                                         lazy_bias_correction=getattr(training_args, "lazy_bias_correction", False))
+        else:
+            self.optimizer = torch.optim.Adam(l, lr=0.0, eps=1e-15)
         self.xyz_scheduler_args = get_expon_lr_func(lr_init=training_args.position_lr_init * self.spatial_lr_scale,
                                                     lr_final=training_args.position_lr_final * self.spatial_lr_scale,
                                                     lr_delay_mult=training_args.position_lr_delay_mult,
                                                     max_steps=training_args.position_lr_max_steps)
+        self.storage = None
+        if getattr(training_args, "growable_storage", False):
+            self.init_storage()
+
+    def init_storage(self):
+        """Move the parameters, the optimizer state and the densification statistics to a ParameterStorage"""
+        self.storage = ParameterStorage(self.optimizer, {"xyz_gradient_accum": self.xyz_gradient_accum,
+                                                         "denom": self.denom,
+                                                         "max_radii2D": self.max_radii2D})
+        self.bind_storage(self.storage.bind())
+
+    def bind_storage(self, optimizable_tensors):
+        self._xyz = optimizable_tensors["xyz"]
+        self._features_dc = optimizable_tensors["f_dc"]
+        self._features_rest = optimizable_tensors["f_rest"]
+        self._opacity = optimizable_tensors["opacity"]
+        self._scaling = optimizable_tensors["scaling"]
+        self._rotation = optimizable_tensors["rotation"]
+        self.xyz_gradient_accum = self.storage.buffer("xyz_gradient_accum")
+        self.denom = self.storage.buffer("denom")
+        self.max_radii2D = self.storage.buffer("max_radii2D")
 
     def update_learning_rate(self, iteration):
         ''' Learning rate scheduling per step '''
@@ -189,50 +222,23 @@ class GaussianModel:
         return l
 
     def save_ply(self, path):
-        mkdir_p(os.path.dirname(path))
-
-        xyz = self._xyz.detach().cpu().numpy()
-        normals = np.zeros_like(xyz)
-        f_dc = self._features_dc.detach().transpose(1, 2).flatten(start_dim=1).contiguous().cpu().numpy()
-        f_rest = self._features_rest.detach().transpose(1, 2).flatten(start_dim=1).contiguous().cpu().numpy()
-        opacities = self._opacity.detach().cpu().numpy()
-        scale = self._scaling.detach().cpu().numpy()
-        rotation = self._rotation.detach().cpu().numpy()
-
-        dtype_full = [(attribute, 'f4') for attribute in self.construct_list_of_attributes()]
-
-        elements = np.empty(xyz.shape[0], dtype=dtype_full)
-        attributes = np.concatenate((xyz, normals, f_dc, f_rest, opacities, scale, rotation), axis=1)
-        elements[:] = list(map(tuple, attributes))
-        el = PlyElement.describe(elements, 'vertex')
-        PlyData([el]).write(path)
+        self.save_ply_using_mask(path, None)
 
     def save_ply_using_mask(self, path, mask):
         mkdir_p(os.path.dirname(path))
+        # 按块直接从参数写入二进制ply，避免逐个高斯构造python tuple
+        index = None
         if mask is not None:
-            xyz = self._xyz[mask].detach().cpu().numpy()
-            normals = np.zeros_like(xyz)
-            f_dc = self._features_dc[mask].detach().transpose(1, 2).flatten(start_dim=1).contiguous().cpu().numpy()
-            f_rest = self._features_rest[mask].detach().transpose(1, 2).flatten(start_dim=1).contiguous().cpu().numpy()
-            opacities = self._opacity[mask].detach().cpu().numpy()
-            scale = self._scaling[mask].detach().cpu().numpy()
-            rotation = self._rotation[mask].detach().cpu().numpy()
-        else:
-            xyz = self._xyz.detach().cpu().numpy()
-            normals = np.zeros_like(xyz)
-            f_dc = self._features_dc.detach().transpose(1, 2).flatten(start_dim=1).contiguous().cpu().numpy()
-            f_rest = self._features_rest.detach().transpose(1, 2).flatten(start_dim=1).contiguous().cpu().numpy()
-            opacities = self._opacity.detach().cpu().numpy()
-            scale = self._scaling.detach().cpu().numpy()
-            rotation = self._rotation.detach().cpu().numpy()
-
-        dtype_full = [(attribute, 'f4') for attribute in self.construct_list_of_attributes()]
-
-        elements = np.empty(xyz.shape[0], dtype=dtype_full)
-        attributes = np.concatenate((xyz, normals, f_dc, f_rest, opacities, scale, rotation), axis=1)
-        elements[:] = list(map(tuple, attributes))
-        el = PlyElement.describe(elements, 'vertex')
-        PlyData([el]).write(path)
+            index = torch.nonzero(torch.as_tensor(mask, device=self._xyz.device)).squeeze(1)
+
+        columns = [self._xyz,
+                   3,  # normals
+                   self._features_dc.transpose(1, 2),
+                   self._features_rest.transpose(1, 2),
+                   self._opacity,
+                   self._scaling,
+                   self._rotation]
+        write_ply_chunked(path, self.construct_list_of_attributes(), columns, index=index)
 
     def reset_opacity(self):
         opacities_new = inverse_sigmoid(torch.min(self.get_opacity, torch.ones_like(
@@ -240,107 +246,77 @@ class GaussianModel:
         optimizable_tensors = self.replace_tensor_to_optimizer(opacities_new, "opacity")
         self._opacity = optimizable_tensors["opacity"]
 
-    def load_ply(self, path):
-        plydata = PlyData.read(path)
-        xyz = np.stack((np.asarray(plydata.elements[0]["x"]),
-                        np.asarray(plydata.elements[0]["y"]),
-                        np.asarray(plydata.elements[0]["z"])), axis=1)
-        opacities = np.asarray(plydata.elements[0]["opacity"])[..., np.newaxis]
-
-        features_dc = np.zeros((xyz.shape[0], 3, 1))
-        features_dc[:, 0, 0] = np.asarray(plydata.elements[0]["f_dc_0"])
-        features_dc[:, 1, 0] = np.asarray(plydata.elements[0]["f_dc_1"])
-        features_dc[:, 2, 0] = np.asarray(plydata.elements[0]["f_dc_2"])
-
-        extra_f_names = [p.name for p in plydata.elements[0].properties if p.name.startswith("f_rest_")]
-        extra_f_names = sorted(extra_f_names, key=lambda x: int(x.split('_')[-1]))
-        assert len(extra_f_names) == 3 * (self.max_sh_degree + 1) ** 2 - 3
-        features_extra = np.zeros((xyz.shape[0], len(extra_f_names)))
-        for idx, attr_name in enumerate(extra_f_names):
-            features_extra[:, idx] = np.asarray(plydata.elements[0][attr_name])
-        # Reshape (P,F*SH_coeffs) to (P, F, SH_coeffs except DC)
-        features_extra = features_extra.reshape((features_extra.shape[0], 3, (self.max_sh_degree + 1) ** 2 - 1))
-
-        scale_names = [p.name for p in plydata.elements[0].properties if p.name.startswith("scale_")]
-        scale_names = sorted(scale_names, key=lambda x: int(x.split('_')[-1]))
-        scales = np.zeros((xyz.shape[0], len(scale_names)))
-        for idx, attr_name in enumerate(scale_names):
-            scales[:, idx] = np.asarray(plydata.elements[0][attr_name])
-
-        rot_names = [p.name for p in plydata.elements[0].properties if p.name.startswith("rot")]
-        rot_names = sorted(rot_names, key=lambda x: int(x.split('_')[-1]))
-        rots = np.zeros((xyz.shape[0], len(rot_names)))
-        for idx, attr_name in enumerate(rot_names):
-            rots[:, idx] = np.asarray(plydata.elements[0][attr_name])
-
-        self._xyz = nn.Parameter(torch.tensor(xyz, dtype=torch.float, device="cuda").requires_grad_(True))
-        self._features_dc = nn.Parameter(
-            torch.tensor(features_dc, dtype=torch.float, device="cuda").transpose(1, 2).contiguous().requires_grad_(
-                True))
-        self._features_rest = nn.Parameter(
-            torch.tensor(features_extra, dtype=torch.float, device="cuda").transpose(1, 2).contiguous().requires_grad_(
-                True))
-        self._opacity = nn.Parameter(torch.tensor(opacities, dtype=torch.float, device="cuda").requires_grad_(True))
-        self._scaling = nn.Parameter(torch.tensor(scales, dtype=torch.float, device="cuda").requires_grad_(True))
-        self._rotation = nn.Parameter(torch.tensor(rots, dtype=torch.float, device="cuda").requires_grad_(True))
-        self.active_sh_degree = self.max_sh_degree
-
-    def load_ply_no_instance(self, path):
-        plydata = PlyData.read(path)
-        xyz = np.stack((np.asarray(plydata.elements[0]["x"]),
-                        np.asarray(plydata.elements[0]["y"]),
-                        np.asarray(plydata.elements[0]["z"])), axis=1)
-        opacities = np.asarray(plydata.elements[0]["opacity"])[..., np.newaxis]
-
-        features_dc = np.zeros((xyz.shape[0], 3, 1))
-        features_dc[:, 0, 0] = np.asarray(plydata.elements[0]["f_dc_0"])
-        features_dc[:, 1, 0] = np.asarray(plydata.elements[0]["f_dc_1"])
-        features_dc[:, 2, 0] = np.asarray(plydata.elements[0]["f_dc_2"])
-
-        extra_f_names = [p.name for p in plydata.elements[0].properties if p.name.startswith("f_rest_")]
-        extra_f_names = sorted(extra_f_names, key=lambda x: int(x.split('_')[-1]))
-        assert len(extra_f_names) == 3 * (self.max_sh_degree + 1) ** 2 - 3
-        features_extra = np.zeros((xyz.shape[0], len(extra_f_names)))
-        for idx, attr_name in enumerate(extra_f_names):
-            features_extra[:, idx] = np.asarray(plydata.elements[0][attr_name])
-        # Reshape (P,F*SH_coeffs) to (P, F, SH_coeffs except DC)
-        features_extra = features_extra.reshape((features_extra.shape[0], 3, (self.max_sh_degree + 1) ** 2 - 1))
-
-        scale_names = [p.name for p in plydata.elements[0].properties if p.name.startswith("scale_")]
-        scale_names = sorted(scale_names, key=lambda x: int(x.split('_')[-1]))
-        scales = np.zeros((xyz.shape[0], len(scale_names)))
-        for idx, attr_name in enumerate(scale_names):
-            scales[:, idx] = np.asarray(plydata.elements[0][attr_name])
-
-        rot_names = [p.name for p in plydata.elements[0].properties if p.name.startswith("rot")]
-        rot_names = sorted(rot_names, key=lambda x: int(x.split('_')[-1]))
-        rots = np.zeros((xyz.shape[0], len(rot_names)))
-        for idx, attr_name in enumerate(rot_names):
-            rots[:, idx] = np.asarray(plydata.elements[0][attr_name])
-
-        return xyz, features_dc, features_extra, opacities, scales, rots
+    def save_compressed(self, path, codebook_size=4096):
+        mkdir_p(os.path.dirname(path))
+        save_compressed_gaussians(path,
+                                  self._xyz.detach().cpu().numpy(),
+                                  self._features_dc.detach().transpose(1, 2).cpu().numpy(),
+                                  self._features_rest.detach().transpose(1, 2).cpu().numpy(),
+                                  self._opacity.detach().cpu().numpy(),
+                                  self._scaling.detach().cpu().numpy(),
+                                  self._rotation.detach().cpu().numpy(),
+                                  codebook_size=codebook_size, device=self._xyz.device)
+
+    def save_chunked(self, path, cell_size=None):
+        mkdir_p(path)
+        columns = [self._xyz,
+                   3,  # normals
+                   self._features_dc.transpose(1, 2),
+                   self._features_rest.transpose(1, 2),
+                   self._opacity,
+                   self._scaling,
+                   self._rotation]
+        write_chunked_gaussians(path, self.construct_list_of_attributes(), columns, self._xyz.detach(), cell_size)
+
+    def load_region(self, path, aabb=None, full_proj_transform=None):
+        """只读取分块场景中与aabb或视锥相交的单元"""
+        self.instance_parm(*load_gaussian_region(path, self.max_sh_degree, aabb, full_proj_transform))
+
+    def load_ply(self, path, format=None, region=None):
+        self.instance_parm(*self.load_ply_no_instance(path, format, region))
+
+    def load_ply_no_instance(self, path, format=None, region=None):
+        """
+        format: "ply", "compressed" or "chunked", guessed from the path when None
+        region: (2, 3) aabb, only used by the chunked format
+        """
+        if format is None:
+            if os.path.isdir(path):
+                format = "chunked"
+            elif path.endswith(".npz"):
+                format = "compressed"
+            else:
+                format = "ply"
+        if format == "chunked":
+            return load_gaussian_region(path, self.max_sh_degree, aabb=region)
+        if format == "compressed":
+            return load_compressed_gaussians(path)
+        return load_gaussian_ply(path, self.max_sh_degree)
 
     def instance_parm(self, xyz, features_dc, features_extra, opacities, scales, rots):
 
-        self._xyz = nn.Parameter(torch.tensor(xyz, dtype=torch.float, device="cuda").requires_grad_(True))
+        self._xyz = nn.Parameter(torch.as_tensor(xyz, dtype=torch.float, device="cuda").requires_grad_(True))
         self._features_dc = nn.Parameter(
-            torch.tensor(features_dc, dtype=torch.float, device="cuda").transpose(1, 2).contiguous().requires_grad_(
+            torch.as_tensor(features_dc, dtype=torch.float, device="cuda").transpose(1, 2).contiguous().requires_grad_(
                 True))
         self._features_rest = nn.Parameter(
-            torch.tensor(features_extra, dtype=torch.float, device="cuda").transpose(1, 2).contiguous().requires_grad_(
+            torch.as_tensor(features_extra, dtype=torch.float, device="cuda").transpose(1, 2).contiguous().requires_grad_(
                 True))
-        self._opacity = nn.Parameter(torch.tensor(opacities, dtype=torch.float, device="cuda").requires_grad_(True))
-        self._scaling = nn.Parameter(torch.tensor(scales, dtype=torch.float, device="cuda").requires_grad_(True))
-        self._rotation = nn.Parameter(torch.tensor(rots, dtype=torch.float, device="cuda").requires_grad_(True))
+        self._opacity = nn.Parameter(torch.as_tensor(opacities, dtype=torch.float, device="cuda").requires_grad_(True))
+        self._scaling = nn.Parameter(torch.as_tensor(scales, dtype=torch.float, device="cuda").requires_grad_(True))
+        self._rotation = nn.Parameter(torch.as_tensor(rots, dtype=torch.float, device="cuda").requires_grad_(True))
         self.active_sh_degree = self.max_sh_degree
 
     def replace_tensor_to_optimizer(self, tensor, name):
+        if self.storage is not None:
+            return self.storage.replace(tensor, name)
         optimizable_tensors = {}
         for group in self.optimizer.param_groups:
             if group["name"] == name:
                 stored_state = self.optimizer.state.get(group['params'][0], None)
-                stored_state["exp_avg"] = torch.zeros_like(tensor)  # 梯度
-                stored_state["exp_avg_sq"] = torch.zeros_like(tensor)  # 梯度的平方的滑动平均值
+                # 梯度的滑动平均值, 梯度的平方的滑动平均值(以及VisibleAdam的row_step)清零
+                for key in row_state_keys(stored_state, group['params'][0]):
+                    stored_state[key] = torch.zeros_like(stored_state[key])
 
                 del self.optimizer.state[group['params'][0]]
                 group["params"][0] = nn.Parameter(tensor.requires_grad_(True))
@@ -354,8 +330,8 @@ class GaussianModel:
         for group in self.optimizer.param_groups:
             stored_state = self.optimizer.state.get(group['params'][0], None)
             if stored_state is not None:
-                stored_state["exp_avg"] = stored_state["exp_avg"][mask]
-                stored_state["exp_avg_sq"] = stored_state["exp_avg_sq"][mask]
+                for key in row_state_keys(stored_state, group['params'][0]):
+                    stored_state[key] = stored_state[key][mask]
 
                 del self.optimizer.state[group['params'][0]]
                 group["params"][0] = nn.Parameter((group["params"][0][mask].requires_grad_(True)))
@@ -368,6 +344,9 @@ class GaussianModel:
         return optimizable_tensors
 
     def prune_points(self, mask):
+        if self.storage is not None:
+            self.bind_storage(self.storage.prune(mask))
+            return
         valid_points_mask = ~mask
         optimizable_tensors = self._prune_optimizer(valid_points_mask)
 
@@ -384,17 +363,18 @@ class GaussianModel:
         self.max_radii2D = self.max_radii2D[valid_points_mask]
 
     def cat_tensors_to_optimizer(self, tensors_dict):
+        if self.storage is not None:
+            return self.storage.cat(tensors_dict)
         optimizable_tensors = {}
         for group in self.optimizer.param_groups:
             assert len(group["params"]) == 1
             extension_tensor = tensors_dict[group["name"]]
             stored_state = self.optimizer.state.get(group['params'][0], None)
             if stored_state is not None:
-
-                stored_state["exp_avg"] = torch.cat((stored_state["exp_avg"], torch.zeros_like(extension_tensor)),
-                                                    dim=0)
-                stored_state["exp_avg_sq"] = torch.cat((stored_state["exp_avg_sq"], torch.zeros_like(extension_tensor)),
-                                                       dim=0)
+                for key in row_state_keys(stored_state, group['params'][0]):
+                    value = stored_state[key]
+                    stored_state[key] = torch.cat((value, value.new_zeros((extension_tensor.shape[0],) + value.shape[1:])),
+                                                  dim=0)
 
                 del self.optimizer.state[group['params'][0]]
                 group["params"][0] = nn.Parameter(
@@ -426,6 +406,13 @@ class GaussianModel:
         self._scaling = optimizable_tensors["scaling"]
         self._rotation = optimizable_tensors["rotation"]
 
+        if self.storage is not None:
+            self.bind_storage(optimizable_tensors)
+            # 与重新创建相同, 所有统计清零
+            self.xyz_gradient_accum.zero_()
+            self.denom.zero_()
+            self.max_radii2D.zero_()
+            return
         self.xyz_gradient_accum = torch.zeros((self.get_xyz.shape[0], 1), device="cuda")
         self.denom = torch.zeros((self.get_xyz.shape[0], 1), device="cuda")
         self.max_radii2D = torch.zeros((self.get_xyz.shape[0]), device="cuda")
@@ -474,23 +461,93 @@ class GaussianModel:
         self.densification_postfix(new_xyz, new_features_dc, new_features_rest, new_opacities, new_scaling,
                                    new_rotation)
 
-    def densify_and_prune(self, max_grad, min_opacity, extent, max_screen_size):
+    def _gather_optimizer(self, index, num_kept, replaced):
+        """
+        Every parameter and its Adam moments rebuilt with one gather: tensor[index]. The rows from num_kept on are new,
+        their optimizer state is zero and replaced[name] overwrites the last rows of a parameter.
+        """
+        if self.storage is not None:
+            return self.storage.gather(index, num_kept, replaced)
+        optimizable_tensors = {}
+        for group in self.optimizer.param_groups:
+            tensor = torch.index_select(group["params"][0].detach(), 0, index)
+            if group["name"] in replaced:
+                rows = replaced[group["name"]]
+                tensor[tensor.shape[0] - rows.shape[0]:] = rows
+            stored_state = self.optimizer.state.get(group['params'][0], None)
+            if stored_state is not None:
+                for key in row_state_keys(stored_state, group['params'][0]):
+                    stored_state[key] = torch.index_select(stored_state[key], 0, index)
+                    stored_state[key][num_kept:] = 0
+                del self.optimizer.state[group['params'][0]]
+            group["params"][0] = nn.Parameter(tensor.requires_grad_(True))
+            if stored_state is not None:
+                self.optimizer.state[group['params'][0]] = stored_state
+            optimizable_tensors[group["name"]] = group["params"][0]
+        return optimizable_tensors
+
+    def densify_and_prune(self, max_grad, min_opacity, extent, max_screen_size, N=2):
+        """
+        densify_and_clone, densify_and_split and prune_points in one pass: the clone set, the split set and the pruned
+        rows are computed on the current state, then every tensor is gathered once.
+        Same result and random numbers as running the three in sequence. The rows end up in the same order:
+        the kept points, their clones, then the N children of the split points.
+        """
         grads = self.xyz_gradient_accum / self.denom
         grads[grads.isnan()] = 0.0
 
-        self.densify_and_clone(grads, max_grad, extent)
-        self.densify_and_split(grads, max_grad, extent)
+        scaling = self.get_scaling
+        max_scaling = torch.max(scaling, dim=1).values
+        clone_mask = torch.logical_and(torch.norm(grads, dim=-1) >= max_grad,
+                                       max_scaling <= self.percent_dense * extent)
+        # 克隆点的梯度按0计, 尺度不超过阈值, 不会再被分裂
+        split_mask = torch.logical_and(grads[:, 0] >= max_grad, max_scaling > self.percent_dense * extent)
+
+        stds = scaling[split_mask].repeat(N, 1)
+        means = torch.zeros((stds.size(0), 3), device="cuda")
+        samples = torch.normal(mean=means, std=stds)
+        rots = build_rotation(self._rotation[split_mask]).repeat(N, 1, 1)
+        split_xyz = torch.bmm(rots, samples.unsqueeze(-1)).squeeze(-1) + self.get_xyz[split_mask].repeat(N, 1)
+        split_scaling = self.scaling_inverse_activation(scaling[split_mask].repeat(N, 1) / (0.8 * N))
 
-        prune_mask = (self.get_opacity < min_opacity).squeeze()
+        # densification_postfix已将max_radii2D清零, 与依次执行时相同, 只按不透明度和世界空间尺度裁剪
+        prune_mask = (self.get_opacity < min_opacity).squeeze(-1)
+        split_prune_mask = prune_mask[split_mask].repeat(N)
         if max_screen_size:
-            big_points_vs = self.max_radii2D > max_screen_size
-            big_points_ws = self.get_scaling.max(dim=1).values > 0.1 * extent
-            prune_mask = torch.logical_or(torch.logical_or(prune_mask, big_points_vs), big_points_ws)
-        self.prune_points(prune_mask)
+            prune_mask = torch.logical_or(prune_mask, max_scaling > 0.1 * extent)
+            split_prune_mask = torch.logical_or(
+                split_prune_mask, self.scaling_activation(split_scaling).max(dim=1).values > 0.1 * extent)
+
+        # 最终每一行来自哪个旧点: 保留的点, 克隆点, 分裂出的点
+        kept = torch.nonzero(~torch.logical_or(split_mask, prune_mask)).squeeze(1)
+        cloned = torch.nonzero(torch.logical_and(clone_mask, ~prune_mask)).squeeze(1)
+        split_keep = ~split_prune_mask
+        children = torch.nonzero(split_mask).squeeze(1).repeat(N)[split_keep]
+        index = torch.cat((kept, cloned, children))
+        optimizable_tensors = self._gather_optimizer(index, kept.shape[0], {"xyz": split_xyz[split_keep],
+                                                                            "scaling": split_scaling[split_keep]})
+
+        if self.storage is not None:
+            self.bind_storage(optimizable_tensors)
+            self.xyz_gradient_accum.zero_()
+            self.denom.zero_()
+            self.max_radii2D.zero_()
+            return
+        self._xyz = optimizable_tensors["xyz"]
+        self._features_dc = optimizable_tensors["f_dc"]
+        self._features_rest = optimizable_tensors["f_rest"]
+        self._opacity = optimizable_tensors["opacity"]
+        self._scaling = optimizable_tensors["scaling"]
+        self._rotation = optimizable_tensors["rotation"]
+
+        self.xyz_gradient_accum = torch.zeros((self.get_xyz.shape[0], 1), device="cuda")
+        self.denom = torch.zeros((self.get_xyz.shape[0], 1), device="cuda")
+        self.max_radii2D = torch.zeros((self.get_xyz.shape[0]), device="cuda")
 
         torch.cuda.empty_cache()
 
     def add_densification_stats(self, viewspace_point_tensor, update_filter):
-        self.xyz_gradient_accum[update_filter] += torch.norm(viewspace_point_tensor.grad[update_filter, :2], dim=-1,
-                                                             keepdim=True)
-        self.denom[update_filter] += 1
\ No newline at end of file
+        # 不用布尔索引, 不可见的行加0, 避免每个视点一次主机同步
+        self.xyz_gradient_accum += torch.where(update_filter[:, None],
+                                               torch.norm(viewspace_point_tensor.grad[:, :2], dim=-1, keepdim=True), 0)
+        self.denom += update_filter[:, None]
\ No newline at end of file
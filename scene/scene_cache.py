@@ -0,0 +1,143 @@
+#
+# Copyright (C) 2023, Inria
+# GRAPHDECO research group, https://team.inria.fr/graphdeco
+# All rights reserved.
+#
+# This software is free for non-commercial, research and evaluation use
+# under the terms of the LICENSE.md file.
+#
+# For inquiries contact  george.drettakis@inria.fr
+#
+
+import os
+import json
+import numpy as np
+from scene.dataset_readers import sceneLoadTypeCallbacks, CameraInfo, SceneInfo, openImages
+from scene.gaussian_model import BasicPointCloud
+from utils.system_utils import atomic_output
+
+# 解析结果缓存在数据集目录下, 源文件的大小或修改时间变化后自动失效
+CACHE_DIR = ".gs_cache"
+CACHE_FILE = "scene_info.npz"
+CACHE_VERSION = 2
+
+# 每种数据集解析时读取的文件(相对source_path), 不存在的文件也记录下来
+SOURCE_FILES = {
+    "Colmap": ["sparse/0/images.bin", "sparse/0/cameras.bin", "sparse/0/images.txt",
+               "sparse/0/cameras.txt", "sparse/0/points3D.ply"],
+    "Blender": ["transforms_train.json", "transforms_test.json", "points3d.ply"],
+    "NeRFstudio": ["transforms.json", "points3d.ply"],
+    "Polycam": ["transforms_polycam.json", "points3d.ply"],
+}
+
+def source_fingerprint(scene_type, source_path):
+    fingerprint = []
+    for name in SOURCE_FILES[scene_type]:
+        path = os.path.join(source_path, name)
+        if os.path.exists(path):
+            stat = os.stat(path)
+            fingerprint.append([name, stat.st_size, stat.st_mtime_ns])
+        else:
+            fingerprint.append([name, None, None])
+    return fingerprint
+
+def cache_key(scene_type, source_path, reader_args, reader_kwargs):
+    return {"version": CACHE_VERSION,
+            "scene_type": scene_type,
+            "source_path": os.path.abspath(source_path),
+            "args": repr(tuple(reader_args)),
+            # 解码线程数以及是否解码图像不影响解析结果
+            "kwargs": repr(sorted((k, v) for k, v in reader_kwargs.items() if k not in ["data_workers", "low_memory"])),
+            "files": source_fingerprint(scene_type, source_path)}
+
+def read_cache_header(cache_path):
+    try:
+        with np.load(cache_path) as data:
+            return json.loads(data["header"].tobytes().decode("utf-8"))
+    except Exception:
+        return None
+
+def save_scene_info(cache_path, key, scene_info):
+    cameras = scene_info.train_cameras + scene_info.test_cameras
+    header = {"key": key,
+              "num_train": len(scene_info.train_cameras),
+              "image_paths": [cam.image_path for cam in cameras],
+              "image_names": [cam.image_name for cam in cameras],
+              "depth_paths": [cam.depth_path or "" for cam in cameras],
+              "ply_path": scene_info.ply_path,
+              "radius": float(scene_info.nerf_normalization["radius"]),
+              "has_point_cloud": scene_info.point_cloud is not None}
+    arrays = {"header": np.frombuffer(json.dumps(header).encode("utf-8"), dtype=np.uint8),
+              "uid": np.array([cam.uid for cam in cameras], dtype=np.int64),
+              "R": np.array([cam.R for cam in cameras], dtype=np.float64).reshape(-1, 3, 3),
+              "T": np.array([cam.T for cam in cameras], dtype=np.float64).reshape(-1, 3),
+              "fov": np.array([[cam.FovX, cam.FovY] for cam in cameras], dtype=np.float64).reshape(-1, 2),
+              "size": np.array([[cam.width, cam.height] for cam in cameras], dtype=np.int64).reshape(-1, 2),
+              "translate": np.asarray(scene_info.nerf_normalization["translate"])}
+    if scene_info.point_cloud is not None:
+        arrays["points"] = scene_info.point_cloud.points
+        arrays["colors"] = scene_info.point_cloud.colors
+        arrays["normals"] = scene_info.point_cloud.normals
+
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    with atomic_output(cache_path) as tmp_path:
+        with open(tmp_path, "wb") as file:
+            np.savez(file, **arrays)
+
+def restore_scene_info(cache_path, scene_type, reader_args, reader_kwargs):
+    """
+    Rebuild the SceneInfo from the cache, the images (and depths) are opened again from their paths
+    the same way the readers open them.
+    """
+    with np.load(cache_path) as data:
+        header = json.loads(data["header"].tobytes().decode("utf-8"))
+        arrays = {name: data[name] for name in data.files if name != "header"}
+
+    num_cameras = arrays["uid"].shape[0]
+    if reader_kwargs.get("low_memory", False):
+        images = [(None, None)] * num_cameras
+    else:
+        white_background = reader_args[0] if scene_type == "Blender" else None
+        images = openImages([(image_path, depth_path or None, white_background) for image_path, depth_path
+                             in zip(header["image_paths"], header["depth_paths"])], reader_kwargs.get("data_workers", 8))
+    cameras = []
+    for idx, (image, depth) in enumerate(images):
+        image_path = header["image_paths"][idx]
+        FovX, FovY = arrays["fov"][idx]
+        width, height = arrays["size"][idx]
+        cameras.append(CameraInfo(uid=int(arrays["uid"][idx]), R=arrays["R"][idx], T=arrays["T"][idx],
+                                  FovY=float(FovY), FovX=float(FovX), image=image, depth=depth,
+                                  image_path=image_path, image_name=header["image_names"][idx],
+                                  width=int(width), height=int(height), depth_path=header["depth_paths"][idx] or None))
+
+    point_cloud = None
+    if header["has_point_cloud"]:
+        point_cloud = BasicPointCloud(points=arrays["points"], colors=arrays["colors"], normals=arrays["normals"])
+    num_train = header["num_train"]
+    return SceneInfo(point_cloud=point_cloud,
+                     train_cameras=cameras[:num_train],
+                     test_cameras=cameras[num_train:],
+                     nerf_normalization={"translate": arrays["translate"], "radius": header["radius"]},
+                     ply_path=header["ply_path"])
+
+def load_scene_info(scene_type, source_path, *reader_args, **reader_kwargs):
+    """
+    Same as sceneLoadTypeCallbacks[scene_type](source_path, *reader_args, **reader_kwargs), but the parsed cameras,
+    normalization and initial point cloud are stored in source_path/.gs_cache/scene_info.npz and reused
+    while the source files keep the same size and mtime.
+    """
+    cache_path = os.path.join(source_path, CACHE_DIR, CACHE_FILE)
+    key = cache_key(scene_type, source_path, reader_args, reader_kwargs)
+    header = read_cache_header(cache_path) if os.path.exists(cache_path) else None
+    if header is not None and header["key"] == key:
+        print("Loading scene info from cache {}".format(cache_path))
+        return restore_scene_info(cache_path, scene_type, reader_args, reader_kwargs)
+
+    scene_info = sceneLoadTypeCallbacks[scene_type](source_path, *reader_args, **reader_kwargs)
+    # 第一次打开场景时读取函数可能会生成初始点云, 所以在读取之后再计算文件指纹
+    key = cache_key(scene_type, source_path, reader_args, reader_kwargs)
+    try:
+        save_scene_info(cache_path, key, scene_info)
+    except OSError as e:
+        print("[Warning] could not write the scene cache {}: {}".format(cache_path, e))
+    return scene_info
@@ -9,15 +9,22 @@
 # For inquiries contact  george.drettakis@inria.fr
 #
 import os
-os.environ["CUDA_LAUNCH_BLOCKING"] = "1"
+import sys
+# 调试用: --cuda_launch_blocking让每个CUDA核函数同步执行, 必须在初始化CUDA之前设置
+if "--cuda_launch_blocking" in sys.argv:
+    os.environ["CUDA_LAUNCH_BLOCKING"] = "1"
 
+import time
 import torch
 from random import randint
 from utils.loss_utils import l1_loss, ssim, compute_depth_loss, compute_rank_loss, compute_continue_loss
 from gaussian_renderer import render, network_gui, AppearanceOptimizer
-import sys
 from scene import Scene, GaussianModel
-from utils.general_utils import safe_state
+from utils.general_utils import safe_state, stored_to_float
+from utils.async_saver import BackgroundSaver, save_torch_atomic
+from utils.prefetch_utils import ViewpointPrefetcher
+from utils.log_utils import DeviceScalars, BackgroundWriter
+from utils.profile_utils import PhaseProfiler, NullProfiler
 import uuid
 from tqdm import tqdm
 from utils.image_utils import psnr
@@ -30,170 +37,288 @@ except ImportError:
     TENSORBOARD_FOUND = False
 
 
-def training(dataset, opt, pipe, testing_iterations, saving_iterations, checkpoint_iterations, checkpoint, debug_from, depth_loss_choice):
+def training(dataset, opt, pipe, testing_iterations, saving_iterations, checkpoint_iterations, checkpoint, debug_from, depth_loss_choice, saver=None, prefetch=0, sync_interval=0, profile_interval=0):
     first_iter = 0
     tb_writer = prepare_output_and_logger(dataset)
-    gaussians = GaussianModel(dataset.sh_degree) # 首先实例化3d高斯
-    scene = Scene(dataset, gaussians) # 这一步根据读取的数据去给3d高斯的属性进行初始化
-    ## 实例化相机姿态优化类
-    # cameraoptimizer = CameraOptimizer(len(scene.getTrainCameras()))
-
-    ## 实例化外观嵌入类
-    if dataset.able_appearance_embedding:
-        print('Using Appearance Optimizer')
-        appearanceoptimizer = AppearanceOptimizer(len(scene.getTrainCameras()))
-    else:
-        print('Appearance Optimizer Close')
-        appearanceoptimizer = None
-
-    # 检测深度图是否准备就绪
-    if scene.getTrainCameras()[0].depth is not None and dataset.using_depth:
-        print("Depth map Ready！")
-    else:
-        assert dataset.using_depth == False, "depth map is not exist, so using depth must close"
-
-    gaussians.training_setup(opt) # 训练前的准备工作
-    if checkpoint:
-        (model_params, first_iter) = torch.load(checkpoint)
-        gaussians.restore(model_params, opt)
-
-    bg_color = [1, 1, 1] if dataset.white_background else [0, 0, 0]
-    background = torch.tensor(bg_color, dtype=torch.float32, device="cuda")
-
-    iter_start = torch.cuda.Event(enable_timing = True)
-    iter_end = torch.cuda.Event(enable_timing = True)
-
-    viewpoint_stack = None
-    ema_loss_for_log = 0.0
-    progress_bar = tqdm(range(first_iter, opt.iterations), desc="Training progress")
-    first_iter += 1
-    for iteration in range(first_iter, opt.iterations + 1):        
-        if network_gui.conn == None:
-            network_gui.try_connect()
-        while network_gui.conn != None:
-            try:
-                net_image_bytes = None
-                custom_cam, do_training, pipe.convert_SHs_python, pipe.compute_cov3D_python, keep_alive, scaling_modifer = network_gui.receive()
-                if custom_cam != None:
-                    net_image = render(custom_cam, gaussians, pipe, background, scaling_modifer)["render"]
-                    net_image_bytes = memoryview((torch.clamp(net_image, min=0, max=1.0) * 255).byte().permute(1, 2, 0).contiguous().cpu().numpy())
-                network_gui.send(net_image_bytes, dataset.source_path)
-                if do_training and ((iteration < int(opt.iterations)) or not keep_alive):
-                    break
-            except Exception as e:
-                network_gui.conn = None
-
-        iter_start.record()
-
-        gaussians.update_learning_rate(iteration) # 使用学习率衰减策略用于高斯
-
-        # Every 1000 its we increase the levels of SH up to a maximum degree
-        if iteration % 1000 == 0:
-            gaussians.oneupSHdegree()
-
-        # Pick a random Camera
-        if not viewpoint_stack:
-            viewpoint_stack = scene.getTrainCameras().copy()
-        viewpoint_cam = viewpoint_stack.pop(randint(0, len(viewpoint_stack)-1)) # 随机从训练集上选择一个视点
-
+    # sync_interval > 0: 损失等标量留在设备上, 每sync_interval次迭代一次性取回, tensorboard在后台线程写入
+    scalar_log = None
+    if sync_interval > 0:
+        scalar_log = DeviceScalars()
+        if tb_writer:
+            tb_writer = BackgroundWriter(tb_writer)
+    # profile_interval > 0: 各阶段耗时, 每profile_interval次迭代写入profile.jsonl和tensorboard
+    profiler = PhaseProfiler(dataset.model_path, profile_interval, tb_writer) if profile_interval > 0 else NullProfiler()
+    # 训练出错或中断时也结束后台线程, 已排队的tensorboard写入不会丢失
+    prefetcher = None
+    try:
+        gaussians = GaussianModel(dataset.sh_degree) # 首先实例化3d高斯
+        scene = Scene(dataset, gaussians) # 这一步根据读取的数据去给3d高斯的属性进行初始化
+        ## 实例化相机姿态优化类
+        # cameraoptimizer = CameraOptimizer(len(scene.getTrainCameras()))
+
+        ## 实例化外观嵌入类
         if dataset.able_appearance_embedding:
-            # appearance embedding
-            rgb_factors = appearanceoptimizer(viewpoint_cam)
+            print('Using Appearance Optimizer')
+            appearanceoptimizer = AppearanceOptimizer(len(scene.getTrainCameras()))
+        else:
+            print('Appearance Optimizer Close')
+            appearanceoptimizer = None
+
+        # 检测深度图是否准备就绪
+        if scene.getTrainCameras()[0].depth is not None and dataset.using_depth:
+            print("Depth map Ready！")
         else:
-            rgb_factors = None
-        # Render
-        if (iteration - 1) == debug_from:
-            pipe.debug = True
-        render_pkg = render(viewpoint_cam, gaussians, pipe, background, rgb_factors=rgb_factors)
-        image, viewspace_point_tensor, visibility_filter, radii, depth = render_pkg["render"], render_pkg["viewspace_points"], render_pkg["visibility_filter"], render_pkg["radii"], render_pkg["depth"]
-
-        # Loss
-        gt_image = viewpoint_cam.original_image.cuda()
-        Ll1 = l1_loss(image, gt_image)
-        loss = (1.0 - opt.lambda_dssim) * Ll1 + opt.lambda_dssim * (1.0 - ssim(image, gt_image))
-        # add depth loss
-        if viewpoint_cam.depth is not None and dataset.using_depth:
-            assert args.depth_loss_choice in ["localrf", "rank_loss", "continue_loss",
-                                              "hybrid_loss", "L1_loss"], "loss choice error!"
-            if depth_loss_choice == 'localrf':
-                gt_depth = viewpoint_cam.depth.cuda()
-                depth_loss = compute_depth_loss(1 / depth.clamp(1e-6), gt_depth, opt.lambda_depth)
-                loss = loss + depth_loss
-            elif depth_loss_choice == 'rank_loss':
-                gt_depth = viewpoint_cam.depth.cuda()
-                depth_loss = compute_rank_loss(1 / depth.clamp(1e-6), gt_depth, opt.lambda_rank_depth)
-                loss = loss + depth_loss
-            elif depth_loss_choice == 'continue_loss':
-                gt_depth = viewpoint_cam.depth.cuda()
-                depth_loss = compute_continue_loss(1 / depth.clamp(1e-6), gt_depth, opt.lambda_continue_depth)
-                loss = loss + depth_loss
-            elif depth_loss_choice == 'hybrid_loss':
-                gt_depth = viewpoint_cam.depth.cuda()
-                depth_loss_continue = compute_continue_loss(1 / depth.clamp(1e-6), gt_depth, opt.lambda_continue_depth)
-                depth_loss_rank = compute_rank_loss(1 / depth.clamp(1e-6), gt_depth, opt.lambda_rank_depth)
-                depth_loss = depth_loss_continue + depth_loss_rank
-                loss = loss + depth_loss
-            elif depth_loss_choice == 'L1_loss':
-                 # 应该处理gt——depth而不是pred——depth
-                gt_depth = viewpoint_cam.depth.cuda()
-                gt_depth = gt_depth / gt_depth.max()
-                depth_loss = l1_loss(1 / depth.clamp(1e-6), gt_depth) * opt.lambda_depth
-                loss = loss + depth_loss
-
-        loss.backward()
-        iter_end.record()
-
-        with torch.no_grad():
-            # Progress bar
-            ema_loss_for_log = 0.4 * loss.item() + 0.6 * ema_loss_for_log
-            if iteration % 10 == 0:
-                progress_bar.set_postfix({"Loss": f"{ema_loss_for_log:.{7}f}",
-                                          "totol points": f"{scene.gaussians.get_xyz.shape[0]}"
-                                          })
-                progress_bar.update(10)
-            if iteration == opt.iterations:
-                progress_bar.close()
-
-            # Log and save
-            if depth_loss_choice is not None:
-                training_report_add_depth(tb_writer, iteration, Ll1, depth_loss, loss, l1_loss, iter_start.elapsed_time(iter_end),
-                                testing_iterations, scene, render, (pipe, background), depth_loss_choice)
-            else:
-                training_report(tb_writer, iteration, Ll1, loss, l1_loss, iter_start.elapsed_time(iter_end), testing_iterations, scene, render, (pipe, background))
-            if (iteration in saving_iterations):
-                print("\n[ITER {}] Saving Gaussians".format(iteration))
-                scene.save(iteration)
-                if dataset.able_appearance_embedding:
-                    # save appearance
-                    save_path = os.path.join(dataset.model_path, "point_cloud/iteration_{}".format(iteration))
-                    appearanceoptimizer.save_appearance_embedding(os.path.join(save_path, "appearance_embedding.ckpt"))
-
-            # Densification
-            if iteration < opt.densify_until_iter: #只在前面的step进行？
-                # Keep track of max radii in image-space for pruning
-                gaussians.max_radii2D[visibility_filter] = torch.max(gaussians.max_radii2D[visibility_filter], radii[visibility_filter])
-                gaussians.add_densification_stats(viewspace_point_tensor, visibility_filter)
-
-                if iteration > opt.densify_from_iter and iteration % opt.densification_interval == 0:
-                    size_threshold = 20 if iteration > opt.opacity_reset_interval else None
-                    gaussians.densify_and_prune(opt.densify_grad_threshold, 0.005, scene.cameras_extent, size_threshold)
+            assert dataset.using_depth == False, "depth map is not exist, so using depth must close"
+
+        gaussians.training_setup(opt) # 训练前的准备工作
+        if checkpoint:
+            (model_params, first_iter) = torch.load(checkpoint)
+            gaussians.restore(model_params, opt)
+
+        bg_color = [1, 1, 1] if dataset.white_background else [0, 0, 0]
+        background = torch.tensor(bg_color, dtype=torch.float32, device="cuda")
+
+        iter_start = torch.cuda.Event(enable_timing = True)
+        iter_end = torch.cuda.Event(enable_timing = True)
+
+        viewpoint_stack = None
+        # 在后台线程提前准备之后prefetch个视点的图像, 采样顺序与下面的viewpoint_stack相同
+        if prefetch > 0:
+            prefetcher = ViewpointPrefetcher(scene.getTrainCameras(), prefetch, load_depth=dataset.using_depth)
+        ema_loss_for_log = 0.0
+        progress_bar = tqdm(range(first_iter, opt.iterations), desc="Training progress")
+        first_iter += 1
+        # batch_views > 1时每一步处理视点iteration..last, 迭代次数按视点数计算, 学习率和各种间隔因此不变
+        batch_views = max(opt.batch_views, 1)
+
+        def crossed(interval, after=0):
+            # iteration..last中有大于after的interval的倍数
+            multiple = last // interval * interval
+            return multiple >= iteration and multiple > after
+
+        def reached(iterations):
+            return next((i for i in iterations if iteration <= i <= last), None)
+
+        train_start = time.perf_counter()
+        for iteration in range(first_iter, opt.iterations + 1, batch_views):
+            last = min(iteration + batch_views - 1, opt.iterations)
+            with profiler.phase("network_gui"):
+                if network_gui.conn == None:
+                    network_gui.try_connect()
+                while network_gui.conn != None:
+                    try:
+                        net_image_bytes = None
+                        custom_cam, do_training, pipe.convert_SHs_python, pipe.compute_cov3D_python, keep_alive, scaling_modifer = network_gui.receive()
+                        if custom_cam != None:
+                            net_image = render(custom_cam, gaussians, pipe, background, scaling_modifer)["render"]
+                            net_image_bytes = memoryview((torch.clamp(net_image, min=0, max=1.0) * 255).byte().permute(1, 2, 0).contiguous().cpu().numpy())
+                        network_gui.send(net_image_bytes, dataset.source_path)
+                        if do_training and ((iteration < int(opt.iterations)) or not keep_alive):
+                            break
+                    except Exception as e:
+                        network_gui.conn = None
+
+            if scalar_log is not None:
+                # 计时事件在取回标量时才读取, 每次迭代使用新的事件
+                iter_start, iter_end = torch.cuda.Event(enable_timing=True), torch.cuda.Event(enable_timing=True)
+            iter_start.record()
+
+            gaussians.update_learning_rate(iteration) # 使用学习率衰减策略用于高斯
+
+            # Every 1000 its we increase the levels of SH up to a maximum degree
+            if crossed(1000):
+                gaussians.oneupSHdegree()
+
+            # Pick a random Camera
+            # batch_views个视点的损失相加后一起反向传播
+            views = []
+            with profiler.phase("data"):
+                for _ in range(last - iteration + 1):
+                    if prefetcher is not None:
+                        viewpoint_cam, staged_image, staged_depth = prefetcher.next()
+                    else:
+                        if not viewpoint_stack:
+                            viewpoint_stack = scene.getTrainCameras().copy()
+                        viewpoint_cam = viewpoint_stack.pop(randint(0, len(viewpoint_stack)-1)) # 随机从训练集上选择一个视点
+                        staged_image, staged_depth = None, None
+                    # 图像在这里拷贝到设备, 数据传输计入data阶段
+                    if staged_image is None:
+                        staged_image = viewpoint_cam.original_image.cuda()
+                    if staged_depth is None and dataset.using_depth and viewpoint_cam.depth is not None:
+                        staged_depth = viewpoint_cam.depth.cuda()
+                    views.append((viewpoint_cam, staged_image, staged_depth))
+
+            # Render
+            if iteration - 1 <= debug_from < last:
+                pipe.debug = True
+            loss, Ll1, depth_loss = 0.0, 0.0, torch.zeros((), device="cuda")
+            render_pkgs = []
+            for viewpoint_cam, staged_image, staged_depth in views:
+                with profiler.phase("render"):
+                    if dataset.able_appearance_embedding:
+                        # appearance embedding
+                        rgb_factors = appearanceoptimizer(viewpoint_cam)
+                    else:
+                        rgb_factors = None
+                    render_pkg = render(viewpoint_cam, gaussians, pipe, background, rgb_factors=rgb_factors)
+                render_pkgs.append(render_pkg)
+                with profiler.phase("loss"):
+                    view_loss, view_Ll1, view_depth_loss = compute_view_loss(viewpoint_cam, render_pkg, staged_image, staged_depth,
+                                                                             opt, dataset, depth_loss_choice)
+                    loss = loss + view_loss
+                    Ll1 = Ll1 + view_Ll1 / len(views)
+                    if view_depth_loss is not None:
+                        depth_loss = depth_loss + view_depth_loss
+
+            with profiler.phase("backward"):
+                loss.backward()
+            iter_end.record()
+
+            with torch.no_grad():
+                # Progress bar
+                with profiler.phase("logging"):
+                    if scalar_log is None:
+                        ema_loss_for_log = 0.4 * loss.item() + 0.6 * ema_loss_for_log
+                    else:
+                        ema_loss_for_log = 0.4 * loss.detach() + 0.6 * ema_loss_for_log
+                        scalars = {"l1_loss": Ll1, "total_loss": loss, "ema_loss": ema_loss_for_log}
+                        if depth_loss_choice is not None:
+                            scalars[depth_loss_choice] = depth_loss
+                        scalar_log.record(last, scalars, (iter_start, iter_end))
+                        if crossed(sync_interval) or last == opt.iterations:
+                            rows = scalar_log.fetch()
+                            report_scalars(tb_writer, rows)
+                            progress_bar.set_postfix({"Loss": f"{rows[-1][1]['ema_loss']:.{7}f}",
+                                                      "totol points": f"{scene.gaussians.get_xyz.shape[0]}"})
+                    if crossed(10):
+                        if scalar_log is None:
+                            progress_bar.set_postfix({"Loss": f"{ema_loss_for_log:.{7}f}",
+                                                      "totol points": f"{scene.gaussians.get_xyz.shape[0]}"
+                                                      })
+                        progress_bar.update(last - progress_bar.n - first_iter + 1)
+                        if prefetcher is not None and tb_writer:
+                            tb_writer.add_scalar('prefetch_stall_time', prefetcher.stall_time, last)
+                    if last == opt.iterations:
+                        progress_bar.close()
+
+                # Log and save
+                with profiler.phase("logging"):
+                    report_iteration = reached(testing_iterations) or last
+                    if scalar_log is not None:
+                        # 训练标量已由scalar_log记录, 这里只做测试
+                        if report_iteration in testing_iterations:
+                            training_report(tb_writer, report_iteration, None, None, l1_loss, None, testing_iterations, scene, render, (pipe, background))
+                    elif depth_loss_choice is not None:
+                        training_report_add_depth(tb_writer, report_iteration, Ll1, depth_loss, loss, l1_loss, iter_start.elapsed_time(iter_end),
+                                        testing_iterations, scene, render, (pipe, background), depth_loss_choice)
+                    else:
+                        training_report(tb_writer, report_iteration, Ll1, loss, l1_loss, iter_start.elapsed_time(iter_end), testing_iterations, scene, render, (pipe, background))
+
+                with profiler.phase("saving"):
+                    save_iteration = reached(saving_iterations)
+                    if save_iteration:
+                        print("\n[ITER {}] Saving Gaussians".format(save_iteration))
+                        scene.save(save_iteration, saver=saver)
+                        if dataset.able_appearance_embedding:
+                            # save appearance
+                            save_path = os.path.join(dataset.model_path, "point_cloud/iteration_{}".format(save_iteration))
+                            appearanceoptimizer.save_appearance_embedding(os.path.join(save_path, "appearance_embedding.ckpt"), saver=saver)
+                        if saver is not None and tb_writer:
+                            tb_writer.add_scalar('save_blocked_time', saver.blocked_time, save_iteration)
+
+                # Densification
+                with profiler.phase("densification"):
+                    if iteration < opt.densify_until_iter: #只在前面的step进行？
+                        # 每个视点分别统计, 与逐个视点训练相同
+                        for render_pkg in render_pkgs:
+                            visibility_filter, radii = render_pkg["visibility_filter"], render_pkg["radii"]
+                            # Keep track of max radii in image-space for pruning
+                            gaussians.max_radii2D.copy_(torch.where(visibility_filter, torch.max(gaussians.max_radii2D, radii),
+                                                                    gaussians.max_radii2D))
+                            gaussians.add_densification_stats(render_pkg["viewspace_points"], visibility_filter)
+
+                        if crossed(opt.densification_interval, after=opt.densify_from_iter):
+                            size_threshold = 20 if iteration > opt.opacity_reset_interval else None
+                            gaussians.densify_and_prune(opt.densify_grad_threshold, 0.005, scene.cameras_extent, size_threshold)
                 
-                if iteration % opt.opacity_reset_interval == 0 or (dataset.white_background and iteration == opt.densify_from_iter):
-                    gaussians.reset_opacity()
-
-            # Optimizer step
-            if iteration < opt.iterations:
-                gaussians.optimizer.step()
-                gaussians.optimizer.zero_grad(set_to_none = True)
-                # cameraoptimizer.optimizer.step()
-                # cameraoptimizer.optimizer.zero_grad(set_to_none=True)
-                if dataset.able_appearance_embedding:
-                    appearanceoptimizer.appearance_embedding_optimizer.step()
-                    appearanceoptimizer.appearance_embedding_optimizer.zero_grad(set_to_none=True)
-
-            if (iteration in checkpoint_iterations):
-                print("\n[ITER {}] Saving Checkpoint".format(iteration))
-                torch.save((gaussians.capture(), iteration), scene.model_path + "/chkpnt" + str(iteration) + ".pth")
+                        if crossed(opt.opacity_reset_interval) or (dataset.white_background and iteration <= opt.densify_from_iter <= last):
+                            gaussians.reset_opacity()
+
+                # Optimizer step
+                with profiler.phase("optimizer"):
+                    if last < opt.iterations:
+                        if opt.sparse_adam:
+                            # 只更新本步任一视点可见的高斯
+                            visible = render_pkgs[0]["visibility_filter"]
+                            for render_pkg in render_pkgs[1:]:
+                                visible = torch.logical_or(visible, render_pkg["visibility_filter"])
+                            gaussians.optimizer.step(visible)
+                        else:
+                            gaussians.optimizer.step()
+                        gaussians.optimizer.zero_grad(set_to_none = True)
+                        # cameraoptimizer.optimizer.step()
+                        # cameraoptimizer.optimizer.zero_grad(set_to_none=True)
+                        if dataset.able_appearance_embedding:
+                            appearanceoptimizer.appearance_embedding_optimizer.step()
+                            appearanceoptimizer.appearance_embedding_optimizer.zero_grad(set_to_none=True)
+
+                with profiler.phase("saving"):
+                    checkpoint_iteration = reached(checkpoint_iterations)
+                    if checkpoint_iteration:
+                        print("\n[ITER {}] Saving Checkpoint".format(checkpoint_iteration))
+                        checkpoint_path = scene.model_path + "/chkpnt" + str(checkpoint_iteration) + ".pth"
+                        if saver is None:
+                            save_torch_atomic((gaussians.capture(), checkpoint_iteration), checkpoint_path)
+                        else:
+                            saver.submit(save_torch_atomic, (gaussians.capture(), checkpoint_iteration), checkpoint_path)
+
+            profiler.step(last, gaussians.get_xyz.shape[0])
+
+        profiler.close()
+        torch.cuda.synchronize()
+        train_time = time.perf_counter() - train_start
+        print("\nTraining: {} iterations in {:.1f}s, {:.2f} it/s".format(
+            opt.iterations - first_iter + 1, train_time, (opt.iterations - first_iter + 1) / max(train_time, 1e-9)))
+        if prefetcher is not None:
+            print("Prefetch: {} viewpoints, training waited {:.2f}s for images".format(prefetcher.num_samples, prefetcher.stall_time))
+        if scene.image_cache is not None:
+            print("Image cache: {}".format(scene.image_cache.stats()))
+    finally:
+        if isinstance(tb_writer, BackgroundWriter):
+            tb_writer.close()
+        if prefetcher is not None:
+            prefetcher.close()
+
+def compute_view_loss(viewpoint_cam, render_pkg, staged_image, staged_depth, opt, dataset, depth_loss_choice):
+    """:return: loss of one view, its l1 loss and depth loss (None without depth supervision)"""
+    image, depth = render_pkg["render"], render_pkg["depth"]
+
+    # Loss
+    gt_image = stored_to_float(staged_image if staged_image is not None else viewpoint_cam.original_image.cuda())
+    Ll1 = l1_loss(image, gt_image)
+    loss = (1.0 - opt.lambda_dssim) * Ll1 + opt.lambda_dssim * (1.0 - ssim(image, gt_image))
+    depth_loss = None
+    # add depth loss
+    if viewpoint_cam.depth is not None and dataset.using_depth:
+        assert depth_loss_choice in ["localrf", "rank_loss", "continue_loss",
+                                     "hybrid_loss", "L1_loss"], "loss choice error!"
+        gt_depth = stored_to_float(staged_depth if staged_depth is not None else viewpoint_cam.depth.cuda())
+        if depth_loss_choice == 'localrf':
+            depth_loss = compute_depth_loss(1 / depth.clamp(1e-6), gt_depth, opt.lambda_depth)
+        elif depth_loss_choice == 'rank_loss':
+            depth_loss = compute_rank_loss(1 / depth.clamp(1e-6), gt_depth, opt.lambda_rank_depth)
+        elif depth_loss_choice == 'continue_loss':
+            depth_loss = compute_continue_loss(1 / depth.clamp(1e-6), gt_depth, opt.lambda_continue_depth)
+        elif depth_loss_choice == 'hybrid_loss':
+            depth_loss_continue = compute_continue_loss(1 / depth.clamp(1e-6), gt_depth, opt.lambda_continue_depth)
+            depth_loss_rank = compute_rank_loss(1 / depth.clamp(1e-6), gt_depth, opt.lambda_rank_depth)
+            depth_loss = depth_loss_continue + depth_loss_rank
+        elif depth_loss_choice == 'L1_loss':
+             # 应该处理gt——depth而不是pred——depth
+            gt_depth = gt_depth / gt_depth.max()
+            depth_loss = l1_loss(1 / depth.clamp(1e-6), gt_depth) * opt.lambda_depth
+        loss = loss + depth_loss
+    return loss, Ll1, depth_loss
 
 def prepare_output_and_logger(args):    
     if not args.model_path:
@@ -217,8 +342,18 @@ def prepare_output_and_logger(args):
         print("Tensorboard not available: not logging progress")
     return tb_writer
 
-def training_report(tb_writer, iteration, Ll1, loss, l1_loss, elapsed, testing_iterations, scene : Scene, renderFunc, renderArgs):
+def report_scalars(tb_writer, rows):
+    """Write the training scalars fetched by DeviceScalars"""
     if tb_writer:
+        for iteration, scalars in rows:
+            for name, value in scalars.items():
+                if name == "iter_time":
+                    tb_writer.add_scalar('iter_time', value, iteration)
+                elif name != "ema_loss":
+                    tb_writer.add_scalar('train_loss_patches/' + name, value, iteration)
+
+def training_report(tb_writer, iteration, Ll1, loss, l1_loss, elapsed, testing_iterations, scene : Scene, renderFunc, renderArgs):
+    if tb_writer and loss is not None:
         tb_writer.add_scalar('train_loss_patches/l1_loss', Ll1.item(), iteration)
         tb_writer.add_scalar('train_loss_patches/total_loss', loss.item(), iteration)
         tb_writer.add_scalar('iter_time', elapsed, iteration)
@@ -235,7 +370,7 @@ def training_report(tb_writer, iteration, Ll1, loss, l1_loss, elapsed, testing_i
                 psnr_test = 0.0
                 for idx, viewpoint in enumerate(config['cameras']):
                     image = torch.clamp(renderFunc(viewpoint, scene.gaussians, *renderArgs)["render"], 0.0, 1.0)
-                    gt_image = torch.clamp(viewpoint.original_image.to("cuda"), 0.0, 1.0)
+                    gt_image = torch.clamp(stored_to_float(viewpoint.original_image.to("cuda")), 0.0, 1.0)
                     if tb_writer and (idx < 5):
                         tb_writer.add_images(config['name'] + "_view_{}/render".format(viewpoint.image_name), image[None], global_step=iteration)
                         if iteration == testing_iterations[0]:
@@ -252,6 +387,9 @@ def training_report(tb_writer, iteration, Ll1, loss, l1_loss, elapsed, testing_i
         if tb_writer:
             tb_writer.add_histogram("scene/opacity_histogram", scene.gaussians.get_opacity, iteration)
             tb_writer.add_scalar('total_points', scene.gaussians.get_xyz.shape[0], iteration)
+            if scene.image_cache is not None:
+                for key, value in scene.image_cache.stats().items():
+                    tb_writer.add_scalar('image_cache/' + key, value, iteration)
         torch.cuda.empty_cache()
 
 def training_report_add_depth(tb_writer, iteration, Ll1, depth_loss, loss, l1_loss, elapsed, testing_iterations, scene : Scene, renderFunc, renderArgs, depth_loss_choice):
@@ -273,7 +411,7 @@ def training_report_add_depth(tb_writer, iteration, Ll1, depth_loss, loss, l1_lo
                 psnr_test = 0.0
                 for idx, viewpoint in enumerate(config['cameras']):
                     image = torch.clamp(renderFunc(viewpoint, scene.gaussians, *renderArgs)["render"], 0.0, 1.0)
-                    gt_image = torch.clamp(viewpoint.original_image.to("cuda"), 0.0, 1.0)
+                    gt_image = torch.clamp(stored_to_float(viewpoint.original_image.to("cuda")), 0.0, 1.0)
                     if tb_writer and (idx < 5):
                         tb_writer.add_images(config['name'] + "_view_{}/render".format(viewpoint.image_name), image[None], global_step=iteration)
                         if iteration == testing_iterations[0]:
@@ -290,6 +428,9 @@ def training_report_add_depth(tb_writer, iteration, Ll1, depth_loss, loss, l1_lo
         if tb_writer:
             tb_writer.add_histogram("scene/opacity_histogram", scene.gaussians.get_opacity, iteration)
             tb_writer.add_scalar('total_points', scene.gaussians.get_xyz.shape[0], iteration)
+            if scene.image_cache is not None:
+                for key, value in scene.image_cache.stats().items():
+                    tb_writer.add_scalar('image_cache/' + key, value, iteration)
         torch.cuda.empty_cache()
 
 if __name__ == "__main__":
@@ -308,6 +449,15 @@ if __name__ == "__main__":
     parser.add_argument("--checkpoint_iterations", nargs="+", type=int, default=[])
     parser.add_argument("--start_checkpoint", type=str, default=None)
     parser.add_argument("--depth_loss_choice", type=str, default=None)
+    # 在后台线程保存点云和checkpoint, 队列满时训练才会等待
+    parser.add_argument("--async_save", action="store_true")
+    parser.add_argument("--save_queue_size", type=int, default=2)
+    parser.add_argument("--prefetch", type=int, default=0, help="number of viewpoints staged ahead on a background thread")
+    parser.add_argument("--sync_interval", type=int, default=0,
+                        help="keep the training scalars on the device and fetch them every sync_interval iterations")
+    parser.add_argument("--cuda_launch_blocking", action="store_true", help="debug: synchronous CUDA kernel launches")
+    parser.add_argument("--profile", action="store_true", help="time the training phases, written to model_path/profile.jsonl")
+    parser.add_argument("--profile_interval", type=int, default=1000)
     args = parser.parse_args(sys.argv[1:])
     args.save_iterations.append(args.iterations)
     
@@ -324,7 +474,16 @@ if __name__ == "__main__":
     # Start GUI server, configure and run training
     network_gui.init(args.ip, args.port)
     torch.autograd.set_detect_anomaly(args.detect_anomaly)
-    training(lp.extract(args), op.extract(args), pp.extract(args), args.test_iterations, args.save_iterations, args.checkpoint_iterations, args.start_checkpoint, args.debug_from, args.depth_loss_choice)
+    saver = BackgroundSaver(args.save_queue_size) if args.async_save else None
+    try:
+        training(lp.extract(args), op.extract(args), pp.extract(args), args.test_iterations, args.save_iterations, args.checkpoint_iterations, args.start_checkpoint, args.debug_from, args.depth_loss_choice, saver, args.prefetch, args.sync_interval,
+                 args.profile_interval if args.profile else 0)
+    finally:
+        # 训练出错或中断时也写完已排队的点云和checkpoint
+        if saver is not None:
+            print("\nWaiting for background saves")
+            saver.close()
+            print("Background saving: {} jobs, training blocked {:.2f}s on a full queue".format(saver.num_jobs, saver.blocked_time))
 
     # All done
     print("\nTraining complete.")
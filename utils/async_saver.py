@@ -0,0 +1,97 @@
+#
+# Copyright (C) 2023, Inria
+# GRAPHDECO research group, https://team.inria.fr/graphdeco
+# All rights reserved.
+#
+# This software is free for non-commercial, research and evaluation use
+# under the terms of the LICENSE.md file.
+#
+# For inquiries contact  george.drettakis@inria.fr
+#
+
+import os
+import time
+import queue
+import threading
+import torch
+from utils.system_utils import atomic_output
+
+def snapshot(obj):
+    """
+    Copy every tensor of a (nested) tuple / list / dict to host memory, pinned when CUDA is available.
+    The device->host copies are asynchronous, BackgroundSaver waits for them on the worker thread.
+    """
+    if isinstance(obj, torch.Tensor):
+        host = torch.empty(obj.shape, dtype=obj.dtype, pin_memory=obj.is_cuda)
+        host.copy_(obj.detach(), non_blocking=obj.is_cuda)
+        return host
+    if isinstance(obj, dict):
+        return type(obj)((key, snapshot(value)) for key, value in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(snapshot(value) for value in obj)
+    return obj
+
+def save_torch_atomic(obj, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with atomic_output(path) as tmp_path:
+        torch.save(obj, tmp_path)
+
+class BackgroundSaver:
+    """
+    Run save jobs on a worker thread. At most max_pending jobs (with their host snapshots) are alive,
+    submit() blocks while that many are pending and the blocked time is accumulated in blocked_time.
+    The first exception of a job is raised again by the next submit() and by close().
+    """
+
+    def __init__(self, max_pending=2):
+        self.slots = threading.Semaphore(max_pending)
+        self.jobs = queue.Queue()
+        self.blocked_time = 0.0
+        self.num_jobs = 0
+        self.errors = []
+        self.worker = threading.Thread(target=self._run, daemon=True)
+        self.worker.start()
+
+    def submit(self, fn, *args):
+        """Snapshot args to host memory and call fn(*args) on the worker thread. Returns the time spent blocked."""
+        self.raise_error()
+        start = time.perf_counter()
+        self.slots.acquire()
+        blocked = time.perf_counter() - start
+        self.blocked_time += blocked
+
+        args = snapshot(args)
+        event = None
+        if torch.cuda.is_available():
+            event = torch.cuda.Event()
+            event.record()
+        self.num_jobs += 1
+        self.jobs.put((fn, args, event))
+        return blocked
+
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            fn, args, event = job
+            try:
+                if event is not None:
+                    event.synchronize()
+                fn(*args)
+            except Exception as e:
+                print("\n[Warning] background save failed: {}".format(e))
+                self.errors.append(e)
+            finally:
+                self.slots.release()
+
+    def close(self):
+        """Wait until every submitted job is written"""
+        self.jobs.put(None)
+        self.worker.join()
+        self.raise_error()
+
+    def raise_error(self):
+        # 后台保存失败时不能让训练正常结束, 否则会缺少点云或checkpoint
+        if self.errors:
+            raise self.errors[0]
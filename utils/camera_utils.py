@@ -9,19 +9,20 @@
 # For inquiries contact  george.drettakis@inria.fr
 #
 import torch
-from scene.cameras import Camera, MiniCam
+from scene.cameras import Camera, LazyCamera, MiniCam, CameraBank
+from scene.dataset_readers import openImage
 import numpy as np
-from utils.general_utils import PILtoTorch
+from utils.general_utils import ArrayToTorch
+from utils.image_utils import read_image_size
+from utils.image_store import open_image_store
 from utils.graphics_utils import getWorld2View2, getProjectionMatrix, fov2focal
 from tqdm import tqdm
 
 WARNED = False
 
-def loadCam(args, id, cam_info, resolution_scale):
-    orig_w, orig_h = cam_info.image.size
-
+def getResolution(args, orig_w, orig_h, resolution_scale):
     if args.resolution in [1, 2, 4, 8]:
-        resolution = round(orig_w/(resolution_scale * args.resolution)), round(orig_h/(resolution_scale * args.resolution))
+        return round(orig_w/(resolution_scale * args.resolution)), round(orig_h/(resolution_scale * args.resolution))
     else:  # should be a type that converts to float
         if args.resolution == -1:
             if orig_w > 1600:
@@ -37,13 +38,43 @@ def loadCam(args, id, cam_info, resolution_scale):
             global_down = orig_w / args.resolution
 
         scale = float(global_down) * float(resolution_scale)
-        resolution = (int(orig_w / scale), int(orig_h / scale))
-
-    resized_image_rgb = PILtoTorch(cam_info.image, resolution)
+        return (int(orig_w / scale), int(orig_h / scale))
+
+def imageSize(cam_info):
+    """
+    (width, height) of the image file of cam_info, the decoded image or, without one, the file header.
+    cam_info.width / height are the size of the intrinsics (colmap cameras.bin), which differ from the image
+    files with e.g. -i images_4, the training resolution has to come from the images as in loadCam
+    """
+    if cam_info.image is not None:
+        return cam_info.image.size
+    return read_image_size(cam_info.image_path)
+
+def loadImageTensors(image, depth, resolution, compact=False):
+    """
+    :param compact: keep the tensors in uint8 / uint16 / float16, see utils.general_utils.stored_to_float
+    :return: gt_image (3, H, W), alpha mask or None, gt_depth (1, H, W) or None
+    """
+    return imageTensorsFromArrays(image.resize(resolution), depth.resize(resolution) if depth is not None else None,
+                                  compact)
+
+def compactImages(args):
+    # uint8_images: 相机中的图像保存为uint8(深度uint16/float16/float32), 使用时再用stored_to_float转换
+    return args.uint8_images
+
+def loadImageArrays(job):
+    """job: (image_path, depth_path, white_background, resolution) -> resized uint8 image array, depth array or None"""
+    image_path, depth_path, white_background, resolution = job
+    image, depth = openImage(image_path, depth_path, white_background)
+    return np.array(image.resize(resolution)), np.array(depth.resize(resolution)) if depth is not None else None
+
+def imageTensorsFromArrays(image, depth, compact=False):
+    """Same as loadImageTensors for already resized (H, W[, C]) arrays or PIL images"""
+    resized_image_rgb = ArrayToTorch(image, compact)
     gt_image = resized_image_rgb[:3, ...]
 
-    if cam_info.depth is not None:
-        resized_image_depth = PILtoTorch(cam_info.depth, resolution)
+    if depth is not None:
+        resized_image_depth = ArrayToTorch(depth, compact)
         gt_depth = resized_image_depth[:1, ...]
     else:
         gt_depth = None
@@ -53,32 +84,50 @@ def loadCam(args, id, cam_info, resolution_scale):
     if resized_image_rgb.shape[1] == 4:
         loaded_mask = resized_image_rgb[3:4, ...]
 
+    return gt_image, loaded_mask, gt_depth
+
+def loadCam(args, id, cam_info, resolution_scale):
+    orig_w, orig_h = cam_info.image.size
+    resolution = getResolution(args, orig_w, orig_h, resolution_scale)
+    gt_image, loaded_mask, gt_depth = loadImageTensors(cam_info.image, cam_info.depth, resolution, compactImages(args))
+
     return Camera(colmap_id=cam_info.uid, R=cam_info.R, T=cam_info.T, 
                   FoVx=cam_info.FovX, FoVy=cam_info.FovY, 
                   image=gt_image, gt_alpha_mask=loaded_mask,
                   image_name=cam_info.image_name, uid=id, data_device=args.data_device, gt_depth=gt_depth)
 
-def loadCam_low_memory(args, cam_info, resolution_scale):
-    orig_w, orig_h = cam_info.image.size
+def loadCam_store(args, id, cam_info, resolution_scale, image_store):
+    """Camera built from the preprocessed arrays of an utils.image_store.ImageStore, nothing is decoded or resized"""
+    gt_image, loaded_mask, gt_depth = imageTensorsFromArrays(*image_store.get(cam_info.image_path), compactImages(args))
 
-    if args.resolution in [1, 2, 4, 8]:
-        width, height = round(orig_w/(resolution_scale * args.resolution)), round(orig_h/(resolution_scale * args.resolution))
-    else:  # should be a type that converts to float
-        if args.resolution == -1:
-            if orig_w > 1600:
-                global WARNED
-                if not WARNED:
-                    print("[ INFO ] Encountered quite large input images (>1.6K pixels width), rescaling to 1.6K.\n "
-                        "If this is not desired, please explicitly specify '--resolution/-r' as 1")
-                    WARNED = True
-                global_down = orig_w / 1600
-            else:
-                global_down = 1
-        else:
-            global_down = orig_w / args.resolution
+    return Camera(colmap_id=cam_info.uid, R=cam_info.R, T=cam_info.T,
+                  FoVx=cam_info.FovX, FoVy=cam_info.FovY,
+                  image=gt_image, gt_alpha_mask=loaded_mask,
+                  image_name=cam_info.image_name, uid=id, data_device=args.data_device, gt_depth=gt_depth)
 
-        scale = float(global_down) * float(resolution_scale)
-        width, height = (int(orig_w / scale), int(orig_h / scale))
+def camLoader(cam_info, resolution, compact, white_background=None, image_store=None):
+    """Callable producing the image tensors of cam_info for LazyCamera / CameraView"""
+    def loader():
+        if image_store is not None:
+            return imageTensorsFromArrays(*image_store.get(cam_info.image_path), compact)
+        image, depth = openImage(cam_info.image_path, cam_info.depth_path, white_background)
+        return loadImageTensors(image, depth, resolution, compact)
+    return loader
+
+def loadCam_lazy(args, id, cam_info, resolution_scale, image_cache, white_background=None, image_store=None):
+    """Camera decoding cam_info.image_path (and depth_path), or reading image_store, only when its image is used"""
+    resolution = getResolution(args, *imageSize(cam_info), resolution_scale)
+    loader = camLoader(cam_info, resolution, compactImages(args), white_background, image_store)
+
+    return LazyCamera(colmap_id=cam_info.uid, R=cam_info.R, T=cam_info.T,
+                      FoVx=cam_info.FovX, FoVy=cam_info.FovY, width=resolution[0], height=resolution[1],
+                      loader=loader, image_cache=image_cache,
+                      image_name=cam_info.image_name, image_path=cam_info.image_path, uid=id,
+                      data_device=args.data_device)
+
+def loadCam_low_memory(args, cam_info, resolution_scale):
+    # 读取时没有解码图像时, 尺寸来自图像文件头
+    width, height = getResolution(args, *imageSize(cam_info), resolution_scale)
     zfar = 100.0
     znear = 0.01
     world_view_transform = torch.tensor(getWorld2View2(cam_info.R, cam_info.T)).transpose(0, 1).cuda()
@@ -89,16 +138,67 @@ def loadCam_low_memory(args, cam_info, resolution_scale):
 
     return MiniCam(width, height, cam_info.FovY, cam_info.FovX, znear, zfar, world_view_transform, full_proj_transform)
 
-def cameraList_from_camInfos(cam_infos, resolution_scale, args, low_memory=False):
+def imageStore_from_camInfos(cam_infos, resolution_scale, args, cache_dir, white_background=None):
+    """Open (building it on the first run) the memmap store holding the resized images of cam_infos"""
+    jobs = {}
+    for c in cam_infos:
+        resolution = getResolution(args, *imageSize(c), resolution_scale)
+        jobs[c.image_path] = (c.image_path, c.depth_path, white_background, resolution)
+    return open_image_store(cache_dir, args.resolution, resolution_scale, jobs, loadImageArrays, args.data_workers)
+
+def cameraList_from_camInfos(cam_infos, resolution_scale, args, low_memory=False, image_cache=None, white_background=None,
+                             image_store=None):
+    """
+    :param image_cache: utils.image_cache.ImageCache, build LazyCameras decoding their images on access
+    :param white_background: background the lazy images are composited onto (blender RGBA images), None keeps them
+    :param image_store: utils.image_store.ImageStore, read the resized images from it instead of decoding them
+    """
+    if args.camera_bank and not low_memory:
+        return cameraBank_from_camInfos(cam_infos, resolution_scale, args, image_cache, white_background, image_store)
     camera_list = []
     for id, c in tqdm(enumerate(cam_infos), desc="load Cam"):
         if low_memory:
             camera_list.append(loadCam_low_memory(args, c, resolution_scale))
+        elif image_cache is not None:
+            camera_list.append(loadCam_lazy(args, id, c, resolution_scale, image_cache, white_background, image_store))
+        elif image_store is not None:
+            camera_list.append(loadCam_store(args, id, c, resolution_scale, image_store))
         else:
             camera_list.append(loadCam(args, id, c, resolution_scale))
 
     return camera_list
 
+def cameraBank_from_camInfos(cam_infos, resolution_scale, args, image_cache=None, white_background=None, image_store=None):
+    """Same cameras as cameraList_from_camInfos, as CameraViews of one CameraBank built in a single batched step"""
+    compact = compactImages(args)
+    resolutions, images, loaders = [], [], []
+    for c in tqdm(cam_infos, desc="load Cam"):
+        if image_cache is not None:
+            resolution = getResolution(args, *imageSize(c), resolution_scale)
+            loaders.append(camLoader(c, resolution, compact, white_background, image_store))
+            images.append((None, None))
+        else:
+            if image_store is not None:
+                gt_image, loaded_mask, gt_depth = imageTensorsFromArrays(*image_store.get(c.image_path), compact)
+            else:
+                resolution = getResolution(args, c.image.size[0], c.image.size[1], resolution_scale)
+                gt_image, loaded_mask, gt_depth = loadImageTensors(c.image, c.depth, resolution, compact)
+            image = Camera.prepare_image(gt_image, loaded_mask, args.data_device)
+            depth = gt_depth.to(args.data_device) if gt_depth is not None else None
+            resolution = (image.shape[2], image.shape[1])
+            loaders.append(None)
+            images.append((image, depth))
+        resolutions.append(resolution)
+
+    if not cam_infos:
+        return []
+    bank = CameraBank([c.R for c in cam_infos], [c.T for c in cam_infos],
+                      [c.FovX for c in cam_infos], [c.FovY for c in cam_infos],
+                      [r[0] for r in resolutions], [r[1] for r in resolutions])
+    return [bank.view(id, uid=id, colmap_id=c.uid, image_name=c.image_name, image_path=c.image_path,
+                      image=image, depth=depth, loader=loader, image_cache=image_cache, data_device=args.data_device)
+            for id, (c, (image, depth), loader) in enumerate(zip(cam_infos, images, loaders))]
+
 def camera_to_JSON(id, camera : Camera):
     Rt = np.zeros((4, 4))
     Rt[:3, :3] = camera.R.transpose()
@@ -0,0 +1,127 @@
+#
+# Copyright (C) 2023, Inria
+# GRAPHDECO research group, https://team.inria.fr/graphdeco
+# All rights reserved.
+#
+# This software is free for non-commercial, research and evaluation use
+# under the terms of the LICENSE.md file.
+#
+# For inquiries contact  george.drettakis@inria.fr
+#
+
+import os
+import json
+import numpy as np
+import torch
+from utils.ply_utils import write_ply_chunked, read_ply_vertex_table, split_gaussian_table
+
+# 分块场景目录下的文件: 按网格单元排序后的ply以及每个单元的索引
+CHUNK_BODY = "point_cloud.ply"
+CHUNK_INDEX = "chunks.json"
+CHUNK_VERSION = 1
+
+def grid_cells(xyz, cell_size=None, cells_per_axis=16):
+    """
+    Partition points into a regular grid.
+    :return: order (N,) sorting the points cell by cell, the cells as dicts with the row offset, count,
+             integer key and AABB of the points they hold, the grid origin and the cell size.
+    """
+    xyz = np.asarray(xyz, dtype=np.float32)
+    origin = xyz.min(axis=0)
+    if cell_size is None:
+        cell_size = max(float((xyz.max(axis=0) - origin).max()) / cells_per_axis, 1e-6)
+    keys = np.floor((xyz - origin) / cell_size).astype(np.int64)
+    dims = keys.max(axis=0) + 1
+    linear = (keys[:, 0] * dims[1] + keys[:, 1]) * dims[2] + keys[:, 2]
+
+    order = np.argsort(linear, kind="stable")
+    linear_sorted = linear[order]
+    starts = np.flatnonzero(np.r_[True, linear_sorted[1:] != linear_sorted[:-1]])
+    counts = np.diff(np.r_[starts, linear_sorted.shape[0]])
+    xyz_sorted = xyz[order]
+    aabb_min = np.minimum.reduceat(xyz_sorted, starts, axis=0)
+    aabb_max = np.maximum.reduceat(xyz_sorted, starts, axis=0)
+
+    cells = [{"key": keys[order[start]].tolist(),
+              "offset": int(start),
+              "count": int(count),
+              "aabb_min": lo.tolist(),
+              "aabb_max": hi.tolist()} for start, count, lo, hi in zip(starts, counts, aabb_min, aabb_max)]
+    return order, cells, origin, cell_size
+
+def write_chunked_gaussians(path, attribute_names, columns, xyz, cell_size=None, cells_per_axis=16):
+    """
+    Store Gaussians as a directory: one PLY whose rows are grouped by grid cell, plus a json index
+    with the offset, count and AABB of every cell. The PLY itself stays readable by load_gaussian_ply.
+    :param columns: same as utils.ply_utils.write_ply_chunked
+    :param xyz: (N, 3) positions used for the partition
+    """
+    xyz_np = xyz.detach().cpu().numpy() if isinstance(xyz, torch.Tensor) else np.asarray(xyz)
+    if xyz_np.shape[0] == 0:
+        order, cells, origin, cell_size = np.zeros(0, dtype=np.int64), [], np.zeros(3), cell_size or 1.0
+    else:
+        order, cells, origin, cell_size = grid_cells(xyz_np, cell_size, cells_per_axis)
+
+    index = order
+    if isinstance(xyz, torch.Tensor):
+        index = torch.from_numpy(order).to(xyz.device)
+    write_ply_chunked(os.path.join(path, CHUNK_BODY), attribute_names, columns, index=index)
+    with open(os.path.join(path, CHUNK_INDEX), 'w') as file:
+        json.dump({"version": CHUNK_VERSION,
+                   "num_gaussians": int(xyz_np.shape[0]),
+                   "origin": np.asarray(origin).tolist(),
+                   "cell_size": float(cell_size),
+                   "cells": cells}, file)
+
+def read_chunk_index(path):
+    with open(os.path.join(path, CHUNK_INDEX)) as file:
+        index = json.load(file)
+    assert index["version"] == CHUNK_VERSION, "unknown chunked scene version"
+    return index
+
+def cells_in_aabb(cells, aabb):
+    """aabb: (2, 3) array-like, [min corner, max corner]"""
+    aabb = np.asarray(aabb, dtype=np.float64)
+    return [cell for cell in cells
+            if np.all(np.asarray(cell["aabb_max"]) >= aabb[0]) and np.all(np.asarray(cell["aabb_min"]) <= aabb[1])]
+
+def cells_in_frustum(cells, full_proj_transform):
+    """
+    Keep the cells whose AABB is not entirely outside one of the frustum planes.
+    full_proj_transform follows Camera.full_proj_transform: clip = [x, y, z, 1] @ full_proj_transform
+    """
+    if not cells:
+        return []
+    if isinstance(full_proj_transform, torch.Tensor):
+        full_proj_transform = full_proj_transform.detach().cpu().numpy()
+    lo = np.asarray([cell["aabb_min"] for cell in cells])
+    hi = np.asarray([cell["aabb_max"] for cell in cells])
+    # 每个单元的8个角点
+    select = np.array([[(i >> axis) & 1 for axis in range(3)] for i in range(8)], dtype=bool)
+    corners = np.where(select[None], hi[:, None, :], lo[:, None, :])
+    corners = np.concatenate([corners, np.ones(corners.shape[:2] + (1,))], axis=-1)
+    clip = corners @ np.asarray(full_proj_transform, dtype=np.float64)
+    x, y, z, w = clip[..., 0], clip[..., 1], clip[..., 2], clip[..., 3]
+    outside = np.stack([x < -w, x > w, y < -w, y > w, z < 0, z > w], axis=-1).all(axis=1).any(axis=-1)
+    return [cell for cell, out in zip(cells, outside) if not out]
+
+def load_chunked_table(path, aabb=None, full_proj_transform=None):
+    """
+    Read only the cells intersecting aabb and/or the frustum of full_proj_transform (all cells when both are None).
+    :return: (M, K) float32 table and the K attribute names
+    """
+    cells = read_chunk_index(path)["cells"]
+    if aabb is not None:
+        cells = cells_in_aabb(cells, aabb)
+    if full_proj_transform is not None:
+        cells = cells_in_frustum(cells, full_proj_transform)
+    table, names = read_ply_vertex_table(os.path.join(path, CHUNK_BODY))
+    if not cells:
+        return np.zeros((0, len(names)), dtype=np.float32), names
+    rows = [table[cell["offset"]:cell["offset"] + cell["count"]] for cell in sorted(cells, key=lambda c: c["offset"])]
+    return np.concatenate(rows, axis=0), names
+
+def load_gaussian_region(path, max_sh_degree, aabb=None, full_proj_transform=None):
+    """Same outputs as utils.ply_utils.load_gaussian_ply, restricted to the selected cells"""
+    table, names = load_chunked_table(path, aabb, full_proj_transform)
+    return split_gaussian_table(table, names, max_sh_degree)
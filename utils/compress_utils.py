@@ -0,0 +1,131 @@
+#
+# Copyright (C) 2023, Inria
+# GRAPHDECO research group, https://team.inria.fr/graphdeco
+# All rights reserved.
+#
+# This software is free for non-commercial, research and evaluation use
+# under the terms of the LICENSE.md file.
+#
+# For inquiries contact  george.drettakis@inria.fr
+#
+
+import json
+import numpy as np
+import torch
+
+COMPRESSED_VERSION = 1
+
+def kmeans_codebook(data, num_codes, iterations=10, fit_samples=262144, chunk_size=16384, seed=0):
+    """
+    Vector-quantize the rows of data (N, D) with k-means.
+    The codebook is fitted on at most fit_samples rows, then every row is assigned to its nearest code.
+    :return: codebook (K, D), indices (N,) int64, on the device of data
+    """
+    num_rows = data.shape[0]
+    num_codes = min(num_codes, num_rows)
+    generator = torch.Generator(device="cpu").manual_seed(seed)
+
+    def assign(points, codebook):
+        indices = torch.empty(points.shape[0], dtype=torch.long, device=points.device)
+        for start in range(0, points.shape[0], chunk_size):
+            indices[start:start + chunk_size] = torch.cdist(points[start:start + chunk_size], codebook).argmin(dim=1)
+        return indices
+
+    fit = data
+    if num_rows > fit_samples:
+        fit = data[torch.randperm(num_rows, generator=generator)[:fit_samples].to(data.device)]
+    codebook = fit[torch.randperm(fit.shape[0], generator=generator)[:num_codes].to(data.device)].clone()
+
+    for _ in range(iterations):
+        indices = assign(fit, codebook)
+        sums = torch.zeros_like(codebook).index_add_(0, indices, fit)
+        counts = torch.bincount(indices, minlength=num_codes)
+        # 空的类保持原来的中心
+        used = counts > 0
+        codebook[used] = sums[used] / counts[used].unsqueeze(1).to(sums.dtype)
+
+    return codebook, assign(data, codebook)
+
+def save_compressed_gaussians(path, xyz, features_dc, features_extra, opacities, scales, rots,
+                              codebook_size=4096, kmeans_iterations=10, device="cpu"):
+    """
+    Write Gaussians (in the layout returned by utils.ply_utils.load_gaussian_ply) to a compact .npz:
+    16-bit positions quantized on the bounding box, float16 scales / rotations / dc colors,
+    8-bit activated opacity and a k-means codebook for the SH rest coefficients.
+    The quantization parameters are kept in a json header inside the archive.
+    """
+    num = xyz.shape[0]
+    xyz = np.asarray(xyz, dtype=np.float32)
+    xyz_min = xyz.min(axis=0) if num else np.zeros(3, dtype=np.float32)
+    xyz_max = xyz.max(axis=0) if num else np.ones(3, dtype=np.float32)
+    xyz_range = np.maximum(xyz_max - xyz_min, 1e-12)
+    xyz_q = np.round((xyz - xyz_min) / xyz_range * 65535.0).astype(np.uint16)
+
+    opacity = 1.0 / (1.0 + np.exp(-np.asarray(opacities, dtype=np.float32)))
+    opacity_q = np.round(opacity * 255.0).astype(np.uint8)
+
+    rots = np.asarray(rots, dtype=np.float32)
+    rots = rots / np.maximum(np.linalg.norm(rots, axis=1, keepdims=True), 1e-12)
+
+    features_extra = np.asarray(features_extra, dtype=np.float32)
+    rest = features_extra.reshape(num, -1)
+    if num and rest.shape[1]:
+        codebook, indices = kmeans_codebook(torch.from_numpy(rest).to(device), codebook_size,
+                                            iterations=kmeans_iterations)
+        codebook = codebook.cpu().numpy()
+        indices = indices.cpu().numpy()
+    else:
+        codebook = np.zeros((0, rest.shape[1]), dtype=np.float32)
+        indices = np.zeros(num, dtype=np.int64)
+    index_dtype = np.uint8 if codebook.shape[0] <= 256 else np.uint16 if codebook.shape[0] <= 65536 else np.uint32
+
+    header = {
+        "version": COMPRESSED_VERSION,
+        "num_gaussians": int(num),
+        "xyz_min": xyz_min.tolist(),
+        "xyz_max": xyz_max.tolist(),
+        "xyz_bits": 16,
+        "opacity": "sigmoid_uint8",
+        "features_extra_shape": list(features_extra.shape[1:]),
+        "codebook_size": int(codebook.shape[0]),
+    }
+    np.savez(path,
+             header=np.frombuffer(json.dumps(header).encode("utf-8"), dtype=np.uint8),
+             xyz=xyz_q,
+             features_dc=np.asarray(features_dc, dtype=np.float16),
+             opacity=opacity_q,
+             scales=np.asarray(scales, dtype=np.float16),
+             rots=rots.astype(np.float16),
+             codebook=codebook.astype(np.float16),
+             indices=indices.astype(index_dtype))
+
+def load_compressed_gaussians(path):
+    """
+    Decode a file written by save_compressed_gaussians.
+    :return: xyz, features_dc, features_extra, opacities, scales, rots as float32, like load_gaussian_ply.
+    """
+    with np.load(path) as data:
+        header = json.loads(data["header"].tobytes().decode("utf-8"))
+        assert header["version"] == COMPRESSED_VERSION, "unknown compressed gaussian version"
+        num = header["num_gaussians"]
+
+        xyz_min = np.asarray(header["xyz_min"], dtype=np.float32)
+        xyz_max = np.asarray(header["xyz_max"], dtype=np.float32)
+        xyz = data["xyz"].astype(np.float32) / 65535.0 * np.maximum(xyz_max - xyz_min, 1e-12) + xyz_min
+
+        opacity = np.clip(data["opacity"].astype(np.float32) / 255.0, 1e-6, 1.0 - 1e-6)
+        opacities = np.log(opacity / (1.0 - opacity))
+
+        codebook = data["codebook"].astype(np.float32)
+        extra_shape = [num] + header["features_extra_shape"]
+        if codebook.shape[0]:
+            features_extra = codebook[data["indices"].astype(np.int64)].reshape(extra_shape)
+        else:
+            features_extra = np.zeros(extra_shape, dtype=np.float32)
+
+        return (xyz.astype(np.float32),
+                data["features_dc"].astype(np.float32),
+                features_extra,
+                opacities.astype(np.float32),
+                data["scales"].astype(np.float32),
+                data["rots"].astype(np.float32))
@@ -20,12 +20,45 @@ def inverse_sigmoid(x):
 
 def PILtoTorch(pil_image, resolution):
     resized_image_PIL = pil_image.resize(resolution)
-    resized_image = torch.from_numpy(np.array(resized_image_PIL)) / 255.0
+    return ArrayToTorch(resized_image_PIL)
+
+def ArrayToTorch(array, compact=False):
+    """
+    (H, W[, C]) image array (or PIL image) -> (C, H, W) tensor divided by 255
+    :param compact: keep the pixel values in uint8 / uint16 (float16, float32 for large values) without dividing,
+                    stored_to_float gives the same float tensor later
+    """
+    if compact:
+        resized_image = torch.from_numpy(compact_array(np.array(array)))
+    else:
+        resized_image = torch.from_numpy(np.array(array)) / 255.0
     if len(resized_image.shape) == 3:
         return resized_image.permute(2, 0, 1)
     else:
         return resized_image.unsqueeze(dim=-1).permute(2, 0, 1)
 
+# compact_array保存为float16的最大绝对值, 在此范围内float16的间隔不超过1
+FLOAT16_MAX_VALUE = 2048
+
+def compact_array(array):
+    if array.dtype == np.uint8:
+        return array
+    if array.dtype == np.bool_:
+        return array.astype(np.uint8)
+    if np.issubdtype(array.dtype, np.integer) and (array.size == 0 or (array.min() >= 0 and array.max() <= 65535)):
+        return array.astype(np.uint16)
+    # float16超过65504溢出为inf, 大于2048后连整数都不能精确表示, 取值范围更大时保存为float32
+    if array.size == 0 or np.nanmax(np.abs(array)) <= FLOAT16_MAX_VALUE:
+        return array.astype(np.float16)
+    # float32直接保存除以255后的值, stored_to_float原样返回
+    return array.astype(np.float32) / np.float32(255.0)
+
+def stored_to_float(image):
+    """float32 image / depth of a camera, converting the compact (uint8, uint16, float16 / float32) storage"""
+    if image is None or image.dtype == torch.float32:
+        return image
+    return image.float() / 255.0
+
 def get_expon_lr_func(
     lr_init, lr_final, lr_delay_steps=0, lr_delay_mult=1.0, max_steps=1000000
 ):
@@ -48,6 +48,43 @@ def getWorld2View2(R, t, translate=np.array([.0, .0, .0]), scale=1.0):
     Rt = np.linalg.inv(C2W)
     return np.float32(Rt)
 
+def getWorld2View2Batch(R, t, translate=np.array([.0, .0, .0]), scale=1.0):
+    """getWorld2View2 for (N, 3, 3) rotations and (N, 3) translations, returns (N, 4, 4) float32"""
+    Rt = np.zeros((R.shape[0], 4, 4))
+    Rt[:, :3, :3] = R.transpose(0, 2, 1)
+    Rt[:, :3, 3] = t
+    Rt[:, 3, 3] = 1.0
+
+    C2W = np.linalg.inv(Rt)
+    cam_center = C2W[:, :3, 3]
+    cam_center = (cam_center + translate) * scale
+    C2W[:, :3, 3] = cam_center
+    Rt = np.linalg.inv(C2W)
+    return np.float32(Rt)
+
+def getProjectionMatrixBatch(znear, zfar, fovX, fovY):
+    """getProjectionMatrix for (N,) field of views, returns a (N, 4, 4) tensor"""
+    tanHalfFovY = np.tan(np.asarray(fovY, dtype=np.float64) / 2)
+    tanHalfFovX = np.tan(np.asarray(fovX, dtype=np.float64) / 2)
+
+    top = tanHalfFovY * znear
+    bottom = -top
+    right = tanHalfFovX * znear
+    left = -right
+
+    P = np.zeros((tanHalfFovX.shape[0], 4, 4))
+
+    z_sign = 1.0
+
+    P[:, 0, 0] = 2.0 * znear / (right - left)
+    P[:, 1, 1] = 2.0 * znear / (top - bottom)
+    P[:, 0, 2] = (right + left) / (right - left)
+    P[:, 1, 2] = (top + bottom) / (top - bottom)
+    P[:, 3, 2] = z_sign
+    P[:, 2, 2] = z_sign * zfar / (zfar - znear)
+    P[:, 2, 3] = -(zfar * znear) / (zfar - znear)
+    return torch.from_numpy(np.float32(P))
+
 def getProjectionMatrix(znear, zfar, fovX, fovY):
     """
     fovX: x方向视场角，单位弧度
@@ -0,0 +1,71 @@
+#
+# Copyright (C) 2023, Inria
+# GRAPHDECO research group, https://team.inria.fr/graphdeco
+# All rights reserved.
+#
+# This software is free for non-commercial, research and evaluation use
+# under the terms of the LICENSE.md file.
+#
+# For inquiries contact  george.drettakis@inria.fr
+#
+
+import threading
+from collections import OrderedDict
+import torch
+
+def tensor_bytes(value):
+    if isinstance(value, torch.Tensor):
+        return value.element_size() * value.nelement()
+    if isinstance(value, (list, tuple)):
+        return sum(tensor_bytes(v) for v in value)
+    return 0
+
+class ImageCache:
+    """
+    LRU cache of decoded camera images bounded by the total tensor bytes it holds.
+    The most recently inserted entry is always kept, even when it alone exceeds max_bytes.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.sizes = {}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, load):
+        """Return the cached value of key, calling load() on a miss"""
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+
+        value = load()
+        with self.lock:
+            if key not in self.entries:
+                self.entries[key] = value
+                self.sizes[key] = tensor_bytes(value)
+                self.bytes += self.sizes[key]
+                self._evict()
+        return value
+
+    def _evict(self):
+        while self.bytes > self.max_bytes and len(self.entries) > 1:
+            key, _ = self.entries.popitem(last=False)
+            self.bytes -= self.sizes.pop(key)
+            self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.sizes.clear()
+            self.bytes = 0
+
+    def stats(self):
+        return {"entries": len(self.entries), "bytes": self.bytes, "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
@@ -0,0 +1,146 @@
+#
+# Copyright (C) 2023, Inria
+# GRAPHDECO research group, https://team.inria.fr/graphdeco
+# All rights reserved.
+#
+# This software is free for non-commercial, research and evaluation use
+# under the terms of the LICENSE.md file.
+#
+# For inquiries contact  george.drettakis@inria.fr
+#
+
+import os
+import json
+import time
+import uuid
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from utils.system_utils import atomic_output
+
+# 预处理(解码+缩放)之后的训练图像, 每个分辨率一个连续的字节文件, 用memmap读取, 多个训练进程共享页缓存
+STORE_VERSION = 2
+STORE_ALIGN = 64
+STORE_BUILD_CHUNK = 64
+# 数据文件开头STORE_ALIGN字节保存本次构建的id, 与索引中的id一致时两个文件才属于同一次构建
+STORE_BUILD_ID_BYTES = 32
+
+def jobs_key(jobs):
+    """Hash of the job set (paths, background, target sizes), without the file fingerprints"""
+    content = json.dumps(sorted([list(job[:3]) + [list(job[3])] for job in jobs.values()], key=repr))
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()[:16]
+
+def store_paths(cache_dir, resolution, resolution_scale, jobs):
+    # 不同的图像目录 / 背景 / 深度各自一个store, 同一数据集上的多个训练任务不会互相重建
+    name = "images_r{}_s{}_{}".format(resolution, resolution_scale, jobs_key(jobs))
+    return os.path.join(cache_dir, name + ".bin"), os.path.join(cache_dir, name + ".json")
+
+def file_fingerprint(path):
+    if path is None or not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+def job_fingerprint(job):
+    """job: (image_path, depth_path, white_background, resolution)"""
+    image_path, depth_path, white_background, resolution = job
+    return [file_fingerprint(image_path), file_fingerprint(depth_path), white_background, list(resolution)]
+
+class ImageStore:
+    """
+    Read-only view of a store file, get() returns numpy views into the memmap.
+    valid is False when the data file was written by another build than index (replaced in between).
+    """
+
+    def __init__(self, data_path, index):
+        self.entries = index["entries"]
+        self.data = np.memmap(data_path, dtype=np.uint8, mode="r")
+        build = self.data[:STORE_BUILD_ID_BYTES].tobytes().decode("ascii", errors="replace")
+        self.valid = build == index["build"]
+
+    def _array(self, record):
+        if record is None:
+            return None
+        offset, dtype, shape = record
+        count = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        return self.data[offset:offset + count].view(dtype).reshape(shape)
+
+    def get(self, image_path):
+        """:return: (image array (H, W[, C]), depth array or None)"""
+        entry = self.entries[image_path]
+        return self._array(entry["image"]), self._array(entry["depth"])
+
+def read_store_index(index_path):
+    try:
+        with open(index_path) as file:
+            index = json.load(file)
+    except (OSError, ValueError):
+        return None
+    return index if index.get("version") == STORE_VERSION and "build" in index else None
+
+def build_image_store(data_path, index_path, jobs, load_arrays, data_workers=8):
+    """
+    Decode and resize every job with load_arrays(job) -> (image array, depth array or None) and write the arrays
+    one after another, aligned to STORE_ALIGN bytes, after a header holding the id of this build.
+    """
+    start = time.perf_counter()
+    entries = {}
+    build = uuid.uuid4().hex
+    offset = STORE_ALIGN
+    keys = list(jobs.keys())
+    with atomic_output(data_path) as tmp_path, open(tmp_path, "wb") as fid, \
+            ThreadPoolExecutor(max_workers=max(data_workers, 1)) as pool:
+        fid.write(build.encode("ascii").ljust(STORE_ALIGN, b"\x00"))
+
+        def write(array):
+            nonlocal offset
+            if array is None:
+                return None
+            array = np.ascontiguousarray(array)
+            record = [offset, array.dtype.str, list(array.shape)]
+            fid.write(array.tobytes())
+            offset += array.nbytes
+            padding = -offset % STORE_ALIGN
+            fid.write(b"\x00" * padding)
+            offset += padding
+            return record
+
+        # 分块解码, 限制同时在内存中的图像数量
+        for chunk_start in range(0, len(keys), STORE_BUILD_CHUNK):
+            chunk = keys[chunk_start:chunk_start + STORE_BUILD_CHUNK]
+            for key, (image, depth) in zip(chunk, pool.map(lambda key: load_arrays(jobs[key]), chunk)):
+                image_record = write(image)
+                depth_record = write(depth)
+                entries[key] = {"image": image_record, "depth": depth_record, "end": offset,
+                                "fingerprint": job_fingerprint(jobs[key])}
+
+    index = {"version": STORE_VERSION, "build": build, "entries": entries}
+    with atomic_output(index_path) as tmp_path, open(tmp_path, "w") as file:
+        json.dump(index, file)
+    elapsed = time.perf_counter() - start
+    print("Wrote image store {} ({} images, {:.1f} MB) in {:.2f}s".format(
+        data_path, len(keys), offset / 2 ** 20, elapsed))
+    return index
+
+def open_image_store(cache_dir, resolution, resolution_scale, jobs, load_arrays, data_workers=8):
+    """
+    Open the store of this resolution, (re)building it when an image is missing or its file,
+    depth file, background or target size changed.
+    :param jobs: {image_path: (image_path, depth_path, white_background, (width, height))}
+    """
+    data_path, index_path = store_paths(cache_dir, resolution, resolution_scale, jobs)
+    index = read_store_index(index_path) if os.path.exists(data_path) else None
+    if index is not None:
+        entries = index["entries"]
+        if all(key in entries and entries[key]["fingerprint"] == job_fingerprint(job) for key, job in jobs.items()):
+            store = ImageStore(data_path, index)
+            if store.valid:
+                print("Using image store {}".format(data_path))
+                return store
+    os.makedirs(cache_dir, exist_ok=True)
+    index = build_image_store(data_path, index_path, jobs, load_arrays, data_workers)
+    # 另一个进程可能在写入之后又替换了数据文件, id不一致时重新打开, 读取那次构建的索引
+    store = ImageStore(data_path, index)
+    if not store.valid:
+        return open_image_store(cache_dir, resolution, resolution_scale, jobs, load_arrays, data_workers)
+    return store
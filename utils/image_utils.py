@@ -9,7 +9,9 @@
 # For inquiries contact  george.drettakis@inria.fr
 #
 
+import struct
 import torch
+from PIL import Image
 
 def mse(img1, img2):
     return (((img1 - img2)) ** 2).view(img1.shape[0], -1).mean(1, keepdim=True)
@@ -17,3 +19,34 @@ def mse(img1, img2):
 def psnr(img1, img2):
     mse = (((img1 - img2)) ** 2).view(img1.shape[0], -1).mean(1, keepdim=True)
     return 20 * torch.log10(1.0 / torch.sqrt(mse))
+
+def read_image_size(path):
+    """
+    (width, height) of a PNG / JPEG read from the file header only, in the spirit of
+    SIBR_viewers/.../converters/get_image_size.py. Other formats fall back to PIL, which also stops after the header.
+    """
+    with open(path, "rb") as file:
+        data = file.read(26)
+        if len(data) >= 24 and data.startswith(b"\211PNG\r\n\032\n") and data[12:16] == b"IHDR":
+            return struct.unpack(">LL", data[16:24])
+        if data.startswith(b"\377\330"):
+            # 跳过各个段, 直到SOF0-SOF15中的尺寸(C4 DHT, C8 JPG, CC DAC不是SOF)
+            file.seek(2)
+            while True:
+                marker = file.read(2)
+                if len(marker) < 2 or marker[0] != 0xFF:
+                    break
+                if marker[1] == 0xFF:
+                    file.seek(-1, 1)
+                    continue
+                if 0xD0 <= marker[1] <= 0xD9 or marker[1] == 0x01:
+                    continue
+                length = file.read(2)
+                if len(length) < 2:
+                    break
+                if 0xC0 <= marker[1] <= 0xCF and marker[1] not in (0xC4, 0xC8, 0xCC):
+                    height, width = struct.unpack(">xHH", file.read(5))
+                    return width, height
+                file.seek(struct.unpack(">H", length)[0] - 2, 1)
+    with Image.open(path) as image:
+        return image.size
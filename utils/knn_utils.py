@@ -0,0 +1,185 @@
+#
+# Copyright (C) 2023, Inria
+# GRAPHDECO research group, https://team.inria.fr/graphdeco
+# All rights reserved.
+#
+# This software is free for non-commercial, research and evaluation use
+# under the terms of the LICENSE.md file.
+#
+# For inquiries contact  george.drettakis@inria.fr
+#
+
+import numpy as np
+import torch
+from utils.point_utils import point_columns, sort_keys
+
+try:
+    from simple_knn._C import distCUDA2
+except ImportError:
+    distCUDA2 = None
+
+KNN_BACKENDS = ["auto", "cuda", "cpu"]
+# 每个块最多处理的候选点对数, 限制内存
+KNN_CHUNK_PAIRS = 1 << 22
+# 第一层网格每个被占据单元的平均点数
+KNN_POINTS_PER_CELL = 2
+
+# 3x3x3邻域的偏移
+NEIGHBOR_OFFSETS = np.array([[x, y, z] for x in (-1, 0, 1) for y in (-1, 0, 1) for z in (-1, 0, 1)], dtype=np.int64)
+
+def grid_cell_size(columns, points_per_cell=KNN_POINTS_PER_CELL, iterations=4):
+    """Cell size with about points_per_cell points per occupied cell, refined from the bounding box estimate"""
+    num_points = columns.shape[1]
+    extent = max(max(float(column.max() - column.min()) for column in columns), 1e-12)
+    target = max(num_points / points_per_cell, 1.0)
+    cell_size = extent / max(target ** (1 / 3), 1.0)
+    for _ in range(iterations):
+        keys = np.sort(grid_coords_keys(grid_coords(columns, cell_size))[0])
+        occupied = int(np.count_nonzero(keys[1:] != keys[:-1])) + 1
+        if occupied <= 1.5 * target and occupied >= target / 1.5:
+            break
+        # 按表面(2维)的密度缩放
+        cell_size *= float(np.clip((occupied / target) ** 0.5, 0.125, 8.0))
+    return cell_size
+
+def grid_coords(columns, cell_size):
+    """(3, N) coordinates -> (3, N) int64 cell coordinates, non negative"""
+    return np.stack([((column - column.min()) / cell_size).astype(np.int64) for column in columns])
+
+def grid_coords_keys(coords, dims=None):
+    if dims is None:
+        dims = coords.max(axis=1) + 1
+    return (coords[0] * dims[1] + coords[1]) * dims[2] + coords[2], dims
+
+def knn_level(columns, queries, cell_size, k):
+    """
+    One grid level: the k nearest squared distances of the queries among the points of the 27 neighboring cells.
+    A result is exact when its k-th distance is within cell_size, every closer point lies in these cells.
+    :return: (Q, k) ascending squared distances, inf when there are fewer than k candidates
+    """
+    num_points = columns.shape[1]
+    coords = grid_coords(columns, cell_size)
+    # 四周留一格, 邻居单元的坐标不会为负
+    coords += 1
+    keys, dims = grid_coords_keys(coords, coords.max(axis=1) + 2)
+    order, sorted_keys = sort_keys(keys, dims.tolist())
+    starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+    cell_keys = sorted_keys[starts]
+    cell_counts = np.diff(np.r_[starts, num_points])
+    del keys, sorted_keys
+
+    # 按网格顺序处理查询点, 相邻查询点的候选数相近
+    query_coords = coords[:, queries]
+    query_keys = grid_coords_keys(query_coords, dims)[0]
+    query_order = np.argsort(query_keys, kind="stable")
+    queries, query_coords = queries[query_order], query_coords[:, query_order]
+
+    nearest_dist2 = np.full((queries.shape[0], k), np.inf)
+    offsets = (NEIGHBOR_OFFSETS[:, 0] * dims[1] + NEIGHBOR_OFFSETS[:, 1]) * dims[2] + NEIGHBOR_OFFSETS[:, 2]
+
+    begin = 0
+    probe = max(KNN_CHUNK_PAIRS // 64, 1)
+    while begin < queries.shape[0]:
+        # 先计算probe个查询点的候选数, 再决定块大小
+        end = min(begin + probe, queries.shape[0])
+        neighbor_keys = grid_coords_keys(query_coords[:, begin:end], dims)[0][:, None] + offsets[None, :]
+        cells = np.minimum(np.searchsorted(cell_keys, neighbor_keys), cell_keys.shape[0] - 1)
+        counts = np.where(cell_keys[cells] == neighbor_keys, cell_counts[cells], 0)
+        totals = counts.sum(axis=1)
+        # 候选点对数和补齐后的矩阵都不超过KNN_CHUNK_PAIRS
+        pairs = np.cumsum(totals)
+        padded = np.maximum.accumulate(totals) * np.arange(1, totals.shape[0] + 1)
+        size = max(int(np.count_nonzero((pairs <= KNN_CHUNK_PAIRS) & (padded <= KNN_CHUNK_PAIRS))), 1)
+        end = begin + size
+        probe = min(2 * size, max(KNN_CHUNK_PAIRS // 64, 1))
+        counts, cells, totals = counts[:size].ravel(), cells[:size].ravel(), totals[:size]
+        chunk = queries[begin:end]
+
+        # 展开每个查询点的候选点
+        num_pairs = int(totals.sum())
+        first = np.repeat(starts[cells] - (np.cumsum(counts) - counts), counts)
+        candidates = order[first + np.arange(num_pairs)]
+        owner = np.repeat(np.arange(size), totals)
+        dist2 = np.zeros(num_pairs)
+        for column in columns:
+            dist2 += (column[candidates].astype(np.float64) - column[chunk[owner]]) ** 2
+        # 不包括查询点自身
+        dist2[candidates == chunk[owner]] = np.inf
+
+        table = np.full((size, max(int(totals.max()), k)), np.inf)
+        table[owner, np.arange(num_pairs) - np.repeat(np.cumsum(totals) - totals, totals)] = dist2
+        nearest = np.partition(table, k - 1, axis=1)[:, :k] if table.shape[1] > k else table
+        nearest_dist2[begin:end] = np.sort(nearest, axis=1)
+        begin = end
+
+    inverse = np.empty_like(query_order)
+    inverse[query_order] = np.arange(query_order.shape[0])
+    return nearest_dist2[inverse]
+
+def knn_dist2_cpu(points, k=3, max_distance=None):
+    """
+    Squared distances of every point to its k nearest neighbors, the point itself excluded
+    (duplicates count as distance 0).
+    Grid hash: the points are bucketed in cells, each point looks at the 27 cells around its own, and the points
+    whose k-th neighbor is farther than a cell are searched again on a grid with twice the cell size.
+    :param points: (N, 3) array
+    :param k: number of neighbors, at most N - 1 are returned
+    :param max_distance: stop searching past this distance, the neighbors farther than it are inf
+    :return: (N, min(k, N - 1)) float64 array, ascending
+    """
+    points = np.asarray(points, dtype=np.float32)
+    num_points = points.shape[0]
+    k = max(min(k, num_points - 1), 0)
+    result = np.full((num_points, k), np.inf)
+    if k == 0:
+        return result
+    columns = point_columns(points)
+    extent = max(max(float(column.max() - column.min()) for column in columns), 1e-12)
+    cell_size = grid_cell_size(columns)
+    if max_distance is not None:
+        cell_size = min(cell_size, max_distance)
+    queries = np.arange(num_points)
+    while queries.shape[0] > 0:
+        nearest_dist2 = knn_level(columns, queries, cell_size, k)
+        # 单元覆盖了整个包围盒时所有点都是候选点
+        done = (nearest_dist2[:, -1] <= cell_size ** 2) | (cell_size > extent)
+        if max_distance is not None and cell_size >= max_distance:
+            nearest_dist2[nearest_dist2 > max_distance ** 2] = np.inf
+            done[:] = True
+        result[queries[done]] = nearest_dist2[done]
+        queries = queries[~done]
+        cell_size *= 2
+    return result
+
+def knn_mean_dist2_cpu(points, k=3):
+    """
+    Same as simple_knn's distCUDA2 on the CPU: mean squared distance of every point to its k nearest neighbors,
+    see knn_dist2_cpu.
+    :param points: (N, 3) array
+    :return: (N,) float32 array
+    """
+    num_points = np.asarray(points).shape[0]
+    if num_points < 2:
+        return np.zeros(num_points, dtype=np.float32)
+    return knn_dist2_cpu(points, k).mean(axis=1).astype(np.float32)
+
+def knn_backend_available(backend):
+    if backend == "cuda":
+        return distCUDA2 is not None and torch.cuda.is_available()
+    return backend == "cpu"
+
+def mean_knn_dist2(points, backend="auto"):
+    """
+    Mean squared distance to the 3 nearest neighbors used for the initial scales.
+    :param points: (N, 3) float tensor
+    :param backend: cuda (simple_knn), cpu (knn_mean_dist2_cpu) or auto, cuda when the extension is available
+    :return: (N,) tensor on the device of points
+    """
+    assert backend in KNN_BACKENDS, "unknown knn backend {}".format(backend)
+    if backend == "auto":
+        backend = "cuda" if knn_backend_available("cuda") else "cpu"
+    if backend == "cuda":
+        assert distCUDA2 is not None, "simple_knn is not installed, use the cpu knn backend"
+        return distCUDA2(points.float().cuda())
+    dist2 = knn_mean_dist2_cpu(points.detach().cpu().numpy())
+    return torch.from_numpy(dist2).to(points.device)
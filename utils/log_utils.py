@@ -0,0 +1,89 @@
+#
+# Copyright (C) 2023, Inria
+# GRAPHDECO research group, https://team.inria.fr/graphdeco
+# All rights reserved.
+#
+# This software is free for non-commercial, research and evaluation use
+# under the terms of the LICENSE.md file.
+#
+# For inquiries contact  george.drettakis@inria.fr
+#
+
+import queue
+import threading
+import torch
+
+class DeviceScalars:
+    """
+    Training scalars kept on the device. record() stacks the 0-dim tensors of an iteration without waiting for them,
+    fetch() moves everything recorded since the previous fetch to the host in one transfer and only then reads the
+    timing events, which have completed by that point.
+    """
+
+    def __init__(self):
+        self.names = None
+        self.iterations = []
+        self.values = []
+        self.events = []
+
+    def record(self, iteration, scalars, events=None):
+        """:param scalars: dict name -> 0-dim tensor, the same names at every call; events: (start, end) cuda events"""
+        if self.names is None:
+            self.names = list(scalars)
+        self.iterations.append(iteration)
+        self.values.append(torch.stack([scalars[name].detach().float() for name in self.names]))
+        self.events.append(events)
+
+    def __len__(self):
+        return len(self.iterations)
+
+    def fetch(self):
+        """:return: [(iteration, {name: float, "iter_time": ms when events were recorded})] since the previous fetch"""
+        if not self.iterations:
+            return []
+        values = torch.stack(self.values).cpu().tolist()
+        rows = []
+        for iteration, row, events in zip(self.iterations, values, self.events):
+            scalars = dict(zip(self.names, row))
+            if events is not None:
+                scalars["iter_time"] = events[0].elapsed_time(events[1])
+            rows.append((iteration, scalars))
+        self.iterations, self.values, self.events = [], [], []
+        return rows
+
+class BackgroundWriter:
+    """
+    Proxy of a tensorboard SummaryWriter: add_scalar, add_images, add_histogram, ... are queued and run on a worker
+    thread in submission order, the training loop never waits for the event file.
+    Tensor arguments are handed over as they are and copied to the host by the worker.
+    """
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.calls = queue.Queue()
+        self.worker = threading.Thread(target=self._run, daemon=True)
+        self.worker.start()
+
+    def __getattr__(self, name):
+        method = getattr(self.writer, name)
+
+        def call(*args, **kwargs):
+            self.calls.put((method, args, kwargs))
+        return call
+
+    def _run(self):
+        while True:
+            call = self.calls.get()
+            if call is None:
+                break
+            method, args, kwargs = call
+            try:
+                method(*args, **kwargs)
+            except Exception as e:
+                print("\n[Warning] background tensorboard logging failed: {}".format(e))
+
+    def close(self):
+        """Write every queued call, then close the writer"""
+        self.calls.put(None)
+        self.worker.join()
+        self.writer.close()
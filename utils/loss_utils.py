@@ -46,39 +46,25 @@ def compute_continue_loss(dyn_depth, gt_depth, lambda_depth, sample_nums=100, pa
     """
     gt_depth = gt_depth / gt_depth.max()
     dyn_depth = dyn_depth / dyn_depth.max()
-    # 随机选100个位置，以这100个位置为中心，构建patch
+    # 随机选100个位置，以这100个位置为左上角，构建patch
     sample_w = torch.randint(0, gt_depth.shape[1] - patch_size, (sample_nums,))
     sample_h = torch.randint(0, gt_depth.shape[2] - patch_size, (sample_nums,))
 
-    # 初始化一个列表，用于存储 100 个样本点的 6x6 的像素索引
-    patchs_gt = []
-    patchs_pred = []
+    # 所有patch的像素索引一次构建: (sample_nums, patch_size, patch_size), 行优先展开后的线性索引
+    offsets = torch.arange(patch_size)
+    patch_w = (sample_w[:, None] + offsets)[:, :, None]
+    patch_h = (sample_h[:, None] + offsets)[:, None, :]
+    index = (patch_w * gt_depth.shape[2] + patch_h).to(gt_depth.device)
 
-    # 遍历每个样本点，获得以该点为中心的 6x6 像素索引
-    for i in range(sample_nums):
-        w, h = sample_w[i], sample_h[i]
-
-        # 生成以(w, h)为中心的6x6像素索引
-        patch_w_indices = torch.arange(w, w + patch_size)
-        patch_h_indices = torch.arange(h, h + patch_size)
-
-        # 使用 torch.meshgrid 创建所有可能的组合
-        patch_w, patch_h = torch.meshgrid(patch_w_indices, patch_h_indices)
-
-        # 将索引转化为坐标对，形如 (w, h)
-        patchs_gt.append(gt_depth[:, patch_w, patch_h])
-        patchs_pred.append(dyn_depth[:, patch_w, patch_h])
-
-    gt_depth = torch.cat(patchs_gt).reshape(1, sample_nums, -1).transpose(2, 1)
-    pred_depth = torch.cat(patchs_pred).reshape(1, sample_nums, -1).transpose(2, 1)
+    # (C, sample_nums, p, p) -> (1, C * p * p, sample_nums), 每个样本内按(c, w, h)排列, 与逐个patch拼接的顺序相同
+    gt_depth = gt_depth.flatten(1)[:, index].transpose(0, 1).reshape(1, sample_nums, -1).transpose(2, 1)
+    pred_depth = dyn_depth.flatten(1)[:, index].transpose(0, 1).reshape(1, sample_nums, -1).transpose(2, 1)
     condition = (gt_depth[:, (patch_size **2 // 2 + 1), :].unsqueeze(0).permute(1, 0, 2) - gt_depth).abs()
     mask = torch.logical_and(condition <= 1e-2, condition > 0)
-    if torch.all(~mask):
-        continue_loss = torch.tensor(0).to(dyn_depth.devices)
-        return continue_loss
-    else:
-        continue_loss = ((pred_depth[:, 0, :].unsqueeze(0).permute(1, 0, 2) - pred_depth).abs() - 1e-2)[mask].clamp(0).mean() * lambda_depth
-        return continue_loss
+    # 用掩码求和代替布尔索引, 不需要把mask读回主机; 没有连续位置时loss为0
+    continue_loss = ((pred_depth[:, 0, :].unsqueeze(0).permute(1, 0, 2) - pred_depth).abs() - 1e-2).clamp(0)
+    continue_loss = (continue_loss * mask).sum() / mask.sum().clamp(min=1) * lambda_depth
+    return continue_loss
 
 def compute_depth_loss(dyn_depth, gt_depth, lambda_depth):
 
@@ -0,0 +1,83 @@
+#
+# Copyright (C) 2023, Inria
+# GRAPHDECO research group, https://team.inria.fr/graphdeco
+# All rights reserved.
+#
+# This software is free for non-commercial, research and evaluation use
+# under the terms of the LICENSE.md file.
+#
+# For inquiries contact  george.drettakis@inria.fr
+#
+
+import math
+import torch
+
+class VisibleAdam(torch.optim.Optimizer):
+    """
+    Adam updating only the rows (Gaussians) selected by the visibility mask passed to step(). The moments and values
+    of the other rows are left as they are, instead of decaying and moving with their old momentum on a zero gradient.
+    Every parameter has one row per Gaussian. step() without a mask is a dense Adam.
+    :param lazy_bias_correction: bias correct every row with its own update count (per-row state "row_step") instead
+                                 of the global step, a row that was skipped is corrected as if it had not been trained
+    """
+
+    def __init__(self, params, lr=1e-3, betas=(0.9, 0.999), eps=1e-8, lazy_bias_correction=False):
+        super().__init__(params, dict(lr=lr, betas=betas, eps=eps))
+        self.lazy_bias_correction = lazy_bias_correction
+
+    def init_state(self, param):
+        state = self.state[param]
+        state["step"] = torch.tensor(0.0)
+        state["exp_avg"] = torch.zeros_like(param, memory_format=torch.preserve_format)
+        state["exp_avg_sq"] = torch.zeros_like(param, memory_format=torch.preserve_format)
+        if self.lazy_bias_correction:
+            state["row_step"] = torch.zeros(param.shape[0], device=param.device)
+        return state
+
+    @torch.no_grad()
+    def step(self, visible=None):
+        """:param visible: (N,) bool mask of the rows to update, all of them when None"""
+        index = torch.nonzero(visible).squeeze(1) if visible is not None else None
+        if index is not None and index.shape[0] == visible.shape[0]:
+            # 全部可见时不需要取出再写回
+            index = None
+        for group in self.param_groups:
+            beta1, beta2 = group["betas"]
+            for param in group["params"]:
+                if param.grad is None:
+                    continue
+                state = self.state[param] if len(self.state[param]) > 0 else self.init_state(param)
+                if self.lazy_bias_correction and "row_step" not in state:
+                    # 从Adam的状态继续: 每一行都已更新step次
+                    state["row_step"] = torch.full((param.shape[0],), state["step"].item(), device=param.device)
+                state["step"] += 1
+                rows, grad, exp_avg, exp_avg_sq = param, param.grad, state["exp_avg"], state["exp_avg_sq"]
+                if index is not None:
+                    assert visible.shape[0] == param.shape[0], "visibility mask of {} rows for {} Gaussians".format(
+                        visible.shape[0], param.shape[0])
+                    # 只取出可见的行计算, 再写回
+                    rows, grad, exp_avg, exp_avg_sq = (torch.index_select(tensor, 0, index) for tensor in
+                                                       (param, grad, exp_avg, exp_avg_sq))
+
+                exp_avg.lerp_(grad, 1 - beta1)
+                exp_avg_sq.mul_(beta2).addcmul_(grad, grad, value=1 - beta2)
+
+                if self.lazy_bias_correction:
+                    row_step = state["row_step"] if index is None else torch.index_select(state["row_step"], 0, index)
+                    row_step += 1
+                    step = row_step.view((-1,) + (1,) * (param.dim() - 1))
+                    step_size = group["lr"] / (1 - beta1 ** step)
+                    denom = (exp_avg_sq.sqrt() / (1 - beta2 ** step).sqrt()).add_(group["eps"])
+                    rows.sub_(exp_avg / denom * step_size)
+                else:
+                    step = state["step"].item()
+                    step_size = group["lr"] / (1 - beta1 ** step)
+                    denom = (exp_avg_sq.sqrt() / math.sqrt(1 - beta2 ** step)).add_(group["eps"])
+                    rows.addcdiv_(exp_avg, denom, value=-step_size)
+
+                if index is not None:
+                    param.index_copy_(0, index, rows)
+                    state["exp_avg"].index_copy_(0, index, exp_avg)
+                    state["exp_avg_sq"].index_copy_(0, index, exp_avg_sq)
+                    if self.lazy_bias_correction:
+                        state["row_step"].index_copy_(0, index, row_step)
@@ -0,0 +1,61 @@
+#
+# Copyright (C) 2023, Inria
+# GRAPHDECO research group, https://team.inria.fr/graphdeco
+# All rights reserved.
+#
+# This software is free for non-commercial, research and evaluation use
+# under the terms of the LICENSE.md file.
+#
+# For inquiries contact  george.drettakis@inria.fr
+#
+
+import time
+import numpy as np
+from utils.graphics_utils import BasicPointCloud
+from utils.knn_utils import knn_dist2_cpu
+
+OUTLIER_MODES = ["none", "statistical", "radius"]
+
+def statistical_inliers(points, num_neighbors=20, std_ratio=2.0):
+    """
+    Keep the points whose mean distance to their num_neighbors nearest neighbors is within
+    std_ratio standard deviations of the mean over the cloud.
+    :return: (N,) bool mask
+    """
+    if points.shape[0] <= 1:
+        return np.ones(points.shape[0], dtype=bool)
+    mean_distance = np.sqrt(knn_dist2_cpu(points, num_neighbors)).mean(axis=1)
+    return mean_distance <= mean_distance.mean() + std_ratio * mean_distance.std()
+
+def radius_inliers(points, radius, min_neighbors=16):
+    """
+    Keep the points with at least min_neighbors other points within radius.
+    :return: (N,) bool mask
+    """
+    assert radius > 0, "radius outlier removal needs a radius > 0"
+    if min_neighbors <= 0:
+        return np.ones(points.shape[0], dtype=bool)
+    if points.shape[0] <= min_neighbors:
+        return np.zeros(points.shape[0], dtype=bool)
+    # 第min_neighbors个最近邻在半径内即可, 搜索不超过半径
+    return np.isfinite(knn_dist2_cpu(points, min_neighbors, max_distance=radius)[:, -1])
+
+def remove_outliers(pcd: BasicPointCloud, mode="statistical", num_neighbors=20, std_ratio=2.0, radius=0.0):
+    """
+    :param mode: statistical (statistical_inliers with num_neighbors, std_ratio) or radius (radius_inliers with radius,
+                 num_neighbors as the minimum neighbor count), none returns pcd
+    :return: filtered BasicPointCloud, (N,) bool mask of the kept points
+    """
+    assert mode in OUTLIER_MODES, "unknown outlier removal mode {}".format(mode)
+    points = np.asarray(pcd.points)
+    if mode == "none":
+        return pcd, np.ones(points.shape[0], dtype=bool)
+    start = time.perf_counter()
+    if mode == "statistical":
+        keep = statistical_inliers(points, num_neighbors, std_ratio)
+    else:
+        keep = radius_inliers(points, radius, num_neighbors)
+    print("Removed {} of {} points as {} outliers in {:.2f}s".format(
+        int(points.shape[0] - np.count_nonzero(keep)), points.shape[0], mode, time.perf_counter() - start))
+    return BasicPointCloud(points=points[keep], colors=np.asarray(pcd.colors)[keep],
+                           normals=np.asarray(pcd.normals)[keep]), keep
@@ -0,0 +1,164 @@
+#
+# Copyright (C) 2023, Inria
+# GRAPHDECO research group, https://team.inria.fr/graphdeco
+# All rights reserved.
+#
+# This software is free for non-commercial, research and evaluation use
+# under the terms of the LICENSE.md file.
+#
+# For inquiries contact  george.drettakis@inria.fr
+#
+
+import numpy as np
+import torch
+
+# 每次写入的行数，控制写ply时host端的峰值内存
+PLY_CHUNK_ROWS = 1 << 18
+
+def _rows_to_numpy(column, rows):
+    """取出column的部分行，展平成 (n, k) 的 float32 numpy 数组"""
+    chunk = column[rows]
+    if isinstance(chunk, torch.Tensor):
+        chunk = chunk.detach().reshape(chunk.shape[0], -1).cpu().numpy()
+    else:
+        chunk = np.asarray(chunk).reshape(chunk.shape[0], -1)
+    return chunk.astype('<f4', copy=False)
+
+def write_ply_header(fid, num_vertices, attribute_names):
+    header = ['ply', 'format binary_little_endian 1.0', 'element vertex {}'.format(num_vertices)]
+    header.extend('property float {}'.format(name) for name in attribute_names)
+    header.append('end_header')
+    fid.write(('\n'.join(header) + '\n').encode('ascii'))
+
+def write_ply_chunked(path, attribute_names, columns, index=None, chunk_rows=PLY_CHUNK_ROWS):
+    """
+    Stream a float32 'vertex' element to a binary_little_endian PLY file, chunk_rows rows at a time.
+    The output is byte-identical to PlyData([PlyElement.describe(elements, 'vertex')]).write(path).
+
+    :param columns: sequence of row-major tensors/arrays sharing the first dimension, each row is flattened;
+                    an int k stands for k zero-filled columns (e.g. the unused normals).
+    :param index: optional 1-D tensor/array of rows to write, in order.
+    """
+    num_rows = None
+    for column in columns:
+        if not isinstance(column, int):
+            num_rows = column.shape[0]
+            break
+    assert num_rows is not None, "at least one column must hold data"
+    if index is not None:
+        num_rows = index.shape[0]
+
+    with open(path, 'wb') as fid:
+        write_ply_header(fid, num_rows, attribute_names)
+        for start in range(0, num_rows, chunk_rows):
+            end = min(start + chunk_rows, num_rows)
+            rows = slice(start, end) if index is None else index[start:end]
+            parts = []
+            for column in columns:
+                if isinstance(column, int):
+                    parts.append(np.zeros((end - start, column), dtype='<f4'))
+                else:
+                    parts.append(_rows_to_numpy(column, rows))
+            chunk = np.concatenate(parts, axis=1)
+            assert chunk.shape[1] == len(attribute_names), "columns do not match the attribute list"
+            fid.write(memoryview(np.ascontiguousarray(chunk)))
+
+_PLY_TYPES = {
+    'char': 'i1', 'int8': 'i1', 'uchar': 'u1', 'uint8': 'u1',
+    'short': 'i2', 'int16': 'i2', 'ushort': 'u2', 'uint16': 'u2',
+    'int': 'i4', 'int32': 'i4', 'uint': 'u4', 'uint32': 'u4',
+    'float': 'f4', 'float32': 'f4', 'double': 'f8', 'float64': 'f8',
+}
+
+def read_ply_header(path):
+    """
+    Parse the header of a PLY file holding a single 'vertex' element with scalar properties.
+    :return: (header size in bytes, file format, vertex count, [(name, numpy type), ...]),
+             or None if the file has another layout (lists, several elements ...).
+    """
+    with open(path, 'rb') as fid:
+        if fid.readline().strip() != b'ply':
+            return None
+        fmt = None
+        num_vertices = None
+        properties = []
+        while True:
+            line = fid.readline()
+            if not line:
+                return None
+            words = line.decode('ascii').split()
+            if not words or words[0] in ('comment', 'obj_info'):
+                continue
+            if words[0] == 'end_header':
+                break
+            if words[0] == 'format':
+                fmt = words[1]
+            elif words[0] == 'element':
+                if words[1] != 'vertex' or num_vertices is not None:
+                    return None
+                num_vertices = int(words[2])
+            elif words[0] == 'property':
+                if words[1] == 'list' or words[1] not in _PLY_TYPES:
+                    return None
+                properties.append((words[2], _PLY_TYPES[words[1]]))
+        return fid.tell(), fmt, num_vertices, properties
+
+def read_ply_vertex_table(path):
+    """
+    Return the vertex table of a float PLY as a (N, K) float32 array and the K property names.
+    Binary little endian files are memory-mapped, nothing is read before the columns are gathered.
+    """
+    header = read_ply_header(path)
+    if header is not None:
+        offset, fmt, num_vertices, properties = header
+        names = [name for name, _ in properties]
+        if fmt == 'binary_little_endian' and all(t == 'f4' for _, t in properties):
+            if num_vertices == 0:
+                return np.zeros((0, len(names)), dtype=np.float32), names
+            table = np.memmap(path, dtype='<f4', mode='r', offset=offset, shape=(num_vertices, len(names)))
+            return table, names
+
+    from plyfile import PlyData
+    vertices = PlyData.read(path).elements[0]
+    names = [p.name for p in vertices.properties]
+    table = np.stack([np.asarray(vertices[name], dtype=np.float32) for name in names], axis=1)
+    return table, names
+
+def gather_columns(table, columns):
+    """一次取出多列，列连续时用切片，否则用一次gather，结果为float32连续数组"""
+    columns = list(columns)
+    if columns == list(range(columns[0], columns[0] + len(columns))):
+        group = table[:, columns[0]:columns[0] + len(columns)]
+    else:
+        group = table[:, columns]
+    return np.ascontiguousarray(group, dtype=np.float32)
+
+def load_gaussian_ply(path, max_sh_degree):
+    """
+    Read the Gaussian attributes written by GaussianModel.save_ply.
+    :return: xyz (N, 3), features_dc (N, 3, 1), features_extra (N, 3, SH-1), opacities (N, 1),
+             scales (N, 3), rots (N, 4), all float32.
+    """
+    table, names = read_ply_vertex_table(path)
+    return split_gaussian_table(table, names, max_sh_degree)
+
+def split_gaussian_table(table, names, max_sh_degree):
+    """把 (N, K) 的属性表按GaussianModel的属性分组，返回值同load_gaussian_ply"""
+    column = {name: idx for idx, name in enumerate(names)}
+
+    def prefixed(prefix):
+        l = [name for name in names if name.startswith(prefix)]
+        return [column[name] for name in sorted(l, key=lambda x: int(x.split('_')[-1]))]
+
+    extra_f_columns = prefixed("f_rest_")
+    assert len(extra_f_columns) == 3 * (max_sh_degree + 1) ** 2 - 3
+
+    num = table.shape[0]
+    xyz = gather_columns(table, [column["x"], column["y"], column["z"]])
+    opacities = gather_columns(table, [column["opacity"]])
+    features_dc = gather_columns(table, [column["f_dc_0"], column["f_dc_1"], column["f_dc_2"]]).reshape(num, 3, 1)
+    # Reshape (P,F*SH_coeffs) to (P, F, SH_coeffs except DC)
+    features_extra = gather_columns(table, extra_f_columns).reshape(num, 3, (max_sh_degree + 1) ** 2 - 1)
+    scales = gather_columns(table, prefixed("scale_"))
+    rots = gather_columns(table, prefixed("rot"))
+    return xyz, features_dc, features_extra, opacities, scales, rots
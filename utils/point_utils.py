@@ -0,0 +1,137 @@
+#
+# Copyright (C) 2023, Inria
+# GRAPHDECO research group, https://team.inria.fr/graphdeco
+# All rights reserved.
+#
+# This software is free for non-commercial, research and evaluation use
+# under the terms of the LICENSE.md file.
+#
+# For inquiries contact  george.drettakis@inria.fr
+#
+
+import numpy as np
+
+# 估计体素大小时使用的采样点数(至少为点数上限的VOXEL_SEARCH_OVERSAMPLE倍)和二分次数
+VOXEL_SEARCH_SAMPLES = 1 << 20
+VOXEL_SEARCH_OVERSAMPLE = 4
+VOXEL_SEARCH_STEPS = 16
+# 每个轴最多2^20个体素, 保证key不溢出
+VOXEL_MAX_DIM = 1 << 20
+
+def point_columns(points):
+    """(N, 3) -> contiguous (3, N), per axis min / max on the rows are much faster than on the columns"""
+    return np.ascontiguousarray(np.asarray(points).T)
+
+def voxel_keys(columns, voxel_size):
+    """
+    Voxel index of every point flattened to one int64 key (row major over the occupied bounding grid).
+    :param columns: (3, N) coordinates, see point_columns
+    :return: keys (N,), grid dimensions
+    """
+    lows = [column.min() for column in columns]
+    extent = max(float(column.max() - low) for column, low in zip(columns, lows))
+    voxel_size = max(float(voxel_size), extent / VOXEL_MAX_DIM, 1e-12)
+    keys = np.zeros(columns.shape[1], dtype=np.int64)
+    dims = []
+    for column, low in zip(columns, lows):
+        # 坐标非负, 截断即向下取整
+        coords = ((column - low) / voxel_size).astype(np.int64)
+        dims.append(int(coords.max()) + 1)
+        keys *= dims[-1]
+        keys += coords
+    return keys, dims
+
+def sort_keys(keys, dims):
+    """
+    :return: order such that keys[order] is sorted (stable), keys[order]
+    """
+    index_bits = max(int(keys.shape[0] - 1).bit_length(), 1)
+    if int(np.prod(dims, dtype=object) - 1).bit_length() + index_bits <= 63:
+        # key和下标打包成一个int64, np.sort比argsort快得多
+        packed = np.sort((keys << index_bits) | np.arange(keys.shape[0], dtype=np.int64))
+        return packed & ((1 << index_bits) - 1), packed >> index_bits
+    order = np.argsort(keys, kind="stable")
+    return order, keys[order]
+
+def occupied_voxels(columns, voxel_size):
+    """:return: sorted distinct keys of the occupied voxels, grid dimensions"""
+    keys, dims = voxel_keys(columns, voxel_size)
+    keys.sort()
+    return keys[np.r_[True, keys[1:] != keys[:-1]]], dims
+
+def search_voxel_size(columns, max_points, lo, hi, steps=VOXEL_SEARCH_STEPS):
+    """Bisection in log space for the smallest voxel size in [lo, hi] with at most max_points occupied voxels"""
+    lo, hi = np.log(lo), np.log(hi)
+    for _ in range(steps):
+        mid = 0.5 * (lo + hi)
+        if occupied_voxels(columns, np.exp(mid))[0].shape[0] > max_points:
+            lo = mid
+        else:
+            hi = mid
+    return float(np.exp(hi))
+
+def voxel_size_for_budget(columns, max_points, seed=0):
+    """
+    Voxel size keeping at most max_points occupied voxels.
+    A random subset of the points gives a lower bound of the size. The voxels occupied at that size stand in for
+    the full cloud for the fine search, and the result is grown until the full cloud fits.
+    """
+    num_points = columns.shape[1]
+    extent = max(max(float(column.max() - column.min()) for column in columns), 1e-12)
+    sample = columns
+    num_samples = max(VOXEL_SEARCH_SAMPLES, VOXEL_SEARCH_OVERSAMPLE * max_points)
+    if num_points > num_samples:
+        rng = np.random.default_rng(seed)
+        sample = columns[:, rng.integers(0, num_points, num_samples)]
+    voxel_size = search_voxel_size(sample, max_points, extent / VOXEL_MAX_DIM, extent)
+
+    # 子集上的体素数偏少, 用该尺寸下被占据体素的中心代替全部点继续搜索
+    keys, dims = occupied_voxels(columns, voxel_size)
+    voxel_size = max(voxel_size, extent / VOXEL_MAX_DIM)
+    centers = np.empty((3, keys.shape[0]))
+    for axis in reversed(range(3)):
+        keys, coords = np.divmod(keys, dims[axis])
+        centers[axis] = (coords + 0.5) * voxel_size
+    if centers.shape[1] > max_points:
+        voxel_size = search_voxel_size(centers, max_points, voxel_size, extent)
+
+    count = occupied_voxels(columns, voxel_size)[0].shape[0]
+    while count > max_points:
+        voxel_size *= 1.01 * (count / max_points) ** 0.5
+        count = occupied_voxels(columns, voxel_size)[0].shape[0]
+    return voxel_size
+
+def voxel_downsample(points, colors, normals, voxel_size, columns=None):
+    """
+    Keep one point per occupied voxel: the mean position, color and normal of the points inside it.
+    Normals are renormalized, zero normals stay zero.
+    """
+    if points.shape[0] == 0:
+        return points, colors, normals
+    order, sorted_keys = sort_keys(*voxel_keys(point_columns(points) if columns is None else columns, voxel_size))
+    starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+    counts = np.diff(np.r_[starts, order.shape[0]])[:, None]
+
+    def mean(values):
+        # np.take比花式索引快
+        sums = np.add.reduceat(np.take(values, order, axis=0), starts, axis=0, dtype=np.float64)
+        return (sums / counts).astype(values.dtype)
+
+    normals = mean(normals)
+    length = np.linalg.norm(normals, axis=1, keepdims=True)
+    normals = np.where(length > 0, normals / np.maximum(length, 1e-12), normals).astype(normals.dtype)
+    return mean(points), mean(colors), normals
+
+def downsample_points(points, colors, normals, max_points=None, voxel_size=None):
+    """
+    Voxel grid downsampling of an initial point cloud.
+    :param voxel_size: fixed voxel size, takes precedence over max_points when > 0
+    :param max_points: point budget, the voxel size is chosen so that at most max_points voxels are occupied
+    :return: points, colors, normals
+    """
+    if voxel_size is not None and voxel_size > 0:
+        return voxel_downsample(points, colors, normals, voxel_size)
+    if max_points is None or max_points <= 0 or points.shape[0] <= max_points:
+        return points, colors, normals
+    columns = point_columns(points)
+    return voxel_downsample(points, colors, normals, voxel_size_for_budget(columns, max_points), columns)
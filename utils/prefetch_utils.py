@@ -0,0 +1,85 @@
+#
+# Copyright (C) 2023, Inria
+# GRAPHDECO research group, https://team.inria.fr/graphdeco
+# All rights reserved.
+#
+# This software is free for non-commercial, research and evaluation use
+# under the terms of the LICENSE.md file.
+#
+# For inquiries contact  george.drettakis@inria.fr
+#
+
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from random import randint
+import torch
+
+class ViewpointPrefetcher:
+    """
+    Pick the training viewpoints ahead of time with the same scheme as train.py (pop a random camera from a copy
+    of the camera list, refilled when empty) and stage the images / depths of the next `depth` viewpoints on a
+    worker thread: pinned host copy, then a non-blocking copy to the device on a side stream.
+    The random calls happen on the caller's thread in the same order, so the sampling sequence is unchanged.
+    """
+
+    def __init__(self, cameras, depth=2, device="cuda", load_depth=False):
+        self.cameras = cameras
+        self.depth = max(depth, 1)
+        self.load_depth = load_depth
+        self.use_cuda = torch.cuda.is_available() and torch.device(device).type == "cuda"
+        self.device = torch.device(device) if self.use_cuda else None
+        self.stream = torch.cuda.Stream() if self.use_cuda else None
+        self.stack = []
+        self.ahead = deque()
+        self.pool = ThreadPoolExecutor(max_workers=1)
+        self.stall_time = 0.0
+        self.num_samples = 0
+
+    def _pick(self):
+        if not self.stack:
+            self.stack = self.cameras.copy()
+        return self.stack.pop(randint(0, len(self.stack) - 1))
+
+    def _copy(self, tensor):
+        if tensor is None or not self.use_cuda or tensor.is_cuda:
+            return tensor
+        if not tensor.is_pinned():
+            tensor = tensor.pin_memory()
+        return tensor.to(self.device, non_blocking=True)
+
+    def _stage(self, camera):
+        image = camera.original_image
+        depth = camera.depth if self.load_depth else None
+        if not self.use_cuda:
+            return image, depth, None
+        with torch.cuda.stream(self.stream):
+            image, depth = self._copy(image), self._copy(depth)
+            event = torch.cuda.Event()
+            event.record(self.stream)
+        return image, depth, event
+
+    def next(self):
+        """:return: camera, its image and depth (None unless load_depth) on the device"""
+        while len(self.ahead) <= self.depth:
+            camera = self._pick()
+            self.ahead.append((camera, self.pool.submit(self._stage, camera)))
+        camera, future = self.ahead.popleft()
+
+        start = time.perf_counter()
+        image, depth, event = future.result()
+        self.stall_time += time.perf_counter() - start
+        self.num_samples += 1
+
+        if event is not None:
+            # 副stream上分配的显存在主stream使用
+            current = torch.cuda.current_stream()
+            current.wait_event(event)
+            for tensor in (image, depth):
+                if tensor is not None and tensor.is_cuda:
+                    tensor.record_stream(current)
+        return camera, image, depth
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+        self.ahead.clear()
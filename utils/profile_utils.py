@@ -0,0 +1,138 @@
+#
+# Copyright (C) 2023, Inria
+# GRAPHDECO research group, https://team.inria.fr/graphdeco
+# All rights reserved.
+#
+# This software is free for non-commercial, research and evaluation use
+# under the terms of the LICENSE.md file.
+#
+# For inquiries contact  george.drettakis@inria.fr
+#
+
+import os
+import json
+import time
+from contextlib import contextmanager, nullcontext
+import numpy as np
+import torch
+
+PROFILE_HISTOGRAM_BINS = 20
+
+def phase_summary(times, gaussians):
+    """
+    :param times: (n,) ms of one phase per iteration
+    :param gaussians: (n,) Gaussian count of these iterations
+    :return: dict of statistics, the correlation / slope against the Gaussian count are None when either is constant
+    """
+    counts, edges = np.histogram(times, bins=PROFILE_HISTOGRAM_BINS)
+    summary = {"total_ms": float(times.sum()), "mean_ms": float(times.mean()),
+               "p50_ms": float(np.percentile(times, 50)), "p90_ms": float(np.percentile(times, 90)),
+               "p99_ms": float(np.percentile(times, 99)), "max_ms": float(times.max()),
+               "histogram": {"edges": edges.tolist(), "counts": counts.tolist()},
+               "gaussian_correlation": None, "ms_per_million_gaussians": None}
+    if times.std() > 0 and gaussians.std() > 0:
+        summary["gaussian_correlation"] = float(np.corrcoef(times, gaussians)[0, 1])
+        summary["ms_per_million_gaussians"] = float(np.polyfit(gaussians / 1e6, times, 1)[0])
+    return summary
+
+class PhaseProfiler:
+    """
+    Time the phases of the training iterations: `with profiler.phase("render"):` measures the host time of the block
+    and, with CUDA, the device time between two events recorded around it. A phase can run several times per iteration
+    (one render per batched view), its times are added up. step() closes an iteration, every interval iterations the
+    per-phase statistics (see phase_summary) are appended to model_path/profile.jsonl and written to tensorboard.
+    The event timings are only read then, the profiler adds no host / device synchronization in between.
+    """
+
+    def __init__(self, model_path, interval=1000, tb_writer=None, device_events=None):
+        self.path = os.path.join(model_path, "profile.jsonl")
+        self.interval = max(interval, 1)
+        self.tb_writer = tb_writer
+        self.device_events = torch.cuda.is_available() if device_events is None else device_events
+        self.current = {}
+        self.records = []
+        self.iterations = []
+        self.gaussians = []
+
+    @contextmanager
+    def phase(self, name):
+        events = None
+        if self.device_events:
+            events = (torch.cuda.Event(enable_timing=True), torch.cuda.Event(enable_timing=True))
+            events[0].record()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            host_ms = (time.perf_counter() - start) * 1000
+            if events is not None:
+                events[1].record()
+            record = self.current.setdefault(name, [0.0, []])
+            record[0] += host_ms
+            if events is not None:
+                record[1].append(events)
+
+    def step(self, iteration, num_gaussians):
+        self.records.append(self.current)
+        self.iterations.append(iteration)
+        self.gaussians.append(num_gaussians)
+        self.current = {}
+        if len(self.records) >= self.interval:
+            self.dump()
+
+    def dump(self):
+        if not self.records:
+            return
+        if self.device_events:
+            torch.cuda.synchronize()
+        gaussians = np.array(self.gaussians, dtype=np.float64)
+        names = list(dict.fromkeys(name for record in self.records for name in record))
+        host = {name: np.array([record[name][0] if name in record else 0.0 for record in self.records])
+                for name in names}
+        device = {name: np.array([sum(start.elapsed_time(end) for start, end in record[name][1]) if name in record
+                                  else 0.0 for record in self.records]) for name in names} if self.device_events else None
+
+        phases = {}
+        for name in names:
+            # 有CUDA时以设备时间为主, 同时给出主机时间
+            phases[name] = phase_summary(device[name] if device is not None else host[name], gaussians)
+            phases[name]["host_mean_ms"] = float(host[name].mean())
+        totals = sum((device if device is not None else host).values(), np.zeros(len(self.records)))
+        entry = {"iteration": self.iterations[-1], "iterations": len(self.records),
+                 "time": "device" if device is not None else "host",
+                 "gaussians": {"min": int(gaussians.min()), "max": int(gaussians.max()), "mean": float(gaussians.mean())},
+                 "total": phase_summary(totals, gaussians), "phases": phases}
+        with open(self.path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+
+        if self.tb_writer:
+            iteration = self.iterations[-1]
+            for name, times in list((device if device is not None else host).items()) + [("total", totals)]:
+                summary = phases.get(name, entry["total"])
+                self.tb_writer.add_histogram("profile/" + name, times, iteration)
+                self.tb_writer.add_scalar("profile/{}_mean_ms".format(name), summary["mean_ms"], iteration)
+                if summary["gaussian_correlation"] is not None:
+                    self.tb_writer.add_scalar("profile/{}_gaussian_correlation".format(name),
+                                              summary["gaussian_correlation"], iteration)
+        self.records, self.iterations, self.gaussians = [], [], []
+
+    def close(self):
+        self.dump()
+
+class NullProfiler:
+    """Disabled PhaseProfiler: phase() returns one shared no-op context"""
+
+    def __init__(self):
+        self.context = nullcontext()
+
+    def phase(self, name):
+        return self.context
+
+    def step(self, iteration, num_gaussians):
+        pass
+
+    def dump(self):
+        pass
+
+    def close(self):
+        pass
@@ -0,0 +1,174 @@
+#
+# Copyright (C) 2023, Inria
+# GRAPHDECO research group, https://team.inria.fr/graphdeco
+# All rights reserved.
+#
+# This software is free for non-commercial, research and evaluation use
+# under the terms of the LICENSE.md file.
+#
+# For inquiries contact  george.drettakis@inria.fr
+#
+
+import torch
+from torch import nn
+
+# 容量不足时按该倍数扩容
+STORAGE_GROWTH = 1.5
+
+class GrowableTensor:
+    """
+    Rows of a tensor in an over-allocated buffer. The live rows are a prefix of the buffer,
+    appending writes into the spare rows and compacting gathers the kept rows to the front of the same buffer.
+    """
+
+    def __init__(self, tensor, capacity):
+        self.buffer = torch.empty((max(capacity, tensor.shape[0]),) + tuple(tensor.shape[1:]),
+                                  dtype=tensor.dtype, device=tensor.device)
+        self.buffer[:tensor.shape[0]].copy_(tensor)
+
+    @property
+    def capacity(self):
+        return self.buffer.shape[0]
+
+    def view(self, count):
+        """Live rows, shares memory with the buffer"""
+        return self.buffer[:count]
+
+    def reserve(self, count, capacity):
+        """Move the count live rows to a buffer of capacity rows, the only reallocation"""
+        if capacity > self.capacity:
+            buffer = torch.empty((capacity,) + tuple(self.buffer.shape[1:]), dtype=self.buffer.dtype,
+                                 device=self.buffer.device)
+            buffer[:count].copy_(self.buffer[:count])
+            self.buffer = buffer
+
+    def write(self, start, rows):
+        """Write rows (or that many zero rows for an int) after the start live rows, the capacity must be reserved"""
+        if isinstance(rows, int):
+            self.buffer[start:start + rows].zero_()
+        else:
+            self.buffer[start:start + rows.shape[0]].copy_(rows)
+
+    def gather(self, count, index):
+        """Rows index of the count live rows to the front of the buffer (through one temporary), capacity reserved"""
+        kept = torch.index_select(self.buffer[:count], 0, index)
+        self.buffer[:index.shape[0]].copy_(kept)
+
+def is_row_state(value, param):
+    # 每个高斯一行的状态(Adam的exp_avg, exp_avg_sq, VisibleAdam的row_step)随参数增删, step等标量不变
+    return isinstance(value, torch.Tensor) and value.dim() > 0 and value.shape[0] == param.shape[0]
+
+def row_state_keys(state, param):
+    return [key for key, value in state.items() if is_row_state(value, param)]
+
+class ParameterStorage:
+    """
+    Capacity based storage of the parameters of an optimizer with one named parameter per group, of their per-row
+    optimizer state and of extra per-row buffers (densification statistics), all sharing one row count.
+    The parameters are nn.Parameter views of the live rows: adding rows writes into the spare capacity, pruning
+    and gathering reorder the rows inside the buffers, which only grow by STORAGE_GROWTH when the capacity runs out.
+    """
+
+    def __init__(self, optimizer, buffers=None, growth=STORAGE_GROWTH):
+        self.optimizer = optimizer
+        self.growth = growth
+        self.count = optimizer.param_groups[0]["params"][0].shape[0]
+        self.capacity = max(int(self.count * growth), 1)
+        self.params = {}
+        self.state = {}
+        self.buffers = {}
+        self.reallocations = 0
+        for group in optimizer.param_groups:
+            assert len(group["params"]) == 1
+            self.params[group["name"]] = GrowableTensor(group["params"][0].detach(), self.capacity)
+            self.state[group["name"]] = {}
+        for name, tensor in (buffers or {}).items():
+            self.buffers[name] = GrowableTensor(tensor, self.capacity)
+        self.bind()
+
+    def _tensors(self):
+        yield from self.params.values()
+        for state in self.state.values():
+            yield from state.values()
+        yield from self.buffers.values()
+
+    def _sync_state(self):
+        """Move the per-row optimizer state created (first step) or replaced (load_state_dict) outside the storage into it"""
+        for group in self.optimizer.param_groups:
+            param = group["params"][0]
+            tracked = self.state[group["name"]]
+            for key, value in self.optimizer.state.get(param, {}).items():
+                if is_row_state(value, param) and (key not in tracked or
+                                                   value.data_ptr() != tracked[key].buffer.data_ptr()):
+                    tracked[key] = GrowableTensor(value, self.capacity)
+
+    def bind(self):
+        """Rebuild the parameters as views of the live rows and point the optimizer state at the storage"""
+        optimizable_tensors = {}
+        for group in self.optimizer.param_groups:
+            stored_state = self.optimizer.state.pop(group["params"][0], None)
+            group["params"][0] = nn.Parameter(self.params[group["name"]].view(self.count))
+            if stored_state is not None:
+                for key, tensor in self.state[group["name"]].items():
+                    stored_state[key] = tensor.view(self.count)
+                self.optimizer.state[group["params"][0]] = stored_state
+            optimizable_tensors[group["name"]] = group["params"][0]
+        return optimizable_tensors
+
+    def buffer(self, name):
+        return self.buffers[name].view(self.count)
+
+    def reserve(self, count):
+        if count > self.capacity:
+            self.capacity = max(count, int(self.capacity * self.growth))
+            for tensor in self._tensors():
+                tensor.reserve(self.count, self.capacity)
+            self.reallocations += 1
+
+    def cat(self, tensors_dict):
+        """Same as GaussianModel.cat_tensors_to_optimizer: append rows, zero state and buffers for them"""
+        self._sync_state()
+        num_rows = next(iter(tensors_dict.values())).shape[0]
+        self.reserve(self.count + num_rows)
+        for name, tensor in self.params.items():
+            tensor.write(self.count, tensors_dict[name].detach())
+        for state in self.state.values():
+            for tensor in state.values():
+                tensor.write(self.count, num_rows)
+        for tensor in self.buffers.values():
+            tensor.write(self.count, num_rows)
+        self.count += num_rows
+        return self.bind()
+
+    def replace(self, tensor, name):
+        """Same as GaussianModel.replace_tensor_to_optimizer: overwrite a parameter and zero its state"""
+        self._sync_state()
+        self.params[name].view(self.count).copy_(tensor.detach())
+        for state in self.state[name].values():
+            state.view(self.count).zero_()
+        return self.bind()
+
+    def prune(self, mask):
+        """Same as GaussianModel._prune_optimizer with the bool mask of the removed rows"""
+        return self.gather(torch.nonzero(~mask).squeeze(1))
+
+    def gather(self, index, num_kept=None, replaced=None):
+        """
+        Same as GaussianModel._gather_optimizer: every tensor becomes tensor[index], the rows from num_kept on are new,
+        their optimizer state and buffers are zero and replaced[name] overwrites the last rows of a parameter.
+        """
+        self._sync_state()
+        count = index.shape[0]
+        num_kept = count if num_kept is None else num_kept
+        self.reserve(count)
+        for tensor in self._tensors():
+            tensor.gather(self.count, index)
+        for state in self.state.values():
+            for tensor in state.values():
+                tensor.write(num_kept, count - num_kept)
+        for tensor in self.buffers.values():
+            tensor.write(num_kept, count - num_kept)
+        for name, rows in (replaced or {}).items():
+            self.params[name].write(count - rows.shape[0], rows.detach())
+        self.count = count
+        return self.bind()
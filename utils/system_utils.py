@@ -11,7 +11,10 @@
 
 from errno import EEXIST
 from os import makedirs, path
+from contextlib import contextmanager
 import os
+import shutil
+import threading
 
 def mkdir_p(folder_path):
     # Creates a directory. equivalent to using mkdir -p on the command line
@@ -26,3 +29,26 @@ def mkdir_p(folder_path):
 def searchForMaxIteration(folder):
     saved_iters = [int(fname.split("_")[-1]) for fname in os.listdir(folder)]
     return max(saved_iters)
+
+@contextmanager
+def atomic_output(file_path):
+    """
+    Yield a temporary path next to file_path and move it over file_path once the body succeeded,
+    so readers never see a partially written file (or directory).
+    The temporary name is unique per process and thread, concurrent writers of the same file_path
+    each write their own copy and the last one moved wins.
+    """
+    folder, name = path.split(file_path)
+    # 保留原文件名作为后缀, np.savez等按扩展名处理路径
+    tmp_path = path.join(folder, ".tmp_{}_{}_{}".format(os.getpid(), threading.get_ident(), name))
+    try:
+        yield tmp_path
+    except BaseException:
+        if path.isdir(tmp_path):
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        elif path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    if path.isdir(tmp_path) and path.isdir(file_path):
+        shutil.rmtree(file_path)
+    os.replace(tmp_path, file_path)
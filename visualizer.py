@@ -59,8 +59,8 @@ class Render:
         center: torch.Tensor
         visible: bool
 
-    def __init__(self, dataset, iteration, pipeline, sub_scene=None, fast_gui=False, low_memory=False):
-        self.gaussians, self.scene, self.background = self.render_init(dataset, iteration, sub_scene, low_memory)
+    def __init__(self, dataset, iteration, pipeline, sub_scene=None, fast_gui=False, low_memory=False, region=None):
+        self.gaussians, self.scene, self.background = self.render_init(dataset, iteration, sub_scene, low_memory, region)
         print('total nums:', self.scene.gaussians.get_xyz.shape[0])
         self.pipeline = pipeline
         self.all_view = self.scene.getTrainCameras()
@@ -148,10 +148,10 @@ class Render:
             'cam': self.all_view,
             'keyframes': self.keyframes,
         }
-    def render_init(self, dataset, iteration, sub_scene=None, low_memory=False):
+    def render_init(self, dataset, iteration, sub_scene=None, low_memory=False, region=None):
         with torch.no_grad():
             gaussians = GaussianModel(dataset.sh_degree)
-            scene = Scene(dataset, gaussians, load_iteration=iteration, shuffle=False, sub_scene=sub_scene, low_memory=low_memory)
+            scene = Scene(dataset, gaussians, load_iteration=iteration, shuffle=False, sub_scene=sub_scene, low_memory=low_memory, region=region)
 
             self.extra_scene_info_dict = {
                 0: self.ExtraSceneInfo(
@@ -834,6 +834,8 @@ if __name__ == '__main__':
     parser.add_argument("--sub_scene_all", default=None, type=parse_sub_scene_all)
     parser.add_argument("--fast_gui", action="store_true")
     parser.add_argument("--low_memory", action="store_true")
+    # 分块保存的点云只加载与该包围盒相交的部分: xmin ymin zmin xmax ymax zmax
+    parser.add_argument("--region", default=None, nargs=6, type=float)
     args = get_combined_args(parser)
     print("Rendering: " + args.model_path)
     print("sub_scene_list: ", args.sub_scene)
@@ -842,8 +844,9 @@ if __name__ == '__main__':
     # init
     ti.init(arch=ti.cuda, device_memory_GB=1, kernel_profiler=True)
 
+    region = None if args.region is None else np.asarray(args.region).reshape(2, 3)
     if args.sub_scene_all is not None:
-        render_ = Render(model.extract(args), args.iteration, pipeline, args.sub_scene_all, args.fast_gui, args.low_memory)
+        render_ = Render(model.extract(args), args.iteration, pipeline, args.sub_scene_all, args.fast_gui, args.low_memory, region)
     else:
-        render_ = Render(model.extract(args), args.iteration, pipeline, args.sub_scene, args.fast_gui, args.low_memory)
+        render_ = Render(model.extract(args), args.iteration, pipeline, args.sub_scene, args.fast_gui, args.low_memory, region)
     render_.start()
\ No newline at end of file